@@ -13,12 +13,201 @@ import datetime
 import logging
 import re
 import json
+import weakref
 from .test_runner import load_and_parse_module
 from .pluggable_registry import PLUGGABLE_EVENT_REGISTRY,\
     PLUGGABLE_ACTION_REGISTRY, var_replace
 
 LOGGER = logging.getLogger(__name__)
 
+# Characters that make a condition pattern more than a literal prefix
+REGEX_SPECIAL = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+
+def compile_pattern(pattern, escape=False):
+    """Compile a header condition pattern
+
+    Keyword Arguments:
+    pattern The regular expression, matched against the start of the header
+    escape If True, the pattern is matched literally
+    """
+    pattern = str(pattern)
+    return re.compile(re.escape(pattern) if escape else pattern)
+
+
+def literal_prefix(pattern, escape=False):
+    """Get the literal string a pattern requires a header to start with
+
+    Returns:
+    The literal prefix, or None if the pattern isn't a plain literal
+    """
+    pattern = str(pattern)
+    if pattern and (escape or not REGEX_SPECIAL.search(pattern)):
+        return pattern
+    return None
+
+
+class HeaderConditions(object):
+    """A set of precompiled match and nomatch conditions on event headers
+
+    An event satisfies the conditions if every match header is present and
+    matches its pattern, and every nomatch header is present and does not.
+    """
+
+    def __init__(self, match, nonmatch, escape=False):
+        """Constructor
+
+        Keyword Arguments:
+        match Dictionary of header names to patterns that must match
+        nonmatch Dictionary of header names to patterns that must not match
+        escape If True, the patterns are matched literally
+        """
+        self.match = [(key, key.lower(), compile_pattern(value, escape))
+                      for key, value in match.items()]
+        self.nonmatch = [(key, key.lower(), compile_pattern(value, escape))
+                         for key, value in (nonmatch or {}).items()]
+
+        # The first literal header other than Event, used to index events
+        self.index_key = None
+        for key, value in match.items():
+            prefix = literal_prefix(value, escape)
+            if key.lower() != 'event' and prefix is not None:
+                self.index_key = (key.lower(), prefix)
+                break
+
+    def __call__(self, event):
+        """Check whether an event satisfies the conditions"""
+        debug = LOGGER.isEnabledFor(logging.DEBUG)
+        for key, lower_key, pattern in self.match:
+            value = event.get(lower_key)
+            if value is None:
+                if debug:
+                    LOGGER.debug("Condition %s not in event, returning", key)
+                return False
+            if not pattern.match(value):
+                if debug:
+                    LOGGER.debug("Condition %s: %s does not match %s: %s in "
+                                 "event", key, pattern.pattern, key, value)
+                return False
+
+        for key, lower_key, pattern in self.nonmatch:
+            value = event.get(lower_key)
+            if value is None:
+                if debug:
+                    LOGGER.debug("Condition %s not in event, returning", key)
+                return False
+            if pattern.match(value):
+                if debug:
+                    LOGGER.debug("Condition %s: %s matches %s: %s in event",
+                                 key, pattern.pattern, key, value)
+                return False
+        return True
+
+
+class AMIEventDispatcher(object):
+    """Routes the events of one AMI connection to AMIEventInstances
+
+    Rather than every instance registering its own handler and checking
+    every event, the dispatcher registers one handler per event type and
+    indexes the instances by the literal value of one of their headers, so
+    an event is only checked against the instances that can match it.
+    Instances are called in the order they were registered.
+    """
+
+    # Dispatchers by AMI connection
+    _dispatchers = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get(cls, ami):
+        """Get the dispatcher of an AMI connection, creating it if needed"""
+        dispatcher = cls._dispatchers.get(ami)
+        if dispatcher is None:
+            dispatcher = cls()
+            cls._dispatchers[ami] = dispatcher
+        return dispatcher
+
+    def __init__(self):
+        """Constructor"""
+        self.sequence = 0
+        self.routes = {}
+
+    def register(self, ami, event_name, instance):
+        """Deliver events of the given type from an AMI connection to an
+        instance"""
+        route = self.routes.get(event_name)
+        if route is None:
+            route = AMIEventRoute()
+            self.routes[event_name] = route
+            ami.registerEvent(event_name, route.dispatch)
+        self.sequence += 1
+        route.add(self.sequence, instance)
+
+    def deregister(self, ami, event_name, instance):
+        """Stop delivering events of the given type to an instance"""
+        route = self.routes.get(event_name)
+        if route is None:
+            return
+        route.remove(instance)
+        if not route.instances:
+            del self.routes[event_name]
+            ami.deregisterEvent(event_name, route.dispatch)
+
+
+class AMIEventRoute(object):
+    """The AMIEventInstances registered for one type of event
+
+    Instances with a literal header condition are indexed by the header,
+    the length of the literal and the literal itself. An event is only
+    checked against those instances whose literal is a prefix of the
+    event's header, along with the instances that couldn't be indexed.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.instances = {}
+        self.unindexed = []
+        self.index = {}
+
+    def add(self, sequence, instance):
+        """Add an instance, to be called in sequence order"""
+        if instance in self.instances:
+            return
+        self.instances[instance] = sequence
+        index_key = instance.conditions.index_key
+        if index_key is None:
+            self.unindexed.append((sequence, instance))
+            return
+        header, prefix = index_key
+        self.index.setdefault(header, {}).setdefault(
+            len(prefix), {}).setdefault(prefix, []).append((sequence, instance))
+
+    def remove(self, instance):
+        """Remove an instance"""
+        if self.instances.pop(instance, None) is None:
+            return
+        index_key = instance.conditions.index_key
+        if index_key is None:
+            entries = self.unindexed
+        else:
+            header, prefix = index_key
+            entries = self.index[header][len(prefix)][prefix]
+        entries[:] = [e for e in entries if e[1] is not instance]
+
+    def dispatch(self, ami, event):
+        """Handle an event from AMI"""
+        candidates = list(self.unindexed)
+        for header, lengths in self.index.items():
+            value = event.get(header)
+            if value is None:
+                continue
+            for length, prefixes in lengths.items():
+                candidates.extend(prefixes.get(value[:length], ()))
+        if len(candidates) > 1:
+            candidates.sort(key=lambda entry: entry[0])
+
+        for sequence, instance in candidates:
+            instance.dispatch_event(ami, event)
+
 
 class AMIEventInstance(object):
     """Base class for specific instances of AMI event observers
@@ -51,11 +240,8 @@ class AMIEventInstance(object):
         self._event_observers = []
         self.count = {}
 
-        if instance_config.get('escape-pattern', False):
-            self.match = (lambda pattern, s, flags=0:
-                          re.match(re.escape(pattern), s, flags))
-        else:
-            self.match = (re.match)
+        self.escape_pattern = instance_config.get('escape-pattern', False)
+        self._patterns = {}
 
         if 'count' in instance_config:
             count = instance_config['count']
@@ -94,12 +280,31 @@ class AMIEventInstance(object):
             LOGGER.error("No event specified to match on. Aborting test")
             raise Exception
 
+        self.conditions = HeaderConditions(self.match_conditions,
+                                           self.nonmatch_conditions,
+                                           self.escape_pattern)
+
         test_object.register_ami_observer(self.ami_connect)
         # We have to reregister the AMI event handlers on reconnection
         # because losing the connection clears all AMI event handlers.
         test_object.register_ami_reconnect_observer(self._ami_reconnect)
         test_object.register_stop_observer(self.__check_result)
 
+    def match(self, pattern, value, flags=0):
+        """Match a header value against a requirement pattern
+
+        Patterns are compiled once and matched literally if escape-pattern
+        is set.
+        """
+        compiled = self._patterns.get((pattern, flags))
+        if compiled is None:
+            pattern_str = str(pattern)
+            if self.escape_pattern:
+                pattern_str = re.escape(pattern_str)
+            compiled = re.compile(pattern_str, flags)
+            self._patterns[(pattern, flags)] = compiled
+        return compiled.match(value)
+
     def ami_connect(self, ami):
         """AMI connect handler"""
         self.register_handler(ami)
@@ -123,8 +328,8 @@ class AMIEventInstance(object):
         if str(ami.id) in self.ids and not self._registered:
             LOGGER.debug("Registering event %s",
                          self.match_conditions['Event'])
-            ami.registerEvent(self.match_conditions['Event'],
-                              self.__event_callback)
+            AMIEventDispatcher.get(ami).register(
+                ami, self.match_conditions['Event'], self)
             self._registered = True
 
     def register_event_observer(self, observer):
@@ -142,39 +347,17 @@ class AMIEventInstance(object):
             LOGGER.warning("Unable to dispose of AMIEventInstance - "
                            "unknown AMI object %d", ami.id)
             return
-        ami.deregisterEvent(self.match_conditions['Event'],
-                            self.__event_callback)
+        AMIEventDispatcher.get(ami).deregister(
+            ami, self.match_conditions['Event'], self)
 
     def event_callback(self, ami, event):
         """Virtual method overridden by specific AMI Event instance types"""
         pass
 
-    def __event_callback(self, ami, event):
+    def dispatch_event(self, ami, event):
         """Check event conditions to see if subclasses should be called into"""
-
-        for key, value in self.match_conditions.items():
-            if key.lower() not in event:
-                LOGGER.debug("Condition %s not in event, returning", key)
-                return
-            if not self.match(value, event.get(key.lower())):
-                LOGGER.debug("Condition %s: %s does not match %s: %s in event",
-                             key, value, key, event.get(key.lower()))
-                return
-            else:
-                LOGGER.debug("Condition %s: %s matches %s: %s in event",
-                             key, value, key, event.get(key.lower()))
-
-        for key, value in self.nonmatch_conditions.items():
-            if key.lower() not in event:
-                LOGGER.debug("Condition %s not in event, returning", key)
-                return
-            if self.match(value, event.get(key.lower())):
-                LOGGER.debug("Condition %s: %s matches %s: %s in event",
-                             key, value, key, event.get(key.lower()))
-                return
-            else:
-                LOGGER.debug("Condition %s: %s does not match %s: %s in event",
-                             key, value, key, event.get(key.lower()))
+        if not self.conditions(event):
+            return
 
         self.count['event'] += 1
 
@@ -6,6 +6,7 @@ This program is free software, distributed under the terms of
 the GNU General Public License Version 2.
 """
 
+import base64
 import datetime
 import json
 import logging
@@ -13,6 +14,7 @@ import re
 import requests
 import traceback
 import uuid
+from io import BytesIO
 try:
     from urllib.parse import urlencode
 except:
@@ -23,7 +25,11 @@ from .test_runner import load_and_parse_module
 from .pluggable_registry import PLUGGABLE_EVENT_REGISTRY,\
     PLUGGABLE_ACTION_REGISTRY, var_replace
 from .test_suite_utils import all_match
-from twisted.internet import reactor
+from twisted.internet import reactor, defer
+from twisted.web.client import Agent, HTTPConnectionPool, FileBodyProducer, \
+    readBody
+from twisted.web.http_headers import Headers
+from twisted.python.failure import Failure
 try:
     from autobahn.websocket import WebSocketClientFactory, \
         WebSocketClientProtocol, connectWS, WebSocketServerFactory, \
@@ -78,9 +84,10 @@ class AriBaseTestObject(TestCase):
         userpass = (test_config.get('username', 'testsuite'),
                     test_config.get('password', 'testsuite'))
         subscribe_all = test_config.get('subscribe-all')
+        pipeline = test_config.get('pipeline-requests', False)
 
         # Create the REST interface and the WebSocket Factory
-        self.ari = ARI(host, port=port, userpass=userpass)
+        self.ari = ARI(host, port=port, userpass=userpass, pipeline=pipeline)
         self.ari_factory = AriClientFactory(receiver=self, host=host, port=port,
                                             apps=self.apps, userpass=userpass,
                                             subscribe_all=subscribe_all)
@@ -161,6 +168,7 @@ class AriBaseTestObject(TestCase):
     def stop_reactor(self):
         if self._ws_connection is not None:
             self._ws_connection.dropConnection()
+        self.ari.close()
         super(AriBaseTestObject, self).stop_reactor()
 
 
@@ -539,18 +547,106 @@ class AriServerProtocol(WebSocketServerProtocol):
 
 
 
+class ARIResponse(object):
+    """The response to a non-blocking ARI request.
+
+    This provides the parts of requests.models.Response used by tests.
+    """
+
+    def __init__(self, url, status_code, reason, content):
+        """Constructor.
+
+        :param url: The requested URL.
+        :param status_code: The HTTP status code.
+        :param reason: The HTTP reason phrase.
+        :param content: The body of the response, as bytes.
+        """
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.content = content
+
+    @property
+    def text(self):
+        """The body of the response, as text."""
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        """The body of the response, decoded from JSON."""
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        """Raise an exception if the response is a 4xx or 5xx error.
+
+        :throws: requests.exceptions.HTTPError
+        """
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                '%d %s for url: %s' % (self.status_code, self.reason,
+                                       self.url), response=self)
+
+
+class QueuedRequest(object):
+    """A non-blocking ARI request waiting for its result to be delivered."""
+
+    def __init__(self, issue):
+        """Constructor.
+
+        :param issue: Function sending the request, returning a Deferred
+        """
+        self.issue = issue
+        self.deferred = defer.Deferred()
+        self.started = False
+        self.done = False
+        self.result = None
+
+    def start(self):
+        """Send the request."""
+        self.started = True
+        return self.issue()
+
+    def deliver(self):
+        """Fire the request's Deferred with its result."""
+        if isinstance(self.result, Failure):
+            self.deferred.errback(self.result)
+        else:
+            self.deferred.callback(self.result)
+
+
 class ARI(object):
-    """Bare bones object for an ARI interface."""
+    """Bare bones object for an ARI interface.
 
-    def __init__(self, host, userpass, port=DEFAULT_PORT):
+    The get, put, post, delete and request methods block until the response
+    is received, reusing connections to Asterisk. Code running in the
+    reactor should prefer the Deferred returning async_request, which
+    doesn't stop the processing of AMI and WebSocket events meanwhile.
+    """
+
+    def __init__(self, host, userpass, port=DEFAULT_PORT, pipeline=False):
         """Constructor.
 
         :param host: Hostname of Asterisk.
         :param port: Port of the Asterisk webserver.
+        :param pipeline: If True, non-blocking requests are sent without
+            waiting for the responses to earlier ones. Their results are
+            still delivered in the order the requests were made.
         """
         self.base_url = "http://%s:%d/ari" % (host, port)
         self.userpass = userpass
         self.allow_errors = False
+        self.pipeline = pipeline
+
+        self.session = requests.Session()
+        self.session.auth = userpass
+
+        self._authorization = b'Basic ' + base64.b64encode(
+            ('%s:%s' % userpass).encode('utf-8'))
+        self._pool = None
+        self._agent = None
+        # Non-blocking requests whose results are yet to be delivered
+        self._queue = []
+        self._processing = False
+        self._process_again = False
 
     def build_url(self, *args):
         """Build a URL from the given path.
@@ -574,8 +670,7 @@ class ARI(object):
         """
         url = self.build_url(*args)
         LOGGER.info("GET %s %r", url, kwargs)
-        return self.raise_on_err(requests.get(url, params=kwargs,
-                                              auth=self.userpass))
+        return self.raise_on_err(self.session.get(url, params=kwargs))
 
     def put(self, *args, **kwargs):
         """Send a PUT request to ARI.
@@ -588,8 +683,8 @@ class ARI(object):
         url = self.build_url(*args)
         json = kwargs.pop('json', None)
         LOGGER.info("PUT %s %r", url, kwargs)
-        return self.raise_on_err(requests.put(url, params=kwargs,
-                                              json=json, auth=self.userpass))
+        return self.raise_on_err(self.session.put(url, params=kwargs,
+                                                  json=json))
 
     def post(self, *args, **kwargs):
         """Send a POST request to ARI.
@@ -602,8 +697,8 @@ class ARI(object):
         url = self.build_url(*args)
         json = kwargs.pop('json', None)
         LOGGER.info("POST %s %r", url, kwargs)
-        return self.raise_on_err(requests.post(url, params=kwargs,
-                                               json=json, auth=self.userpass))
+        return self.raise_on_err(self.session.post(url, params=kwargs,
+                                                   json=json))
 
     def delete(self, *args, **kwargs):
         """Send a DELETE request to ARI.
@@ -615,8 +710,7 @@ class ARI(object):
         """
         url = self.build_url(*args)
         LOGGER.info("DELETE %s %r", url, kwargs)
-        return self.raise_on_err(requests.delete(url, params=kwargs,
-                                                 auth=self.userpass))
+        return self.raise_on_err(self.session.delete(url, params=kwargs))
 
     def request(self, method, *args, **kwargs):
         """ Send an arbitrary request to ARI.
@@ -629,9 +723,122 @@ class ARI(object):
         """
         url = self.build_url(*args)
         LOGGER.info("%s %s %r", method, url, kwargs)
-        requests_method = getattr(requests, method)
-        return self.raise_on_err(requests_method(url, params=kwargs,
-                                                 auth=self.userpass))
+        requests_method = getattr(self.session, method)
+        return self.raise_on_err(requests_method(url, params=kwargs))
+
+    def async_request(self, method, *args, **kwargs):
+        """Send an arbitrary request to ARI without blocking.
+
+        :param method: Method (get, post, delete, etc).
+        :param args: Path segements.
+        :param kwargs: Query parameters. A 'json' parameter is sent as the
+            JSON body of the request instead.
+        :returns: Deferred called with an ARIResponse, or errbacked with
+            requests.exceptions.HTTPError unless allow_errors is set.
+        """
+        url = self.build_url(*args)
+        json_body = kwargs.pop('json', None)
+        body = None
+        headers = None
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers = {'Content-type': 'application/json'}
+        LOGGER.info("%s %s %r", method.upper(), url, kwargs)
+        deferred = self.send(method, url, kwargs, body, headers)
+        deferred.addCallback(self.raise_on_err)
+        return deferred
+
+    def send(self, method, url, params=None, body=None, headers=None):
+        """Send a request without blocking, reusing pooled connections.
+
+        Requests are sent one at a time, in the order they are made. In
+        pipeline mode they are all sent at once, but their results are still
+        delivered in order.
+
+        :param method: Method (get, post, delete, etc).
+        :param url: The URL to request.
+        :param params: Dictionary of query parameters.
+        :param body: The body of the request, as a string.
+        :param headers: Dictionary of additional headers.
+        :returns: Deferred called with an ARIResponse
+        """
+        # Like requests, leave out parameters without a value
+        params = dict((key, value) for key, value in (params or {}).items()
+                      if value is not None)
+        if params:
+            url = '%s?%s' % (url, urlencode(params, doseq=True))
+        request_headers = Headers({b'Authorization': [self._authorization]})
+        for name, value in (headers or {}).items():
+            request_headers.addRawHeader(name, value)
+        producer = None
+        if body is not None:
+            producer = FileBodyProducer(BytesIO(body.encode('utf-8')))
+
+        def __issue():
+            response = self._get_agent().request(
+                method.upper().encode('ascii'), url.encode('utf-8'),
+                request_headers, producer)
+            response.addCallback(__read)
+            return response
+
+        def __read(response):
+            read = readBody(response)
+            read.addCallback(lambda content: ARIResponse(
+                url, response.code, response.phrase.decode('utf-8'),
+                content))
+            return read
+
+        queued = QueuedRequest(__issue)
+        self._queue.append(queued)
+        self._process_queue()
+        return queued.deferred
+
+    def _process_queue(self):
+        """Start the queued requests that may be sent, and deliver the
+        results of the completed requests at the head of the queue"""
+        if self._processing:
+            self._process_again = True
+            return
+
+        self._processing = True
+        try:
+            self._process_again = True
+            while self._process_again:
+                self._process_again = False
+                while self._queue and self._queue[0].done:
+                    self._queue.pop(0).deliver()
+
+                waiting = self._queue if self.pipeline else self._queue[:1]
+                for queued in waiting:
+                    if not queued.started:
+                        queued.start().addBoth(self._request_done, queued)
+        finally:
+            self._processing = False
+
+    def _request_done(self, result, queued):
+        """Called when a queued request completes"""
+        queued.result = result
+        queued.done = True
+        self._process_queue()
+
+    def _get_agent(self):
+        """Get the HTTP agent, creating its connection pool if needed"""
+        if self._agent is None:
+            self._pool = HTTPConnectionPool(reactor, persistent=True)
+            if self.pipeline:
+                self._pool.maxPersistentPerHost = 8
+            self._agent = Agent(reactor, pool=self._pool)
+        return self._agent
+
+    def close(self):
+        """Close the connections used by non-blocking requests."""
+        self.session.close()
+        if self._pool is None:
+            return defer.succeed(None)
+        pool = self._pool
+        self._pool = None
+        self._agent = None
+        return pool.closeCachedConnections()
 
     def set_allow_errors(self, value):
         """Sets whether error responses returns exceptions.
@@ -648,7 +855,7 @@ class ARI(object):
 
         If allow_errors is True, then an exception is not raised.
 
-        :param resp: requests.models.Response object
+        :param resp: requests.models.Response or ARIResponse object
         :returns: resp
         """
         if not self.allow_errors and resp.status_code / 100 != 2:
@@ -678,10 +885,11 @@ class ARIRequest(object):
             self.headers = {'Content-type': 'application/json'}
 
     def send(self, values):
-        """Send this ARI request substituting the given values"""
+        """Send this ARI request substituting the given values, blocking
+        until the response is received"""
         uri = var_replace(self.uri, values)
         url = self.ari.build_url(uri)
-        requests_method = getattr(requests, self.method)
+        requests_method = getattr(self.ari.session, self.method)
         params = dict((key, var_replace(val, values))
                       for key, val in self.params.items())
 
@@ -689,9 +897,30 @@ class ARIRequest(object):
             url,
             params=params,
             data=self.body,
-            headers=self.headers,
-            auth=self.ari.userpass)
+            headers=self.headers)
+        return self.check_response(response)
+
+    def send_async(self, values):
+        """Send this ARI request substituting the given values
+
+        :returns: Deferred called with the result of check_response
+        """
+        uri = var_replace(self.uri, values)
+        url = self.ari.build_url(uri)
+        params = dict((key, var_replace(val, values))
+                      for key, val in self.params.items())
 
+        deferred = self.ari.send(self.method, url, params, self.body,
+                                 self.headers)
+        deferred.addCallback(self.check_response)
+        return deferred
+
+    def check_response(self, response):
+        """Validate the response to this request
+
+        :returns: False if the response isn't the expected one, or the
+            response
+        """
         if self.response_body:
             match = self.response_body.get('match')
             return all_match(match, response.json())
@@ -940,13 +1169,26 @@ class ARIPluggableRequestModule(object):
             if request.instance and request.instance != self.count:
                 continue
             if request.delay:
-                reactor.callLater(request.delay, request.send, extra)
+                reactor.callLater(request.delay, self._send, request, extra)
             else:
-                result = request.send(extra)
-                if isinstance(result, bool) and not result:
-                    self.test_object.set_passed(False)
-                else:
-                    self.test_object.set_passed(True)
+                self._send(request, extra)
+
+    def _send(self, request, extra):
+        """Send a request, setting the test result from its response."""
+        deferred = request.send_async(extra)
+        deferred.addCallbacks(self._check_result, self._send_failed)
+
+    def _check_result(self, result):
+        """Set the test result from the result of a request."""
+        if isinstance(result, bool) and not result:
+            self.test_object.set_passed(False)
+        else:
+            self.test_object.set_passed(True)
+
+    def _send_failed(self, reason):
+        """Fail the test when a request couldn't be sent."""
+        LOGGER.error("ARI request failed: %s", reason.getErrorMessage())
+        self.test_object.set_passed(False)
 PLUGGABLE_ACTION_REGISTRY.register("ari-requests", ARIPluggableRequestModule)
 
 # vim:sw=4:ts=4:expandtab:textwidth=79
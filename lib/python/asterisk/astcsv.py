@@ -12,11 +12,41 @@ the GNU General Public License Version 2.
 
 import sys
 import csv
+import io
+import os
 import re
 import logging
 
 LOGGER = logging.getLogger(__name__)
 
+# Seconds between reads of CSV files that are followed while a test runs
+FOLLOW_INTERVAL = 1.0
+
+# Characters that make a value a regex rather than a literal string
+REGEX_SPECIAL = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+# Compiled regexes of expected values, keyed by the value
+PATTERNS = {}
+
+
+def compile_pattern(value):
+    """Get the compiled, case insensitive regex matching a whole value"""
+    try:
+        return PATTERNS[value]
+    except KeyError:
+        pattern = PATTERNS[value] = re.compile(str(value).lower() + '$')
+        return pattern
+
+
+def is_literal(value, exact):
+    """Whether a value can only match a string equal to it
+
+    Keyword Arguments:
+    value The value of a column
+    exact Whether the value is an exact string rather than a regex
+    """
+    return exact or not REGEX_SPECIAL.search(str(value))
+
 
 class AsteriskCSVLine(object):
     "A single Asterisk call detail record"
@@ -49,9 +79,9 @@ class AsteriskCSVLine(object):
             LOGGER.error("Can't compare two regexes, that's silly")
             return False
         elif exact == (False, True):
-            cmp_fn = (lambda x, y: re.match(str(x).lower() + '$', str(y).lower()))
+            cmp_fn = (lambda x, y: compile_pattern(x).match(str(y).lower()))
         elif exact == (True, False):
-            cmp_fn = (lambda x, y: re.match(str(y).lower() + '$', str(x).lower()))
+            cmp_fn = (lambda x, y: compile_pattern(y).match(str(x).lower()))
         else:
             cmp_fn = (lambda x, y: str(x).lower() == str(y).lower())
 
@@ -83,6 +113,7 @@ class AsteriskCSV(object):
         """Initialize CSV records from an Asterisk CSV file"""
 
         self.filename = fname
+        self.fields = fields
         self.row_factory = row_factory
 
         if records:
@@ -123,81 +154,50 @@ class AsteriskCSV(object):
         return self.__records.__iter__()
 
     def match(self, other, partial=False):
-        """Compares the length of self and other AsteriskCSVs and then compares
-        each record"""
+        """Compares the length of self and other AsteriskCSVs and then assigns
+        each record of self to a distinct record of other
+
+        Keyword Arguments:
+        other The AsteriskCSV to match against
+        partial If True, other may contain records that match nothing
+        """
 
         if not partial and (len(self) != len(other)):
             LOGGER.warning("CSV MATCH FAILED, different number of records, "
                         "self=%d and other=%d" % (len(self), len(other)))
             return False
 
-        def match_order(list_a, list_b, cmp_func):
-            """Utility function that attempts to find out whether list_a and
-            list_b have a single ordering match or if there is more than
-            one.
-
-            >>> f = (lambda x, y: x == y)
-            >>> match_order(['A', 'B', 'C'], ['C', 'B', 'X'], f)
-            ()
-            >>> match_order(['A', 'B', 'C'], ['C', 'B', 'A'], f)
-            ((2, 1, 0),)
-            >>> match_order(['A', 'B', 'C', 'B'], ['C', 'B', 'A', 'B'], f)
-            ((2, 1, 0, 3), (2, 3, 0, 1))
-            """
-            if not partial:
-                assert len(list_a) == len(list_b)
-            size = len(list_a)
-
-            # attempt two orderings: forward and reversed
-            guess_orders = (list(range(size)), list(reversed(range(size))))
-            found_orders = []
-
-            for guess_order in guess_orders:
-                found_order = []
-                for a_item in range(size):
-                    for b_item in guess_order:
-                        if cmp_func(list_a[a_item], list_b[b_item]):
-                            found_order.append(b_item)
-                            guess_order.remove(b_item)
-                            break
-                    else:
-                        # no match at all..
-                        return ()
-                found_orders.append(tuple(found_order))
-
-            if found_orders[0] != found_orders[1]:
-                return tuple(found_orders)
-            return (found_orders[0],)
-
         # If there is a filename, then we know that the fields are just text,
         # and not regexes. We need to know this when we are matching individual
         # rows so we know whether it is self or other that has the text we are
         # matching against. If both are file-based, then we know not to use
         # regexes at all and just test equality
         exactness = (bool(self.filename), bool(other.filename))
+        if exactness == (False, False):
+            LOGGER.error("Can't compare two regexes, that's silly")
+            return False
 
-        # Use the match_order function to see if there either is (a) no match,
-        # or (b) a single match or (c) several matches. In the latter case, the
-        # regexes should probably be chosen more carefully.
-        matches = match_order(self, other, (lambda x, y: x.match(y,
-                                            silent=True, exact=exactness)))
-
-        if len(matches) == 0:
-            # Bah.. no match. Loop over the records in the normal order and
-            # have it complain immediately.
-            for i, item in enumerate(self):
-                if not item.match(other[i], exact=exactness):
-                    LOGGER.warning("Failed to match entry %d" % (i,))
-                    return False
-            assert False
+        matcher = AsteriskCSVMatcher(self, exactness)
+        for record in other:
+            matcher.add(record)
+        if matcher.matched(partial):
+            return True
+        matcher.report()
+        return False
 
-        elif len(matches) == 1:
-            pass  # joy!
+    def matcher(self, filename):
+        """Create a matcher of these records against a CSV file that is still
+        being written
 
-        elif len(matches) > 1:
-            LOGGER.warning("More than one CSV permutation results in success")
+        Keyword Arguments:
+        filename The CSV file to follow
 
-        return True
+        Returns:
+        An AsteriskCSVMatcher, whose update method reads new records
+        """
+        return AsteriskCSVMatcher(self, (bool(self.filename), True),
+                                  AsteriskCSVFollower(filename, self.fields,
+                                                      self.row_factory))
 
     def __str__(self):
         return "\n".join([str(item) for item in self.__records])
@@ -209,4 +209,234 @@ class AsteriskCSV(object):
         except:
             LOGGER.warning("Unable to empty CSV file %s" % (self.filename))
 
+
+class AsteriskCSVFollower(object):
+    """Incrementally read the records appended to an Asterisk CSV file"""
+
+    def __init__(self, filename, fields, row_factory):
+        """Constructor
+
+        Keyword Arguments:
+        filename The CSV file, which need not exist yet
+        fields The names of the columns
+        row_factory Callable creating a record from the columns
+        """
+        self.filename = filename
+        self.fields = fields
+        self.row_factory = row_factory
+        self.offset = 0
+        self.pending = b''
+        self.truncated = False
+
+    def read(self):
+        """Read the complete records written since the last read
+
+        If the file has shrunk since the last read, it is read again from the
+        start and truncated is set.
+
+        Returns:
+        A list of new records
+        """
+        self.truncated = False
+        try:
+            with open(self.filename, 'rb') as csv_file:
+                size = os.fstat(csv_file.fileno()).st_size
+                if size < self.offset:
+                    LOGGER.debug("CSV file %s was truncated" % self.filename)
+                    self.offset = 0
+                    self.pending = b''
+                    self.truncated = True
+                csv_file.seek(self.offset)
+                data = csv_file.read()
+        except IOError as e:
+            if e.errno != 2:
+                LOGGER.error("IOError %d[%s] while reading file '%s'" %
+                             (e.errno, e.strerror, self.filename))
+            return []
+
+        self.offset += len(data)
+        data = self.pending + data
+
+        # A record is complete at a newline outside of a quoted value
+        end = 0
+        quotes = 0
+        scanned = 0
+        pos = data.find(b'\n')
+        while pos != -1:
+            quotes += data.count(b'"', scanned, pos)
+            scanned = pos
+            if quotes % 2 == 0:
+                end = pos + 1
+            pos = data.find(b'\n', pos + 1)
+        self.pending = data[end:]
+        if not end:
+            return []
+
+        text = data[:end].decode('utf-8', 'replace')
+        return [self.row_factory(**row) for row in
+                csv.DictReader(io.StringIO(text), self.fields, ",")]
+
+
+class AsteriskCSVMatcher(object):
+    """Assign actual records to expected records as they arrive.
+
+    Expected records are indexed by the columns they hold literal values for,
+    so each actual record is only compared against the expected records that
+    can match it. Actual records are assigned to distinct expected records
+    with a maximum bipartite matching, which is extended by one augmenting
+    path as each record arrives. The records left over are therefore as few
+    as they can be, whatever order the records were written in.
+    """
+
+    def __init__(self, expected, exact=(False, True), follower=None):
+        """Constructor
+
+        Keyword Arguments:
+        expected The expected records
+        exact Whether (expected, actual) contain exact strings or regexes
+        follower Optional AsteriskCSVFollower to read actual records from
+        """
+        self.expected = list(expected)
+        self.exact = exact
+        self.follower = follower
+        self.index = {}
+        self.wildcards = {}
+        for i, record in enumerate(self.expected):
+            for key, value in record.items():
+                index = self.index.setdefault(key, {})
+                wildcards = self.wildcards.setdefault(key, set())
+                if value is None or not is_literal(value, exact[0]):
+                    wildcards.add(i)
+                else:
+                    index.setdefault(str(value).lower(), set()).add(i)
+        self.reset()
+
+    def reset(self):
+        """Forget the actual records"""
+        self.actual = []
+        self.candidates = []
+        self.assigned = {}
+        self.assignment = []
+
+    def update(self):
+        """Add the records written to the followed file since the last
+        update"""
+        records = self.follower.read()
+        if self.follower.truncated:
+            self.reset()
+        for record in records:
+            self.add(record)
+
+    def _candidates(self, record):
+        """The expected records that may match an actual record, judged by
+        the most selective column with a literal value"""
+        best = None
+        for key, index in self.index.items():
+            value = record.get(key)
+            if value is None or not is_literal(value, self.exact[1]):
+                continue
+            ids = index.get(str(value).lower(), ())
+            wildcards = self.wildcards[key]
+            if best is None or len(ids) + len(wildcards) < len(best[0]) + \
+                    len(best[1]):
+                best = (ids, wildcards)
+        if best is None:
+            return range(len(self.expected))
+        return sorted(set(best[0]) | best[1])
+
+    def add(self, record):
+        """Add an actual record and assign it if possible
+
+        Returns:
+        True if every actual record so far has been assigned
+        """
+        actual = len(self.actual)
+        self.actual.append(record)
+        self.assignment.append(None)
+        self.candidates.append(
+            [i for i in self._candidates(record) if self.expected[i].match(
+                record, silent=True, exact=self.exact)])
+        return self._augment(actual)
+
+    def _augment(self, start):
+        """Search for an augmenting path from an unassigned actual record,
+        and flip the assignments along it"""
+        previous = {}
+        queue = [start]
+        for actual in queue:
+            for expected in self.candidates[actual]:
+                if expected in previous:
+                    continue
+                previous[expected] = actual
+                if expected in self.assigned:
+                    queue.append(self.assigned[expected])
+                    continue
+                while True:
+                    actual = previous[expected]
+                    expected, self.assignment[actual] = \
+                        self.assignment[actual], expected
+                    self.assigned[self.assignment[actual]] = actual
+                    if actual == start:
+                        return True
+        return False
+
+    def unmatched_expected(self):
+        """The indices of the expected records without an actual record"""
+        return [i for i in range(len(self.expected)) if i not in self.assigned]
+
+    def unmatched_actual(self):
+        """The indices of the actual records without an expected record"""
+        return [i for i, expected in enumerate(self.assignment)
+                if expected is None]
+
+    def matched(self, partial=False):
+        """Whether every expected record was matched
+
+        Keyword Arguments:
+        partial If False, every actual record must be matched as well
+        """
+        return (len(self.assigned) == len(self.expected) and
+                (partial or len(self.assigned) == len(self.actual)))
+
+    def report(self):
+        """Log the records that were left unmatched, along with the closest
+        actual record for each expected one"""
+        unmatched = self.unmatched_actual()
+        LOGGER.warning("CSV MATCH FAILED, matched %d of %d expected and %d "
+                       "actual records" % (len(self.assigned),
+                                           len(self.expected),
+                                           len(self.actual)))
+        for i in self.unmatched_expected():
+            record = self.expected[i]
+            LOGGER.warning("No record matched expected record %d: %s" %
+                           (i, record))
+            if not unmatched:
+                continue
+            closest = min(unmatched, key=lambda j: self._mismatches(record,
+                                                                    j))
+            LOGGER.warning("Closest unmatched record %d: %s" %
+                           (closest, self.actual[closest]))
+            record.match(self.actual[closest], exact=self.exact)
+        for i in unmatched:
+            LOGGER.warning("Unexpected record %d: %s" % (i, self.actual[i]))
+
+    def _mismatches(self, expected, actual):
+        """Count the columns of an expected record an actual record doesn't
+        match"""
+        other = self.actual[actual]
+        count = 0
+        for key, value in expected.items():
+            other_value = other.get(key)
+            if value is None or other_value is None:
+                continue
+            if self.exact == (True, True):
+                count += str(value).lower() != str(other_value).lower()
+            elif self.exact[0]:
+                count += not compile_pattern(other_value).match(
+                    str(value).lower())
+            else:
+                count += not compile_pattern(value).match(
+                    str(other_value).lower())
+        return count
+
 # vim:sw=4:ts=4:expandtab:textwidth=79
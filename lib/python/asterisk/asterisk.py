@@ -15,23 +15,26 @@ import sys
 import os
 import time
 import shutil
+import signal
 import logging
-import fileinput
+import hashlib
 import polyfill
 
 from . import test_suite_utils
 
 from .config import ConfigFile
+from .instance_pool import InstancePool, POOL_DIR
+from .mirror_template import MirrorTemplate, TEMPLATE_DIR
 
 from subprocess import PIPE, TimeoutExpired
 
 from twisted.internet import reactor, protocol, defer, utils, error
+from twisted.internet.endpoints import UNIXClientEndpoint, connectProtocol
 from twisted.python.failure import Failure
 
 REMOTE_ERROR = None
 try:
     from twisted.python.filepath import FilePath
-    from twisted.internet.endpoints import UNIXClientEndpoint
     from twisted.conch.ssh.keys import Key
     from twisted.conch.client.knownhosts import KnownHostsFile
     from twisted.conch.endpoints import SSHCommandClientEndpoint
@@ -47,6 +50,31 @@ from .pluggable_registry import PLUGGABLE_EVENT_REGISTRY,\
 
 LOGGER = logging.getLogger(__name__)
 
+# How often, in seconds, to check whether a starting Asterisk is ready
+BOOT_POLL_INTERVAL = 0.05
+
+# How long, in seconds, to wait for the output of a CLI command sent over the
+# control socket before giving up on the connection
+CONTROL_COMMAND_TIMEOUT = 20
+
+# Commands sent over the control socket without a timeout: those stopping
+# Asterisk complete when the connection closes, and waiting for Asterisk to
+# boot can take much longer, for example under valgrind
+UNTIMED_CONTROL_COMMANDS = ("core stop", "core restart",
+                            "core waitfullybooted")
+
+# CLI commands that reset a pooled instance before it is reused by a test
+POOL_RESET_COMMANDS = [
+    "channel request hangup all",
+    "database query \"DELETE FROM astdb\"",
+    "module reload",
+    "logger reload",
+]
+
+# Directories of a pooled instance whose contents are replaced by those
+# installed for the test reusing it
+POOL_STATE_DIRS = ["astlogdir", "astspooldir"]
+
 class AsteriskRemoteProtocol(protocol.Protocol):
     """Class that acts as a remote protocol to Asterisk"""
 
@@ -215,6 +243,156 @@ class AsteriskCliCommand(object):
         self.output = bintxt.decode('utf-8', 'ignore')
 
 
+class AsteriskControlCommand(object):
+    """The result of a CLI command sent over an Asterisk control socket.
+
+    This has the same attributes as AsteriskCliCommand, so callers of
+    Asterisk.cli_exec don't need to care which one they are given.
+    """
+
+    def __init__(self, host, cli_cmd):
+        self.host = host
+        self.cli_cmd = cli_cmd
+        self.exitcode = 0
+        self.output = ""
+        self.err = ""
+
+
+class AsteriskControlProtocol(protocol.Protocol):
+    """A remote console connection to the control socket of a local Asterisk
+
+    Commands are sent the same way 'asterisk -rx' sends them: NUL terminated.
+    The remote console protocol doesn't mark where the output of a command
+    ends, so each command is followed by an unknown command, a marker. The
+    commands of a console are run in order, so everything received before
+    the 'No such command' error for the marker is the output of the command.
+    This allows any number of commands to be outstanding on the connection.
+
+    If the marker of a command doesn't arrive in time, the command fails and
+    the connection is dropped, as the output of the commands after it can't
+    be told apart any more.
+    """
+
+    def __init__(self, host, on_lost=None, timeout=CONTROL_COMMAND_TIMEOUT):
+        """Create the protocol
+
+        Keyword Arguments:
+        host The host of the Asterisk instance, used for logging
+        on_lost Called with this object when the connection is lost
+        timeout How long to wait for the output of each command, in seconds
+        """
+        self.host = host
+        self.on_lost = on_lost
+        self.timeout = timeout
+        self.timed_out = False
+        self.buffer = ""
+        self.pending = []
+        self.count = 0
+
+    def connectionMade(self):
+        """Mute log messages and skip the greeting sent on connect"""
+        LOGGER.debug("Connected to control socket of Asterisk %s" % self.host)
+        self._send("logger mute silent", None, None)
+
+    def _send(self, cli_cmd, result, deferred):
+        """Send a command followed by its marker"""
+        self.count += 1
+        marker = "testsuite-cli-done-%d" % self.count
+        timer = None
+        if deferred and not cli_cmd.startswith(UNTIMED_CONTROL_COMMANDS):
+            timer = reactor.callLater(self.timeout, self._command_timeout,
+                                      marker)
+        self.pending.append((marker, result, deferred, timer))
+        self.transport.write(("%s\0%s\0" % (cli_cmd, marker)).encode('utf-8'))
+
+    def execute(self, cli_cmd):
+        """Execute a CLI command.
+
+        Returns:
+        A deferred that will be called with an AsteriskControlCommand when
+        the command completes.
+        """
+        LOGGER.debug("Executing '%s' on Asterisk %s" % (cli_cmd, self.host))
+        deferred = defer.Deferred()
+        self._send(cli_cmd, AsteriskControlCommand(self.host, cli_cmd),
+                   deferred)
+        return deferred
+
+    def _command_timeout(self, marker):
+        """Fail a command whose marker didn't arrive, and drop the connection
+        """
+        for i, (pending_marker, result, deferred, timer) in \
+                enumerate(self.pending):
+            if pending_marker == marker:
+                break
+        else:
+            return
+        del self.pending[i]
+        LOGGER.warning("Timed out waiting for '%s' on Asterisk %s" %
+                       (result.cli_cmd, self.host))
+        self.timed_out = True
+        result.exitcode = 1
+        result.err = "Timed out after %d seconds" % self.timeout
+        deferred.errback(result)
+        self.transport.loseConnection()
+
+    @staticmethod
+    def _clean(output):
+        """Remove NUL characters and verbose messages from output"""
+        lines = output.replace('\0', '').splitlines(True)
+        return ''.join(line for line in lines if not line.startswith('\x7f'))
+
+    def dataReceived(self, data):
+        """Hand out the output of every command whose marker arrived"""
+        self.buffer += data.decode('utf-8', 'ignore')
+        while self.pending:
+            marker, result, deferred, timer = self.pending[0]
+            index = self.buffer.find("'%s'" % marker)
+            if index < 0:
+                return
+            line_end = self.buffer.find('\n', index)
+            if line_end < 0:
+                return
+            start = self.buffer.rfind("No such command", 0, index)
+            if start < 0 or '\n' in self.buffer[start:index]:
+                start = self.buffer.rfind('\n', 0, index) + 1
+
+            output = self.buffer[:start]
+            self.buffer = self.buffer[line_end + 1:]
+            self.pending.pop(0)
+            if timer:
+                timer.cancel()
+            if deferred:
+                result.output = self._clean(output)
+                deferred.callback(result)
+
+    def connectionLost(self, reason):
+        """Fail the outstanding commands
+
+        Commands stopping Asterisk make it close the connection, so those
+        succeed instead.
+        """
+        LOGGER.debug("Lost control socket connection to Asterisk %s" %
+                     self.host)
+        pending = self.pending
+        self.pending = []
+        for marker, result, deferred, timer in pending:
+            if timer:
+                timer.cancel()
+            if not deferred:
+                continue
+            result.output = self._clean(self.buffer)
+            self.buffer = ""
+            if result.cli_cmd.startswith(("core stop", "core restart")):
+                deferred.callback(result)
+            else:
+                result.exitcode = 1
+                result.err = reason.getErrorMessage()
+                deferred.errback(result)
+        if self.on_lost:
+            self.on_lost(self)
+
+
 class AsteriskProtocol(protocol.ProcessProtocol):
     """Class that manages an Asterisk instance"""
 
@@ -313,6 +491,9 @@ class Asterisk(object):
         SOURCE_ETC_DIR = AST_TEST_ROOT/etc/asterisk
         WORK_DIR = AST_TEST_ROOT/tmp
 
+    If TESTSUITE_WORKER is set (runtests.py --jobs), WORK_DIR is further
+    suffixed with workerN.
+
     This allows you to run tests in a separate environment and without root
     powers.
 
@@ -339,6 +520,22 @@ class Asterisk(object):
         # The default etc directory for Asterisk
         default_etc_directory = "/etc/asterisk"
 
+    # The template of the mirrored directories is shared by all workers
+    mirror_template_root = os.path.join(test_suite_root, TEMPLATE_DIR)
+
+    # When runtests.py runs tests in parallel each worker gets its own
+    # subtree, so the astN directories of concurrent tests never collide.
+    worker_id = os.getenv("TESTSUITE_WORKER")
+    if worker_id:
+        test_suite_root = os.path.join(test_suite_root, "worker%s" % worker_id)
+
+    # Contents of config files read by install_config, by path
+    _config_sources = {}
+
+    # Send CLI commands to local instances over a connection to their control
+    # socket rather than by spawning 'asterisk -rx' for each command
+    use_control_socket = True
+
     def __init__(self, base=None, ast_conf_options=None, host="127.0.0.1",
                  remote_config=None, test_config=None, bootdelay=1):
         """Construct an Asterisk instance.
@@ -356,6 +553,8 @@ class Asterisk(object):
                          Asterisk instance's configuration is treated as
                          immutable on some remote machine defined by 'host'
         test_config -- yaml loaded object containing config information
+        bootdelay -- Unused. Asterisk is checked for being fully booted as
+                     soon as its control socket exists.
 
         Example Usage:
         self.asterisk = Asterisk(base="manager/login")
@@ -371,9 +570,26 @@ class Asterisk(object):
         self.remote_config = remote_config
         self.memcheck_delay_stop = 0
         self.instance_id = 0
-        self.wfbdelay = bootdelay
+        self.pool = None
+        self.pool_key = None
+        self.pooled_pid = None
+        self._control = None
+        self._control_waiters = None
+        # Cleared once a command times out on the control socket, after
+        # which 'asterisk -rx' is used instead
+        self._use_control = True
+        # Hashes of the config files installed in astetcdir, by file name,
+        # and the (mtime_ns, size) of each file when it was written. A file
+        # whose stat no longer matches was rewritten since, for example by
+        # Asterisk itself, and its hash no longer describes it.
+        self.config_hashes = {}
+        self.config_stats = {}
+        self.base_config_hashes = {}
+        fresh = False
         if test_config is not None and 'memcheck-delay-stop' in test_config:
             self.memcheck_delay_stop = test_config['memcheck-delay-stop'] or 0
+        if test_config is not None:
+            fresh = test_config.get('fresh-asterisk', False)
 
         valgrind_env = os.getenv("VALGRIND_ENABLE") or ""
         self.valgrind_enabled = True if "true" in valgrind_env else False
@@ -428,6 +644,18 @@ class Asterisk(object):
                     break
                 i += 1
 
+            # Instances that may be reused by later tests live in the pool
+            # directory, with a link to them from the test's directory.
+            if (os.getenv("TESTSUITE_REUSE_INSTANCES") == "yes" and
+                    not self.valgrind_enabled and not fresh):
+                self.pool = InstancePool(
+                    os.path.join(Asterisk.test_suite_root, POOL_DIR))
+                self.test_base = self.base
+                self.base = self.pool.new_base(self.instance_id)
+                if not os.path.isdir(os.path.dirname(self.test_base)):
+                    os.makedirs(os.path.dirname(self.test_base))
+                os.symlink(self.base, self.test_base)
+
             # Get the Asterisk directories from the Asterisk config file
             for cat in self._ast_conf.categories:
                 if cat.name == "directories":
@@ -468,42 +696,81 @@ class Asterisk(object):
             self.process = reactor.spawnProcess(self.protocol,
                                                 cmd[0],
                                                 cmd, env=os.environ)
-            # This was a one second delay, now is passed in.  This is to allow
-            # asterisk sufficient time to actually start and create the ctl
-            # file. If we try to send the fully booted command before this
-            # happens we wait and try again, but this results in an unhandled
-            # error in twisted after the command succeeds.
-            reactor.callLater(self.wfbdelay, __execute_wait_fully_booted)
+            __wait_for_ctl()
+
+        def __boot_timed_out():
+            """Check if Asterisk has been given enough time to boot"""
+            timeout = 90 if self.valgrind_enabled else 45
+            return time.time() - self.__start_asterisk_time > timeout
+
+        def __boot_failed(msg):
+            LOGGER.error(msg)
+            self._start_deferred.errback(Exception(msg))
+
+        def __wait_for_ctl():
+            """Wait for Asterisk to create its control socket
+
+            Sending the CLI command before the socket exists would only fail,
+            so it is cheaply polled for instead.
+            """
+            if self.protocol.exited:
+                __boot_failed("Asterisk %s exited before it fully booted" %
+                              self.host)
+            elif os.path.exists(ctl_path):
+                __execute_wait_fully_booted()
+            elif __boot_timed_out():
+                __boot_failed("Asterisk %s did not create %s" %
+                              (self.host, ctl_path))
+            else:
+                reactor.callLater(BOOT_POLL_INTERVAL, __wait_for_ctl)
 
         def __execute_wait_fully_booted():
-            """Send the CLI command waitfullybooted"""
+            """Send the CLI command waitfullybooted
+
+            The command only returns once Asterisk has fully booted. It is
+            run without blocking the reactor.
+            """
 
             if self.remote_config:
                 return
 
-            # try to send the command until we timeout,
-            # then assume asterisk won't start and error out
-            timeout = 90 if self.valgrind_enabled else 45
-            CLIRetVal = self.cli_exec_blocking("core waitfullybooted", "Asterisk has fully booted")
-            if CLIRetVal == 0:
-                msg = "Successfully started Asterisk %s" % self.host
-                self._start_deferred.callback(msg)
-            elif time.time() - self.__start_asterisk_time > timeout:
-                msg = "Asterisk core waitfullybooted for %s failed" % self.host
-                LOGGER.error(msg)
-                self._start_deferred.errback(Exception(msg))
+            deferred = self.cli_exec("core waitfullybooted")
+            deferred.addCallbacks(__wait_fully_booted_callback,
+                                  __wait_fully_booted_error)
+
+        def __wait_fully_booted_callback(cli_command):
+            """Callback for the core waitfullybooted CLI command"""
+            if "Asterisk has fully booted" not in cli_command.output:
+                return __wait_fully_booted_error(cli_command)
+            msg = "Successfully started Asterisk %s" % self.host
+            self._start_deferred.callback(msg)
+
+        def __wait_fully_booted_error(reason):
+            """Errback for the core waitfullybooted CLI command
+
+            The control socket may exist before Asterisk accepts connections
+            on it, so try again shortly.
+            """
+            if __boot_timed_out():
+                __boot_failed("Asterisk core waitfullybooted for %s failed" %
+                              self.host)
             else:
-                msg = "Asterisk core waitfullybooted for %s failed, retrying" % self.host
-                LOGGER.warning(msg)
-                # wait twice as long as last time up until half timeout
-                self.wfbdelay = self.wfbdelay*2
-                if self.wfbdelay > (timeout/2):
-                    self.wfbdelay = (timeout/2)
-                reactor.callLater(self.wfbdelay, __execute_wait_fully_booted)
+                LOGGER.debug("Asterisk core waitfullybooted for %s failed, "
+                             "retrying" % self.host)
+                reactor.callLater(BOOT_POLL_INTERVAL, __wait_for_ctl)
 
         self.install_configs(os.getcwd() + "/configs", deps)
         self._setup_configs()
 
+        # The pool is only checked on the first start, as a pooled instance
+        # that fails to reset falls back to starting this one.
+        if self.pool and self.pool_key is None:
+            self.pool_key = InstancePool.instance_key(
+                self.base, [self.host, self.ast_binary, str(self.instance_id)])
+            record = self.pool.checkout(self.pool_key)
+            if record:
+                return self._start_pooled(record, deps)
+
         cmd_prefix = []
 
         if os.getenv("VALGRIND_ENABLE") == "true":
@@ -523,6 +790,8 @@ class Asterisk(object):
             else:
                 LOGGER.error('Valgrind not found')
 
+        ctl_path = None if self.remote_config else self.get_ctl_path()
+
         cmd = cmd_prefix + [
             self.ast_binary,
             "-f", "-g", "-q", "-m", "-n",
@@ -545,6 +814,119 @@ class Asterisk(object):
 
         return self._start_deferred
 
+    def _start_pooled(self, record, deps):
+        """Take over an idle pooled instance with the same configuration
+        instead of starting a new one.
+
+        The logs and spool of the pooled instance are replaced by those
+        installed for this instance, and the instance is reset for the test.
+        If any reset command fails, the pooled instance is stopped and this
+        instance is started instead.
+
+        Returns:
+        A deferred object that will be called when the instance is reset.
+        """
+        installed_base = self.base
+        start_deferred = defer.Deferred()
+
+        def __reset(result, cmd):
+            """Send the next reset command"""
+            return self.cli_exec(cmd)
+
+        def __reset_done(result):
+            shutil.rmtree(os.path.dirname(installed_base), ignore_errors=True)
+            os.remove(self.test_base)
+            os.symlink(self.base, self.test_base)
+            msg = "Reusing pooled Asterisk %s (%d)" % (self.host,
+                                                       self.pooled_pid)
+            LOGGER.info(msg)
+            self._start_deferred.callback(msg)
+
+        def __reset_failed(reason):
+            LOGGER.warning("Unable to reset pooled Asterisk %s (%d), starting "
+                           "a new instance" % (self.host, self.pooled_pid))
+            if self._control:
+                self._control.transport.loseConnection()
+                self._control = None
+            self._use_control = True
+            try:
+                os.kill(self.pooled_pid, signal.SIGKILL)
+            except OSError:
+                pass
+            shutil.rmtree(os.path.dirname(self.base), ignore_errors=True)
+            self.pooled_pid = None
+            self.base = installed_base
+            self.astetcdir = self.base + self.directories['astetcdir']
+            self.start(deps).chainDeferred(start_deferred)
+
+        self.base = record['base']
+        self.astetcdir = self.base + self.directories['astetcdir']
+        self.pooled_pid = record['pid']
+        self._replace_state(installed_base)
+
+        self._start_deferred = start_deferred
+        self._stop_deferred = defer.Deferred()
+
+        deferred = defer.succeed(None)
+        for cmd in POOL_RESET_COMMANDS:
+            deferred.addCallback(__reset, cmd)
+        deferred.addCallbacks(__reset_done, __reset_failed)
+        return start_deferred
+
+    def _replace_state(self, installed_base):
+        """Replace the files the previous test left in the logs and spool of
+        a pooled instance with those installed for this test
+
+        The directories themselves are kept, as Asterisk may be watching
+        them.
+        """
+        for key in POOL_STATE_DIRS:
+            if key not in self.directories:
+                continue
+            pooled_dir = self.base + self.directories[key]
+            installed_dir = installed_base + self.directories[key]
+            for dirname, dirnames, filenames in os.walk(pooled_dir):
+                for filename in filenames:
+                    os.remove(os.path.join(dirname, filename))
+            for dirname, dirnames, filenames in os.walk(installed_dir):
+                target = os.path.join(pooled_dir,
+                                      os.path.relpath(dirname, installed_dir))
+                if not os.path.isdir(target):
+                    os.makedirs(target)
+                for filename in filenames:
+                    shutil.copy2(os.path.join(dirname, filename),
+                                 os.path.join(target, filename),
+                                 follow_symlinks=False)
+
+    def _return_to_pool(self):
+        """Leave this instance running and make it available to later tests
+
+        Returns:
+        True if the instance was returned to the pool, False if it must be
+        stopped instead.
+        """
+        if self.pooled_pid:
+            pid = self.pooled_pid
+        elif self.process and not self.protocol.exited:
+            pid = self.process.pid
+        else:
+            return False
+        if not test_suite_utils.pid_running(pid):
+            return False
+
+        if self._control:
+            self._control.transport.loseConnection()
+            self._control = None
+        self.pool.checkin(self.pool_key, {
+            'base': self.base,
+            'pid': pid,
+            'binary': self.ast_binary,
+            'ctl': self.get_ctl_path(),
+            'test': os.environ.get('TESTSUITE_ACTIVE_TEST'),
+        })
+        LOGGER.info("Returned Asterisk %s (%d) to the pool" % (self.host, pid))
+        return True
+
     def stop(self):
         """Stop this instance of Asterisk.
 
@@ -629,7 +1011,10 @@ class Asterisk(object):
 
             self._stop_deferred.addCallback(__cancel_stops)
 
-        if not self.process:
+        if self.pool and self.pool_key and self._return_to_pool():
+            reactor.callLater(0, __process_stopped,
+                              "Asterisk %s returned to pool" % self.host)
+        elif not self.process:
             reactor.callLater(0, __process_stopped, None)
         elif self.protocol.exited:
             try:
@@ -650,6 +1035,16 @@ class Asterisk(object):
 
         return self._stop_deferred
 
+    def get_ctl_path(self):
+        """Get the path of the control socket of this instance"""
+        ctl_name = "asterisk.ctl"
+        for cat in self._ast_conf.categories:
+            if cat.name == "files":
+                for (var, val) in cat.options:
+                    if var == "astctl":
+                        ctl_name = val
+        return self.get_path("astrundir", ctl_name)
+
     def get_path(self, astdirkey, *paths):
         """Join paths using the correct prefix for the current instance.
 
@@ -678,11 +1073,36 @@ class Asterisk(object):
         value = value.replace("<<instanceid>>", str(self.instance_id))
         return value
 
-# Quick little function for doing search and replace in a file used below.
-    def _file_replace_string(self, file):
-        for line in fileinput.input(file, inplace=1):
-            line = self.configuration_replace_string(line)
-            sys.stdout.write(line)
+    @staticmethod
+    def _read_config_source(cfg_path):
+        """Read a config file, using the cached contents if it is unchanged"""
+        stat = os.stat(cfg_path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = Asterisk._config_sources.get(cfg_path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        with open(cfg_path, 'rb') as cfg_file:
+            data = cfg_file.read()
+        Asterisk._config_sources[cfg_path] = (key, data)
+        return data
+
+    def changed_configs(self):
+        """Get the names of the installed config files that are not the same
+        as those of the base set installed from the testsuite's configs
+        directory"""
+        return sorted(name for name, digest in self.config_hashes.items()
+                      if self.base_config_hashes.get(name) != digest or
+                      not self._config_unchanged(name))
+
+    def _config_unchanged(self, name, path=None):
+        """Check that an installed config file is still as it was written"""
+        try:
+            stat = os.lstat(path or os.path.join(self.astetcdir, name))
+        except OSError:
+            return False
+        return self.config_stats.get(name) == (stat.st_mtime_ns,
+                                               stat.st_size)
 
     def install_configs(self, cfg_path, deps=None):
         """Installs all files located in the configuration directory for this
@@ -713,6 +1133,7 @@ class Asterisk(object):
         if not self._configs_installed and cfg_path != cur_cfg_path:
             # Do a one-time installation of the base configs
             self.install_configs("%s/configs" % os.getcwd())
+            self.base_config_hashes = dict(self.config_hashes)
             # the default modules.conf should be installed now, so append
             # conflicts this can be overriden by a test specific modules.conf
             self._append_modules_conf(deps)
@@ -726,6 +1147,11 @@ class Asterisk(object):
             if os.path.isfile(target):
                 self.install_config(target)
 
+        if cfg_path != cur_cfg_path:
+            LOGGER.debug("Configs of Asterisk %s differing from the base "
+                         "set: %s" % (self.host,
+                                      ", ".join(self.changed_configs())))
+
         permissions_file = os.path.join(cfg_path, ".permissions")
         if os.path.exists(permissions_file):
             try:
@@ -788,16 +1214,31 @@ class Asterisk(object):
             target_path = os.path.join(self.astetcdir,
                                        os.path.basename(cfg_path))
 
-        if os.path.exists(target_path):
-            os.remove(target_path)
+        # The installed file is identified by the hash of its contents after
+        # substitution, so installing the same file again is free
+        data = self._read_config_source(cfg_path)
+        if b"<<" in data:
+            data = self.configuration_replace_string(
+                data.decode('utf-8', 'surrogateescape')).encode(
+                    'utf-8', 'surrogateescape')
+        digest = hashlib.sha1(data).hexdigest()
+        name = os.path.basename(target_path)
+        if (self.config_hashes.get(name) == digest and
+                self._config_unchanged(name, target_path)):
+            return
+
+        self.config_hashes.pop(name, None)
         try:
-            shutil.copyfile(cfg_path, target_path)
-            self._file_replace_string(target_path);
-        except shutil.Error:
-            LOGGER.warn("'%s' and '%s' are the same file" %
-                        (cfg_path, target_path))
-        except IOError:
+            if os.path.lexists(target_path):
+                os.remove(target_path)
+            with open(target_path, 'wb') as target_file:
+                target_file.write(data)
+        except (IOError, OSError):
             LOGGER.warn("The destination is not writable '%s'" % target_path)
+            return
+        stat = os.lstat(target_path)
+        self.config_hashes[name] = digest
+        self.config_stats[name] = (stat.st_mtime_ns, stat.st_size)
 
     def install_files(self, source_path):
         """Installs all files located in a directory to this
@@ -869,6 +1310,7 @@ class Asterisk(object):
         values A list of key/value pair tuples to write to the file
         """
         target_filename = os.path.join(self.astetcdir, filename)
+        self.config_hashes.pop(filename, None)
 
         if not os.path.exists(target_filename):
             LOGGER.error("File '%s' does not exists" % filename)
@@ -941,6 +1383,13 @@ class Asterisk(object):
         Example Usage:
         asterisk.cli_exec("core set verbose 10")
         """
+        if (not self.remote_config and Asterisk.use_control_socket and
+                self._use_control):
+            return self._cli_exec_control(cli_cmd)
+        return self._cli_exec_process(cli_cmd)
+
+    def _cli_exec_process(self, cli_cmd):
+        """Execute a CLI command by spawning 'asterisk -rx'"""
         # If this is going to a remote system, make sure we enclose
         # the command in quotes
         if self.remote_config:
@@ -958,6 +1407,63 @@ class Asterisk(object):
             cli_protocol = AsteriskRemoteCliCommand(self.remote_config, cmd)
         return cli_protocol.execute()
 
+    def _cli_exec_control(self, cli_cmd):
+        """Execute a CLI command over the control socket connection
+
+        If no connection can be made, 'asterisk -rx' is used instead.
+        """
+        def __connected(control):
+            return control.execute(cli_cmd)
+
+        def __not_connected(reason):
+            LOGGER.debug("Unable to connect to control socket of Asterisk "
+                         "%s: %s" % (self.host, reason.getErrorMessage()))
+            return self._cli_exec_process(cli_cmd)
+
+        deferred = self._get_control()
+        deferred.addCallbacks(__connected, __not_connected)
+        return deferred
+
+    def _get_control(self):
+        """Get the connection to the control socket, connecting if needed
+
+        Returns:
+        A deferred that will be called with the AsteriskControlProtocol
+        """
+        def __lost(control):
+            if self._control is control:
+                self._control = None
+            if control.timed_out:
+                LOGGER.warning("Using 'asterisk -rx' for further commands on "
+                               "Asterisk %s" % self.host)
+                self._use_control = False
+
+        def __done(result):
+            waiters = self._control_waiters
+            self._control_waiters = None
+            if isinstance(result, AsteriskControlProtocol):
+                self._control = result
+            for waiter in waiters:
+                if isinstance(result, Failure):
+                    waiter.errback(result)
+                else:
+                    waiter.callback(result)
+
+        if self._control:
+            return defer.succeed(self._control)
+
+        deferred = defer.Deferred()
+        if self._control_waiters is not None:
+            self._control_waiters.append(deferred)
+            return deferred
+
+        self._control_waiters = [deferred]
+        endpoint = UNIXClientEndpoint(reactor, self.get_ctl_path())
+        connect = connectProtocol(endpoint,
+                                  AsteriskControlProtocol(self.host, __lost))
+        connect.addBoth(__done)
+        return deferred
+
     def cli_exec_blocking(self, cli_cmd, responsekey="", timeout=10):
         """Execute a CLI command on this instance of Asterisk.
 
@@ -1031,17 +1537,19 @@ class Asterisk(object):
             LOGGER.error("Unable to discover dir layout from asterisk.conf")
             raise Exception("Unable to discover dir layout from asterisk.conf")
 
-        self._gen_ast_conf(dir_cat, self._ast_conf_options)
-
-        # Cache mirrored dirs to speed up creation. Generally you'll have
-        # /var/lib/asterisk for more than one dir_cat option, and that happens
-        # to be the largest dir too (with lots of sounds).
-        cache = set()
+        # Generally you'll have /var/lib/asterisk for more than one dir_cat
+        # option. Some dirs only get their directory structure mirrored,
+        # based on ``var``, while the others also get each file linked.
+        dirs_only = ["astrundir", "astlogdir", "astspooldir"]
+        mirrors = {}
         for (var, val) in dir_cat.options:
-            # We cannot simply skip ``val`` here if we already processed it.
-            # Some dirs are exempt from copying, based on ``var``.
             if var != "astcachedir":
-                self.__mirror_dir(var, val, cache)
+                mirrors[val] = mirrors.get(val, False) or var not in dirs_only
+        template = MirrorTemplate(Asterisk.mirror_template_root,
+                                  list(mirrors.items()), self.localtest_root)
+        template.stamp(self.base)
+
+        self._gen_ast_conf(dir_cat, self._ast_conf_options)
 
         self._directory_structure_made = True
 
@@ -1066,9 +1574,13 @@ class Asterisk(object):
         for (var, val) in dir_cat.options:
             if var == "astetcdir":
                 self.astetcdir = "%s%s" % (self.base, val)
-                os.makedirs(self.astetcdir)
+                if not os.path.isdir(self.astetcdir):
+                    os.makedirs(self.astetcdir)
 
+        # Don't write through the link to the system asterisk.conf
         local_ast_conf_path = os.path.join(self.astetcdir, "asterisk.conf")
+        if os.path.lexists(local_ast_conf_path):
+            os.remove(local_ast_conf_path)
 
         try:
             ast_file = open(local_ast_conf_path, "w")
@@ -1130,6 +1642,7 @@ class Asterisk(object):
             return
 
         modules_conf = os.path.join(self.astetcdir, "modules.conf")
+        self.config_hashes.pop("modules.conf", None)
         try:
             with open(modules_conf, "a") as modules_file:
                 for conflict in conflicts:
@@ -1141,68 +1654,6 @@ class Asterisk(object):
             LOGGER.error("Unexpected error: %s" % sys.exc_info()[0])
             return
 
-    def __mirror_dir(self, ast_dir_name, ast_dir_path, cache):
-        """Mirror an Asterisk directory for a test run"""
-        self._makedirs(ast_dir_path)
-        dirs_only = ["astrundir", "astlogdir", "astspooldir"]
-        if ast_dir_name in dirs_only:
-            return
-        blacklist = ["astdb", "astdb.sqlite3"]
-
-        if ast_dir_path in cache:
-            return
-        cache.add(ast_dir_path)
-
-        # If we're running with a separate localroot, the paths in
-        # AST_TEST_ROOT/etc/asterisk/asterisk.conf are still short; e.g.
-        # /etc/asterisk. We suffix AST_TEST_ROOT here to get the real source
-        # dir.
-        if self.localtest_root:
-            ast_real_dir_path = self.localtest_root + ast_dir_path
-        else:
-            ast_real_dir_path = ast_dir_path
-
-        for dirname, dirnames, filenames in os.walk(ast_real_dir_path):
-            assert dirname[0] == "/"
-
-            for filename in filenames:
-                # Shorten the dirname for inclusion into the new path.
-                short_dirname = dirname
-                if self.localtest_root:
-                    short_dirname = dirname[len(self.localtest_root):]
-
-                assert short_dirname[0] == "/"
-                target = "%s/%s/%s" % (self.base, short_dirname[1:], filename)
-                if os.path.lexists(target) or filename in blacklist:
-                    continue
-
-                os.symlink(os.path.join(ast_dir_path, dirname, filename),
-                           target)
-
-    def _makedirs(self, ast_dir_path):
-        """Make the Asterisk directories"""
-        # If we're running with a separate localroot, the paths in
-        # AST_TEST_ROOT/etc/asterisk/asterisk.conf are still short; e.g.
-        # /etc/asterisk. We suffix AST_TEST_ROOT here to get the real source
-        # dir.
-        if self.localtest_root:
-            ast_real_dir_path = self.localtest_root + ast_dir_path
-        else:
-            ast_real_dir_path = ast_dir_path
-
-        target_dir = "%s%s" % (self.base, ast_dir_path)
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
-
-        for dirname, dirnames, filenames in os.walk(ast_real_dir_path):
-            # Shorten the dirname for inclusion into the new path.
-            short_dirname = dirname
-            if self.localtest_root:
-                short_dirname = dirname[len(self.localtest_root):]
-
-            for dirname in dirnames:
-                self._makedirs(os.path.join(target_dir, short_dirname, dirname))
-
 
 class CLIPluggableActionModule(object):
     """Pluggable CLI action module.
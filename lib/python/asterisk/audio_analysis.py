@@ -0,0 +1,565 @@
+"""In-process analysis of recorded audio
+
+This module decodes sound files written by Asterisk and checks them for
+sound, silence, tones and DTMF. Files are memory-mapped and decoded in
+blocks with NumPy lookup tables, and every block is split into frames that
+are analyzed together, so a recording can be verified in milliseconds
+instead of by playing it back into the dialplan.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+FULL_SCALE = 32768.0
+
+# Default RMS level, on a 16 bit scale, above which a frame is sound. This
+# matches the default silence threshold of Asterisk's DSP.
+SILENCE_THRESHOLD = 256
+
+# Number of frames decoded and analyzed at once
+FRAMES_PER_BLOCK = 500
+
+# File extensions of headerless formats, with their encoding and rate
+RAW_FORMATS = {
+    '.ulaw': ('ulaw', 8000),
+    '.ul': ('ulaw', 8000),
+    '.mu': ('ulaw', 8000),
+    '.pcm': ('ulaw', 8000),
+    '.alaw': ('alaw', 8000),
+    '.al': ('alaw', 8000),
+    '.raw': ('slin', 8000),
+    '.sln': ('slin', 8000),
+    '.slin': ('slin', 8000),
+    '.sln12': ('slin', 12000),
+    '.sln16': ('slin', 16000),
+    '.sln24': ('slin', 24000),
+    '.sln32': ('slin', 32000),
+    '.sln44': ('slin', 44100),
+    '.sln48': ('slin', 48000),
+    '.sln96': ('slin', 96000),
+    '.sln192': ('slin', 192000),
+}
+
+# WAV format tags of the encodings that can be decoded
+WAV_PCM = 1
+WAV_ALAW = 6
+WAV_ULAW = 7
+
+DTMF_ROWS = (697, 770, 852, 941)
+DTMF_COLUMNS = (1209, 1336, 1477, 1633)
+DTMF_KEYS = ('123A', '456B', '789C', '*0#D')
+
+# Length of a DTMF detection frame, giving enough resolution to tell the
+# row and column frequencies apart
+DTMF_FRAME_SECONDS = 0.0256
+
+
+class AudioError(Exception):
+    """A sound file that can't be decoded"""
+    pass
+
+
+def _ulaw_table():
+    """Build the G.711 mu-law to 16 bit linear table"""
+    codes = ~np.arange(256, dtype=np.int32) & 0xff
+    magnitude = (((codes & 0x0f) << 3) + 0x84) << ((codes & 0x70) >> 4)
+    return np.where(codes & 0x80, 0x84 - magnitude,
+                    magnitude - 0x84).astype(np.int16)
+
+
+def _alaw_table():
+    """Build the G.711 A-law to 16 bit linear table"""
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    segment = (codes & 0x70) >> 4
+    magnitude = ((codes & 0x0f) << 4) + np.where(segment, 0x108, 8)
+    magnitude = np.where(segment, magnitude << np.maximum(segment - 1, 0),
+                         magnitude)
+    return np.where(codes & 0x80, magnitude, -magnitude).astype(np.int16)
+
+
+ULAW_TABLE = _ulaw_table()
+ALAW_TABLE = _alaw_table()
+
+# Encoding to the dtype of its stored samples and the function decoding
+# them to 16 bit linear
+DECODERS = {
+    'ulaw': (np.uint8, lambda raw: ULAW_TABLE[raw]),
+    'alaw': (np.uint8, lambda raw: ALAW_TABLE[raw]),
+    'slin': (np.dtype('<i2'), lambda raw: raw.astype(np.int16)),
+    'pcm8': (np.uint8, lambda raw: (raw.astype(np.int16) - 128) << 8),
+}
+
+
+def _encoder(table):
+    """Build a table from every 16 bit linear value to its nearest code"""
+    order = np.argsort(table, kind='stable')
+    values = table[order].astype(np.int32)
+    linear = np.arange(-32768, 32768, dtype=np.int32)
+    upper = np.clip(np.searchsorted(values, linear), 1, len(values) - 1)
+    nearer_lower = linear - values[upper - 1] < values[upper] - linear
+    return order[np.where(nearer_lower, upper - 1, upper)].astype(np.uint8)
+
+
+def encode(samples, encoding):
+    """Encode 16 bit linear samples
+
+    Keyword Arguments:
+    samples A sequence of samples
+    encoding 'ulaw', 'alaw' or 'slin'
+
+    Returns:
+    The encoded bytes
+    """
+    samples = np.clip(np.asarray(samples), -32768, 32767).astype(np.int32)
+    if encoding == 'slin':
+        return samples.astype('<i2').tobytes()
+    if encoding not in ('ulaw', 'alaw'):
+        raise AudioError("Can't encode %s" % encoding)
+    table = ULAW_TABLE if encoding == 'ulaw' else ALAW_TABLE
+    return _encoder(table)[samples + 32768].tobytes()
+
+
+def _parse_wav(data):
+    """Find the format and samples of a WAV file
+
+    Returns:
+    A tuple of the encoding, rate, offset and length of the samples
+    """
+    if len(data) < 12 or data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise AudioError("Not a RIFF WAVE file")
+    offset = 12
+    encoding = None
+    rate = None
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from('<4sI', data, offset)
+        offset += 8
+        if chunk_id == b'fmt ':
+            tag, channels, rate, _, _, bits = struct.unpack_from(
+                '<HHIIHH', data, offset)
+            if channels != 1:
+                raise AudioError("Unsupported number of channels %d" %
+                                 channels)
+            if tag == WAV_PCM and bits == 16:
+                encoding = 'slin'
+            elif tag == WAV_PCM and bits == 8:
+                encoding = 'pcm8'
+            elif tag == WAV_ULAW:
+                encoding = 'ulaw'
+            elif tag == WAV_ALAW:
+                encoding = 'alaw'
+            else:
+                raise AudioError("Unsupported WAV format %d with %d bits" %
+                                 (tag, bits))
+        elif chunk_id == b'data':
+            if encoding is None:
+                raise AudioError("WAV data before its format")
+            # A recording that was still being written may claim more data
+            # than the file holds
+            return encoding, rate, offset, min(size, len(data) - offset)
+        offset += size + (size & 1)
+    raise AudioError("No WAV data found")
+
+
+class AudioFile(object):
+    """A memory-mapped sound file
+
+    Attributes:
+    filename The file name
+    encoding The encoding of the samples
+    rate     The sample rate
+    """
+
+    def __init__(self, filename, encoding=None, rate=None):
+        """Constructor
+
+        Keyword Arguments:
+        filename The sound file. The format is chosen by its extension, as
+                 Asterisk does.
+        encoding The encoding of a headerless file, overriding the extension
+        rate     The sample rate of a headerless file, overriding the
+                 extension
+        """
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._map = None
+        data = b''
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            data = self._map
+
+        offset = 0
+        length = len(data)
+        extension = os.path.splitext(filename)[1]
+        if encoding is None and extension == '.wav':
+            encoding, rate, offset, length = _parse_wav(data)
+        elif encoding is None:
+            if extension.lower() not in RAW_FORMATS:
+                self.close()
+                raise AudioError("Unsupported sound file format '%s'" %
+                                 extension)
+            encoding, default_rate = RAW_FORMATS[extension.lower()]
+            rate = rate or default_rate
+        if encoding not in DECODERS:
+            self.close()
+            raise AudioError("Unsupported encoding '%s'" % encoding)
+
+        self.encoding = encoding
+        self.rate = rate or 8000
+        dtype, self._decode = DECODERS[encoding]
+        width = np.dtype(dtype).itemsize
+        self._samples = np.frombuffer(data, dtype=dtype,
+                                      count=length // width, offset=offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def duration(self):
+        """The length of the audio, in seconds"""
+        return float(len(self)) / self.rate
+
+    def close(self):
+        """Unmap and close the file"""
+        self._samples = np.zeros(0, dtype=np.int16)
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def blocks(self, block_size=None):
+        """Decode the samples a block at a time
+
+        Keyword Arguments:
+        block_size The number of samples per block. Defaults to a second.
+
+        Returns:
+        A generator of arrays of 16 bit linear samples
+        """
+        block_size = block_size or self.rate
+        for start in range(0, len(self._samples), block_size):
+            yield self._decode(self._samples[start:start + block_size])
+
+    def samples(self):
+        """Decode every sample
+
+        Returns:
+        An array of 16 bit linear samples
+        """
+        return self._decode(self._samples)
+
+    def frames(self, frame_size, frames_per_block=FRAMES_PER_BLOCK):
+        """Split the audio into consecutive frames, a block at a time
+
+        A final partial frame is left out.
+
+        Keyword Arguments:
+        frame_size The number of samples per frame
+
+        Returns:
+        A generator of two dimensional float arrays, one frame per row
+        """
+        for block in self.blocks(frame_size * frames_per_block):
+            count = len(block) // frame_size
+            if count:
+                yield block[:count * frame_size].reshape(
+                    count, frame_size).astype(np.float64)
+
+
+def _frame_size(audio, seconds):
+    """The number of samples in a frame of the given length"""
+    return max(int(round(audio.rate * seconds)), 1)
+
+
+def _runs(values):
+    """Split an array into runs of equal values
+
+    Returns:
+    A list of (value, start index, length) tuples
+    """
+    if not len(values):
+        return []
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    lengths = np.diff(np.r_[starts, len(values)])
+    return list(zip(values[starts].tolist(), starts.tolist(),
+                    lengths.tolist()))
+
+
+def frame_rms(audio, frame_seconds=0.02):
+    """Compute the RMS level of each frame
+
+    Keyword Arguments:
+    audio         The AudioFile
+    frame_seconds The length of a frame
+
+    Returns:
+    An array of RMS levels on a 16 bit scale
+    """
+    levels = [np.sqrt((frames * frames).mean(axis=1))
+              for frames in audio.frames(_frame_size(audio, frame_seconds))]
+    return np.concatenate(levels) if levels else np.zeros(0)
+
+
+def segments(audio, threshold=SILENCE_THRESHOLD, frame_seconds=0.02):
+    """Split audio into sound and silence
+
+    Keyword Arguments:
+    audio         The AudioFile
+    threshold     The RMS level, on a 16 bit scale, of sound
+    frame_seconds The length of the frames the level is measured over
+
+    Returns:
+    A list of dictionaries with 'sound', 'seconds' and 'duration' keys
+    """
+    loud = frame_rms(audio, frame_seconds) >= threshold
+    frame_seconds = float(_frame_size(audio, frame_seconds)) / audio.rate
+    return [{'sound': bool(sound), 'seconds': start * frame_seconds,
+             'duration': length * frame_seconds}
+            for sound, start, length in _runs(loud)]
+
+
+def has_sound(audio, threshold=SILENCE_THRESHOLD, min_duration=0.02):
+    """Check whether audio holds sound
+
+    Keyword Arguments:
+    audio        The AudioFile
+    threshold    The RMS level, on a 16 bit scale, of sound
+    min_duration The shortest sound, in seconds, that counts
+
+    Returns:
+    True if some sound lasted at least min_duration
+    """
+    return any(segment['sound'] and segment['duration'] >= min_duration
+               for segment in segments(audio, threshold))
+
+
+def is_silent(audio, threshold=SILENCE_THRESHOLD):
+    """Check whether audio is silent throughout"""
+    return not has_sound(audio, threshold, 0)
+
+
+def goertzel(frames, rate, frequencies):
+    """Measure the amplitude of given frequencies in each frame
+
+    This evaluates the same single frequency DFT the Goertzel algorithm
+    does, for every frame and frequency at once.
+
+    Keyword Arguments:
+    frames      A two dimensional array, one frame per row
+    rate        The sample rate
+    frequencies The frequencies to measure
+
+    Returns:
+    An array of amplitudes, one row per frame and one column per frequency
+    """
+    size = frames.shape[1]
+    basis = np.exp(-2j * np.pi * np.outer(np.arange(size), frequencies) /
+                   rate)
+    return 2 * np.abs(frames.dot(basis)) / size
+
+
+def dominant_frequencies(audio, frame_seconds=0.05):
+    """Find the strongest frequency of each frame
+
+    Keyword Arguments:
+    audio         The AudioFile
+    frame_seconds The length of a frame
+
+    Returns:
+    A tuple of arrays of the frequency, and its amplitude relative to full
+    scale, of each frame
+    """
+    size = _frame_size(audio, frame_seconds)
+    window = np.hanning(size)
+    frequencies = []
+    amplitudes = []
+    for frames in audio.frames(size):
+        spectrum = np.abs(np.fft.rfft(frames * window, axis=1))
+        spectrum[:, 0] = 0
+        peak = np.clip(spectrum.argmax(axis=1), 1, spectrum.shape[1] - 2)
+        rows = np.arange(len(frames))
+        # Interpolate between bins on the log spectrum around the peak
+        left, center, right = (np.log(spectrum[rows, peak + i] + 1e-9)
+                               for i in (-1, 0, 1))
+        curvature = left - 2 * center + right
+        offset = np.where(curvature < 0, 0.5 * (left - right) /
+                          np.where(curvature < 0, curvature, -1), 0)
+        frequencies.append((peak + offset) * audio.rate / size)
+        amplitudes.append(np.sqrt(2 * (frames * frames).mean(axis=1)) /
+                          FULL_SCALE)
+    if not frequencies:
+        return np.zeros(0), np.zeros(0)
+    return np.concatenate(frequencies), np.concatenate(amplitudes)
+
+
+def detect_tones(audio, frame_seconds=0.05, min_amplitude=0.1,
+                 min_duration=0.1, tolerance=None):
+    """Split audio into tones of a single frequency
+
+    Keyword Arguments:
+    audio         The AudioFile
+    frame_seconds The length of the frames the frequency is measured over
+    min_amplitude The amplitude, relative to full scale, below which a frame
+                  is silence
+    min_duration  Tones shorter than this, in seconds, are merged into the
+                  tone before them
+    tolerance     The largest change in frequency, in Hz, within a tone.
+                  Defaults to the frequency resolution of a frame.
+
+    Returns:
+    A list of dictionaries with 'frequency', 'amplitude', 'seconds' and
+    'duration' keys, where silence has a frequency of 0
+    """
+    frequencies, amplitudes = dominant_frequencies(audio, frame_seconds)
+    frame_seconds = float(_frame_size(audio, frame_seconds)) / audio.rate
+    if tolerance is None:
+        tolerance = 1.0 / frame_seconds
+    frequencies = np.where(amplitudes >= min_amplitude, frequencies, 0)
+
+    tones = []
+    for frequency, amplitude in zip(frequencies.tolist(),
+                                    amplitudes.tolist()):
+        tone = tones[-1] if tones else None
+        if tone is None or abs(tone['frequency'] - frequency) > tolerance or \
+                (frequency == 0) != (tone['frequency'] == 0):
+            tone = {'frequency': frequency, 'amplitude': 0.0, 'frames': 0,
+                    'total': 0.0}
+            tones.append(tone)
+        tone['frames'] += 1
+        tone['total'] += frequency
+        tone['amplitude'] = max(tone['amplitude'], amplitude)
+        tone['frequency'] = tone['total'] / tone['frames']
+
+    # Merge glitches into the tone before them, or after the first one
+    merged = []
+    for tone in tones:
+        if merged and (tone['frames'] * frame_seconds < min_duration or
+                       abs(merged[-1]['frequency'] - tone['frequency']) <=
+                       tolerance and
+                       (tone['frequency'] == 0) ==
+                       (merged[-1]['frequency'] == 0)):
+            merged[-1]['frames'] += tone['frames']
+        elif len(merged) == 1 and \
+                merged[0]['frames'] * frame_seconds < min_duration:
+            tone['frames'] += merged[0]['frames']
+            merged[0] = tone
+        else:
+            merged.append(tone)
+
+    results = []
+    start = 0
+    for tone in merged:
+        results.append({'frequency': round(tone['frequency'], 1),
+                        'amplitude': tone['amplitude'],
+                        'seconds': start * frame_seconds,
+                        'duration': tone['frames'] * frame_seconds})
+        start += tone['frames']
+    if results:
+        results[-1]['duration'] = audio.duration - results[-1]['seconds']
+    return results
+
+
+def detect_dtmf(audio, threshold=SILENCE_THRESHOLD, min_frames=2,
+                max_twist=8.0):
+    """Detect the DTMF digits in audio
+
+    Keyword Arguments:
+    audio      The AudioFile
+    threshold  The RMS level, on a 16 bit scale, a frame needs to hold a
+               digit
+    min_frames The number of consecutive frames a digit must last
+    max_twist  The largest difference, in dB, between the row and column
+               tone
+
+    Returns:
+    The digits as a string
+    """
+    frequencies = DTMF_ROWS + DTMF_COLUMNS
+    max_ratio = 10 ** (max_twist / 20.0)
+    labels = []
+    for frames in audio.frames(_frame_size(audio, DTMF_FRAME_SECONDS)):
+        amplitudes = goertzel(frames, audio.rate, frequencies)
+        rows = amplitudes[:, :4]
+        columns = amplitudes[:, 4:]
+        row = rows.argmax(axis=1)
+        column = columns.argmax(axis=1)
+        row_peak = rows.max(axis=1)
+        column_peak = columns.max(axis=1)
+        power = (frames * frames).mean(axis=1)
+        valid = ((np.sqrt(power) >= threshold) &
+                 # The two tones hold most of the power
+                 ((row_peak ** 2 + column_peak ** 2) / 2 >= 0.7 * power) &
+                 (row_peak <= column_peak * max_ratio) &
+                 (column_peak <= row_peak * max_ratio) &
+                 # And stand out from the other rows and columns
+                 (np.sort(rows, axis=1)[:, -2] < 0.5 * row_peak) &
+                 (np.sort(columns, axis=1)[:, -2] < 0.5 * column_peak))
+        labels.append(np.where(valid, row * 4 + column, -1))
+    if not labels:
+        return ''
+
+    runs = _runs(np.concatenate(labels))
+    digits = []
+    previous = None
+    for index, (label, _, length) in enumerate(runs):
+        if label < 0:
+            # A single frame drop out doesn't end a digit
+            if length == 1 and 0 < index < len(runs) - 1 and \
+                    runs[index - 1][0] == runs[index + 1][0]:
+                continue
+            previous = None
+            continue
+        if length >= min_frames and label != previous:
+            digits.append(DTMF_KEYS[label // 4][label % 4])
+        previous = label
+    return ''.join(digits)
+
+
+def compare_tones(expected, actual, frequency_tolerance=7,
+                  duration_tolerance=1000):
+    """Compare detected tones against the expected ones
+
+    Keyword Arguments:
+    expected            A list of dictionaries with 'frequency' and
+                        'duration' (in milliseconds) keys
+    actual              The tones returned by detect_tones
+    frequency_tolerance The allowed difference in frequency, in Hz
+    duration_tolerance  The allowed difference in duration, in milliseconds
+
+    Returns:
+    True if the tones match
+    """
+    if len(expected) != len(actual):
+        LOGGER.error("Number of expected tones %s does not match detected "
+                     "%s", expected, actual)
+        return False
+
+    for i, (tone, found) in enumerate(zip(expected, actual)):
+        LOGGER.info("Checking tone %s against detected %s", tone, found)
+        if abs(tone['duration'] - found['duration'] * 1000) > \
+                duration_tolerance:
+            LOGGER.error("Tone #%d %s duration out of range for %s", i, tone,
+                         found)
+            return False
+        if abs(tone['frequency'] - found['frequency']) > frequency_tolerance:
+            LOGGER.error("Tone #%d %s frequency out of range for %s", i,
+                         tone, found)
+            return False
+    return True
@@ -13,6 +13,8 @@ import sys
 from . import astcsv
 import logging
 
+from twisted.internet import task
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -50,9 +52,45 @@ class CDRModule(object):
                 self.cdr_records[ast_id][file_name].append(
                     AsteriskCSVCDRLine(**dict_record))
 
+        # CDR files are followed while the test runs, so that only the
+        # records written since the last read are left when it stops
+        self.matchers = {}
+        self.follow_loop = task.LoopingCall(self._follow_cdr_records)
+
         # Hook ourselves onto the test object
+        test_object.register_start_observer(self._start_following)
         test_object.register_stop_observer(self._check_cdr_records)
 
+    def _start_following(self, ast):
+        """Start reading the CDR files periodically
+
+        Parameters:
+        ast The running Asterisk instances
+        """
+        self.follow_loop.start(astcsv.FOLLOW_INTERVAL, now=False)
+
+    def _follow_cdr_records(self):
+        """Read the CDR records written since the last read"""
+        for ast_id in self.cdr_records:
+            for file_name in self.cdr_records[ast_id]:
+                self._get_matcher(ast_id, file_name).update()
+
+    def _get_matcher(self, ast_id, file_name):
+        """Get the matcher following a CDR file
+
+        Parameters:
+        ast_id The index of the Asterisk instance writing the file
+        file_name The name of the file, without the .csv extension
+        """
+        key = (ast_id, file_name)
+        if key not in self.matchers:
+            records = self.cdr_records[ast_id][file_name]
+            self.matchers[key] = AsteriskCSVCDR(records=records).matcher(
+                self.test_object.ast[ast_id].get_path(
+                    "astlogdir", self.file_locations[file_name],
+                    "%s.csv" % file_name))
+        return self.matchers[key]
+
     def _check_cdr_records(self, callback_param):
         """A deferred callback method that is called by the TestCase
         derived object when all Asterisk instances have stopped
@@ -61,6 +99,8 @@ class CDRModule(object):
         callback_param
         """
         LOGGER.debug("Checking CDR records...")
+        if self.follow_loop.running:
+            self.follow_loop.stop()
         try:
             self.match_cdrs()
         except:
@@ -75,17 +115,14 @@ class CDRModule(object):
         """
         expectations_met = True
         for ast_id in self.cdr_records:
-            ast_instance = self.test_object.ast[ast_id]
             for file_name in self.cdr_records[ast_id]:
-                records = self.cdr_records[ast_id][file_name]
-                cdr_expect = AsteriskCSVCDR(records=records)
-                cdr_file = AsteriskCSVCDR(filename=ast_instance.get_path(
-                    "astlogdir", self.file_locations[file_name],
-                    "%s.csv" % file_name))
-                if cdr_expect.match(cdr_file):
+                matcher = self._get_matcher(ast_id, file_name)
+                matcher.update()
+                if matcher.matched():
                     LOGGER.debug("%s.csv: CDR results met expectations" %
                                  file_name)
                 else:
+                    matcher.report()
                     LOGGER.error("%s.csv: actual did not match expected." %
                                  file_name)
                     expectations_met = False
@@ -14,6 +14,8 @@ from . import astcsv
 import re
 import logging
 
+from twisted.internet import task
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -95,9 +97,41 @@ class CELModule(object):
                 file_records = self.cel_records[file_name]
                 file_records.append(AsteriskCSVCELLine(**dict_record))
 
+        # CEL files are followed while the test runs, so that only the
+        # records written since the last read are left when it stops
+        self.matchers = {}
+        self.follow_loop = task.LoopingCall(self._follow_cel_records)
+
         # Hook ourselves onto the test object
+        test_object.register_start_observer(self._start_following)
         test_object.register_stop_observer(self._check_cel_records)
 
+    def _start_following(self, ast):
+        """Start reading the CEL files periodically
+
+        Parameters:
+        ast The running Asterisk instances
+        """
+        self.follow_loop.start(astcsv.FOLLOW_INTERVAL, now=False)
+
+    def _follow_cel_records(self):
+        """Read the CEL records written since the last read"""
+        for key in self.cel_records:
+            self._get_matcher(key).update()
+
+    def _get_matcher(self, key):
+        """Get the matcher following a CEL file
+
+        Parameters:
+        key The name of the file, without the .csv extension
+        """
+        if key not in self.matchers:
+            self.matchers[key] = AsteriskCSVCEL(
+                records=self.cel_records[key]).matcher(
+                    self.test_object.ast[0].get_path(
+                        "astlogdir", "cel-custom", "%s.csv" % key))
+        return self.matchers[key]
+
     def _check_cel_records(self, callback_param):
         """A deferred callback method that is called by the TestCase
         derived object when all Asterisk instances have stopped
@@ -106,6 +140,8 @@ class CELModule(object):
         callback_param
         """
         LOGGER.debug("Checking CEL records...")
+        if self.follow_loop.running:
+            self.follow_loop.stop()
         self.match_cels()
         return callback_param
 
@@ -116,12 +152,12 @@ class CELModule(object):
         """
         expectations_met = True
         for key in self.cel_records:
-            cel_expect = AsteriskCSVCEL(records=self.cel_records[key])
-            cel_file = AsteriskCSVCEL(filename=self.test_object.ast[0].get_path(
-                "astlogdir", "cel-custom", "%s.csv" % key))
-            if cel_expect.match(cel_file):
+            matcher = self._get_matcher(key)
+            matcher.update()
+            if matcher.matched():
                 LOGGER.debug("%s.csv - CEL results met expectations" % key)
             else:
+                matcher.report()
                 msg = ("%s.csv - CEL results did not meet expectations. "
                        "Test Failed." % key)
                 LOGGER.error(msg)
@@ -78,7 +78,7 @@ class ChannelTestCondition(TestCondition):
         # Set to pass and let a failure override
         super(ChannelTestCondition, self).pass_check()
 
-        exec_list = [ast.cli_exec('core show channels').
+        exec_list = [self.cli_exec(ast, 'core show channels').
                      addCallback(__channel_callback) for ast in self.ast]
         defer.DeferredList(exec_list).addCallback(_raise_finished,
                                                   finish_deferred)
@@ -0,0 +1,130 @@
+"""Test discovery index
+
+This module provides a persistent cache of the parsed tests.yaml and
+test-config.yaml files, and of the test metadata derived from them, so that
+discovering tests doesn't require parsing and processing every YAML file in
+the tree on each invocation.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import logging
+import os
+import pickle
+import yaml
+
+try:
+    from yaml import CSafeLoader as MyLoader
+except ImportError:
+    from yaml import SafeLoader as MyLoader
+
+LOGGER = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the stored index changes
+INDEX_VERSION = 2
+
+
+class DiscoveryIndex(object):
+    """A cache of parsed YAML files and their derived metadata, keyed on path.
+
+    An entry is only used while the file's modification time and size are
+    unchanged, so only files that were edited since the index was last saved
+    are parsed again. The returned objects are shared with the index and
+    must not be modified by callers. Entries of files that no longer exist
+    are dropped when the index is saved.
+    """
+
+    def __init__(self, path):
+        """Load the index.
+
+        Keyword Arguments:
+        path The path of the index file. A missing, unreadable or outdated
+             index results in an empty one.
+        """
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'rb') as index_file:
+                index = pickle.load(index_file)
+            if index.get('version') == INDEX_VERSION:
+                self.entries = index['entries']
+        except Exception as err:
+            LOGGER.warning("Ignoring unreadable discovery index %s: %s" %
+                           (path, err))
+
+    def load_yaml(self, path):
+        """Retrieve the parsed contents of a YAML file.
+
+        Raises IOError if the file can't be read, or yaml.YAMLError if it
+        can't be parsed. Neither is cached.
+        """
+        return self._entry(path)[1]
+
+    def metadata(self, path, build):
+        """Retrieve the metadata derived from a YAML file.
+
+        Keyword Arguments:
+        path The path of the YAML file
+        build A callable that derives the metadata from the parsed file. It
+              is only called if the file changed since its metadata was
+              stored, and the metadata it returns must be picklable.
+
+        Raises the same exceptions as load_yaml.
+        """
+        entry = self._entry(path)
+        if entry[2] is None:
+            entry[2] = build(entry[1])
+            self.dirty = True
+        return entry[2]
+
+    def _entry(self, path):
+        """Get the up to date [key, config, metadata] entry of a file"""
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self.entries.get(path)
+        if entry and entry[0] == key:
+            return entry
+
+        with open(path, 'r') as yaml_file:
+            config = yaml.load(yaml_file, Loader=MyLoader)
+
+        entry = [key, config, None]
+        self.entries[path] = entry
+        self.dirty = True
+        return entry
+
+    def _prune(self):
+        """Drop the entries of files that no longer exist"""
+        for path in [path for path in self.entries
+                     if not os.path.exists(path)]:
+            del self.entries[path]
+            self.dirty = True
+
+    def save(self):
+        """Write the index to disk if anything changed."""
+        if not self.path:
+            return
+
+        self._prune()
+        if not self.dirty:
+            return
+
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as index_file:
+                pickle.dump({'version': INDEX_VERSION,
+                             'entries': self.entries},
+                            index_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self.path)
+            self.dirty = False
+        except (IOError, OSError, pickle.PicklingError) as err:
+            LOGGER.warning("Failed to save discovery index %s: %s" %
+                           (self.path, err))
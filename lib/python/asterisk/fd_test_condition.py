@@ -95,7 +95,8 @@ class FdTestCondition(TestCondition):
                                 "object" % line)
             self.file_descriptors[result.host] = fds
 
-        return ast.cli_exec("core show fd").addCallback(__show_fd_callback)
+        return self.cli_exec(ast, "core show fd").addCallback(
+            __show_fd_callback)
 
 
 class FdPreTestCondition(FdTestCondition):
@@ -0,0 +1,311 @@
+"""HEPv3 encoding and decoding
+
+This module implements the HEPv3 (Homer Encapsulation Protocol) packet
+format used by Asterisk's res_hep to mirror SIP and RTCP traffic to a
+capture server. Packets are decoded from a memoryview of the datagram with
+precompiled structs; the payload is only turned into text when it is read.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import socket
+import struct
+import zlib
+
+
+def enum(**enums):
+    """Make an enumeration out of the passed in values"""
+    return type('Enum', (), enums)
+
+HEP_ID = b'HEP3'
+
+IP_FAMILY = enum(v4=2, v6=10)
+
+HEP_CHUNK_TYPES = enum(ip_family=1,
+                       ip_id=2,
+                       src_ipv4=3,
+                       dst_ipv4=4,
+                       src_ipv6=5,
+                       dst_ipv6=6,
+                       src_port=7,
+                       dst_port=8,
+                       time_sec=9,
+                       time_usec=10,
+                       protocol_type=11,
+                       capture_agent_id=12,
+                       keep_alive=13,
+                       auth_key=14,
+                       payload=15,
+                       compressed_payload=16,
+                       uuid=17)
+
+HEP_VARIABLE_TYPES = enum(auth_key=14,
+                          payload=15,
+                          uuid=17)
+
+HEP_PROTOCOL_TYPE = enum(SIP=1,
+                         H323=2,
+                         SDP=3,
+                         RTP=4,
+                         RTCP=5,
+                         MGCP=6,
+                         MEGACO=7,
+                         M2UA=8,
+                         M3UA=9,
+                         IAX=10)
+
+HEP_PROTOCOL_TYPES_TO_STRING = {
+    HEP_PROTOCOL_TYPE.SIP: 'SIP',
+    HEP_PROTOCOL_TYPE.H323: 'H323',
+    HEP_PROTOCOL_TYPE.SDP: 'SDP',
+    HEP_PROTOCOL_TYPE.RTP: 'RTP',
+    HEP_PROTOCOL_TYPE.RTCP: 'RTCP',
+    HEP_PROTOCOL_TYPE.MGCP: 'MGCP',
+    HEP_PROTOCOL_TYPE.MEGACO: 'MEGACO',
+    HEP_PROTOCOL_TYPE.M2UA: 'M2UA',
+    HEP_PROTOCOL_TYPE.M3UA: 'M3UA',
+    HEP_PROTOCOL_TYPE.IAX: 'IAX',
+}
+
+HEADER = struct.Struct('!4sH')
+CHUNK = struct.Struct('!HHH')
+UINT8 = struct.Struct('!B')
+UINT16 = struct.Struct('!H')
+UINT32 = struct.Struct('!I')
+
+# The generic chunks are defined by vendor 0
+GENERIC_VENDOR = 0
+
+
+class HEPError(ValueError):
+    """A datagram that isn't a valid HEPv3 packet"""
+    pass
+
+
+def _uint8(data, offset, length):
+    return data[offset]
+
+
+def _uint16(data, offset, length):
+    return UINT16.unpack_from(data, offset)[0]
+
+
+def _uint32(data, offset, length):
+    return UINT32.unpack_from(data, offset)[0]
+
+
+def _ipv4(data, offset, length):
+    return socket.inet_ntop(socket.AF_INET, data[offset:offset + 4])
+
+
+def _ipv6(data, offset, length):
+    return socket.inet_ntop(socket.AF_INET6, data[offset:offset + 16])
+
+
+def _text(data, offset, length):
+    return str(data[offset:offset + length], 'utf-8', 'replace').rstrip(
+        '\x00')
+
+
+def _raw(data, offset, length):
+    return data[offset:offset + length]
+
+
+# Chunk type to the attribute it sets and the function decoding its value
+CHUNK_DECODERS = {
+    HEP_CHUNK_TYPES.ip_family: ('ip_family', _uint8),
+    HEP_CHUNK_TYPES.ip_id: ('ip_id', _uint8),
+    HEP_CHUNK_TYPES.src_ipv4: ('src_addr', _ipv4),
+    HEP_CHUNK_TYPES.dst_ipv4: ('dst_addr', _ipv4),
+    HEP_CHUNK_TYPES.src_ipv6: ('src_addr', _ipv6),
+    HEP_CHUNK_TYPES.dst_ipv6: ('dst_addr', _ipv6),
+    HEP_CHUNK_TYPES.src_port: ('src_port', _uint16),
+    HEP_CHUNK_TYPES.dst_port: ('dst_port', _uint16),
+    HEP_CHUNK_TYPES.time_sec: ('time_sec', _uint32),
+    HEP_CHUNK_TYPES.time_usec: ('time_usec', _uint32),
+    HEP_CHUNK_TYPES.protocol_type: ('protocol_type', _uint8),
+    HEP_CHUNK_TYPES.capture_agent_id: ('capture_agent_id', _uint32),
+    HEP_CHUNK_TYPES.keep_alive: ('keep_alive', _uint16),
+    HEP_CHUNK_TYPES.auth_key: ('auth_key', _text),
+    HEP_CHUNK_TYPES.payload: ('raw_payload', _raw),
+    HEP_CHUNK_TYPES.compressed_payload: ('compressed_payload', _raw),
+    HEP_CHUNK_TYPES.uuid: ('uuid', _text),
+}
+
+# Attributes that are printed and encoded, in the order they are encoded
+FIELDS = ('ip_family', 'ip_id', 'src_port', 'dst_port', 'time_sec',
+          'time_usec', 'protocol_type', 'capture_agent_id', 'src_addr',
+          'dst_addr', 'keep_alive', 'auth_key', 'payload', 'uuid')
+
+
+class HEPPacket(object):
+    """A HEPv3 packet
+
+    Attributes:
+    hep_ctrl         The protocol identifier, b'HEP3'
+    ip_family        IP_FAMILY of the captured packet
+    ip_id            The IP protocol number of the captured packet
+    src_addr         Source address of the captured packet
+    dst_addr         Destination address of the captured packet
+    src_port         Source port of the captured packet
+    dst_port         Destination port of the captured packet
+    time_sec         Capture time, in seconds
+    time_usec        Microseconds of the capture time
+    protocol_type    HEP_PROTOCOL_TYPE of the payload
+    capture_agent_id ID of the sender
+    auth_key         Authentication key, if any
+    uuid             Correlation ID, if any
+    raw_payload      The payload bytes
+    payload          The payload as text, decoded when first read
+    """
+
+    def __init__(self, **kwargs):
+        """Constructor
+
+        Keyword Arguments:
+        The attributes of the packet. payload may be given as text or bytes.
+        """
+        self.hep_ctrl = HEP_ID
+        self.ip_family = None
+        self.ip_id = None
+        self.src_addr = None
+        self.dst_addr = None
+        self.src_port = None
+        self.dst_port = None
+        self.time_sec = None
+        self.time_usec = None
+        self.protocol_type = None
+        self.capture_agent_id = None
+        self.keep_alive = None
+        self.auth_key = None
+        self.uuid = None
+        self.raw_payload = None
+        self.compressed_payload = None
+        self._payload = None
+        payload = kwargs.pop('payload', None)
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        if isinstance(payload, str):
+            self._payload = payload
+            payload = payload.encode('utf-8')
+        if payload is not None:
+            self.raw_payload = payload
+
+    @property
+    def payload(self):
+        """The payload as text"""
+        if self._payload is None:
+            if self.raw_payload is not None:
+                data = self.raw_payload
+            elif self.compressed_payload is not None:
+                data = zlib.decompress(self.compressed_payload)
+            else:
+                return None
+            self._payload = str(data, 'utf-8', 'replace').rstrip('\x00')
+        return self._payload
+
+    def to_dict(self):
+        """The attributes of the packet, with the payload decoded"""
+        return dict((field, getattr(self, field)) for field in FIELDS)
+
+    def __str__(self):
+        return str(self.to_dict())
+
+
+def decode(data):
+    """Decode a HEPv3 packet
+
+    Keyword Arguments:
+    data The bytes of the datagram
+
+    Returns:
+    A HEPPacket
+
+    Raises:
+    HEPError if the datagram isn't a valid HEPv3 packet
+    """
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise HEPError("Packet of %d bytes is too short" % len(view))
+    hep_id, total_length = HEADER.unpack_from(view)
+    if hep_id != HEP_ID:
+        raise HEPError("Packet starts with %r, not %r" % (hep_id, HEP_ID))
+    if total_length > len(view):
+        raise HEPError("Packet length %d exceeds the %d bytes received" %
+                       (total_length, len(view)))
+
+    packet = HEPPacket()
+    chunk_size = CHUNK.size
+    offset = HEADER.size
+    while offset + chunk_size <= total_length:
+        vendor_id, type_id, length = CHUNK.unpack_from(view, offset)
+        if length < chunk_size or offset + length > total_length:
+            raise HEPError("Chunk %d has invalid length %d" % (type_id,
+                                                                length))
+        if vendor_id == GENERIC_VENDOR:
+            decoder = CHUNK_DECODERS.get(type_id)
+            if decoder is not None:
+                setattr(packet, decoder[0], decoder[1](
+                    view, offset + chunk_size, length - chunk_size))
+        offset += length
+    return packet
+
+
+def _chunk(type_id, value):
+    """Encode a generic chunk"""
+    return CHUNK.pack(GENERIC_VENDOR, type_id, CHUNK.size + len(value)) + \
+        value
+
+
+def encode(packet):
+    """Encode a HEPv3 packet
+
+    Keyword Arguments:
+    packet The HEPPacket to encode
+
+    Returns:
+    The bytes of the packet
+    """
+    chunks = []
+    for type_id, attribute, value_struct in (
+            (HEP_CHUNK_TYPES.ip_family, 'ip_family', UINT8),
+            (HEP_CHUNK_TYPES.ip_id, 'ip_id', UINT8),
+            (HEP_CHUNK_TYPES.src_port, 'src_port', UINT16),
+            (HEP_CHUNK_TYPES.dst_port, 'dst_port', UINT16),
+            (HEP_CHUNK_TYPES.time_sec, 'time_sec', UINT32),
+            (HEP_CHUNK_TYPES.time_usec, 'time_usec', UINT32),
+            (HEP_CHUNK_TYPES.protocol_type, 'protocol_type', UINT8),
+            (HEP_CHUNK_TYPES.capture_agent_id, 'capture_agent_id', UINT32),
+            (HEP_CHUNK_TYPES.keep_alive, 'keep_alive', UINT16)):
+        value = getattr(packet, attribute)
+        if value is not None:
+            chunks.append(_chunk(type_id, value_struct.pack(value)))
+
+    if packet.ip_family == IP_FAMILY.v6:
+        family = socket.AF_INET6
+        types = (HEP_CHUNK_TYPES.src_ipv6, HEP_CHUNK_TYPES.dst_ipv6)
+    else:
+        family = socket.AF_INET
+        types = (HEP_CHUNK_TYPES.src_ipv4, HEP_CHUNK_TYPES.dst_ipv4)
+    for type_id, addr in zip(types, (packet.src_addr, packet.dst_addr)):
+        if addr is not None:
+            chunks.append(_chunk(type_id, socket.inet_pton(family, addr)))
+
+    if packet.auth_key is not None:
+        chunks.append(_chunk(HEP_CHUNK_TYPES.auth_key,
+                             packet.auth_key.encode('utf-8')))
+    if packet.raw_payload is not None:
+        chunks.append(_chunk(HEP_CHUNK_TYPES.payload,
+                             bytes(packet.raw_payload)))
+    elif packet.compressed_payload is not None:
+        chunks.append(_chunk(HEP_CHUNK_TYPES.compressed_payload,
+                             bytes(packet.compressed_payload)))
+    if packet.uuid is not None:
+        chunks.append(_chunk(HEP_CHUNK_TYPES.uuid,
+                             packet.uuid.encode('utf-8')))
+
+    body = b''.join(chunks)
+    return HEADER.pack(HEP_ID, HEADER.size + len(body)) + body
@@ -0,0 +1,224 @@
+"""Pool of running Asterisk instances
+
+This module keeps track of Asterisk instances that were left running by a
+finished test, so that a later test whose installed configuration is
+identical can reuse the instance instead of booting a new one.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import signal
+import stat
+import uuid
+
+from .test_suite_utils import pid_running
+
+LOGGER = logging.getLogger(__name__)
+
+# Name of the pool directory inside the test suite root directory
+POOL_DIR = "instance-pool"
+
+
+class InstancePool(object):
+    """A registry of idle Asterisk instances.
+
+    Instances are stored under a key describing their configuration. Each
+    idle instance is recorded as a dictionary with the 'base' directory of
+    the instance, the 'pid' and 'binary' of its Asterisk process, the path of
+    its control socket 'ctl' and the 'test' that last used it. The registry
+    is a JSON file in the pool directory, protected by a lock file.
+
+    A recorded process is only used or stopped once it is confirmed to still
+    be the pooled Asterisk, as its PID may have been reused since.
+    """
+
+    def __init__(self, root):
+        """Create the pool.
+
+        Keyword Arguments:
+        root The directory holding the pool registry and the directories of
+             the pooled instances
+        """
+        self.root = root
+        self.registry = os.path.join(root, "pool.json")
+        self.lock_file = os.path.join(root, "pool.lock")
+
+    def new_base(self, instance_id):
+        """Create a directory for a new instance that may later be pooled.
+
+        Returns:
+        The base directory for the instance
+        """
+        base = os.path.join(self.root, uuid.uuid4().hex[:8],
+                            "ast%d" % instance_id)
+        os.makedirs(base)
+        return base
+
+    @staticmethod
+    def instance_key(base, extra=None):
+        """Compute the key describing an installed instance.
+
+        The key is a hash of every regular file below the base directory,
+        with the base directory itself replaced so that identical
+        configurations installed in different directories hash the same.
+        Symbolic links, such as those mirroring the system sounds, are the
+        same for every instance and are skipped.
+
+        Keyword Arguments:
+        base The base directory of the instance
+        extra A list of additional strings to include in the key
+        """
+        digest = hashlib.sha1()
+        for value in extra or []:
+            digest.update(value.encode('utf-8'))
+            digest.update(b'\0')
+
+        base_bytes = base.encode('utf-8')
+        for dirname, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirname, filename)
+                if os.path.islink(path):
+                    continue
+                digest.update(os.path.relpath(path, base).encode('utf-8'))
+                digest.update(b'\0')
+                with open(path, 'rb') as installed_file:
+                    data = installed_file.read()
+                digest.update(data.replace(base_bytes, b'<<base>>'))
+                digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _update(self, func):
+        """Run func on the registry while holding the lock, saving it
+        afterwards. Returns what func returns."""
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.registry, 'r') as registry:
+                        idle = json.load(registry)
+                except (IOError, ValueError):
+                    idle = {}
+                res = func(idle)
+                with open(self.registry, 'w') as registry:
+                    json.dump(idle, registry)
+                return res
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def is_instance(record):
+        """Check that the process of a record is still the pooled Asterisk
+
+        The process must run the recorded binary, and the control socket of
+        the instance must still exist.
+        """
+        pid = record.get('pid')
+        binary = record.get('binary')
+        ctl = record.get('ctl')
+        if not pid or not binary or not ctl or not pid_running(pid):
+            return False
+        try:
+            if not stat.S_ISSOCK(os.stat(ctl).st_mode):
+                return False
+        except OSError:
+            return False
+        if not os.path.isdir('/proc/self'):
+            # The binary of a process can't be checked without /proc
+            return True
+        try:
+            exe = os.readlink('/proc/%d/exe' % pid)
+        except OSError:
+            return False
+        return exe == os.path.realpath(binary)
+
+    @staticmethod
+    def _stop(record):
+        """Stop the process of a record, if it is still the pooled Asterisk,
+        and remove the directory of the instance"""
+        if InstancePool.is_instance(record):
+            try:
+                os.kill(record['pid'], signal.SIGKILL)
+            except OSError:
+                pass
+        else:
+            LOGGER.warning("Not stopping pooled Asterisk %s: it is no longer "
+                           "running" % record.get('pid'))
+        shutil.rmtree(os.path.dirname(record['base']), ignore_errors=True)
+
+    def checkout(self, key):
+        """Take an idle, still running instance with the given key out of
+        the pool.
+
+        Returns:
+        The instance record, or None if there is no usable instance
+        """
+        def _checkout(idle):
+            records = idle.get(key, [])
+            while records:
+                record = records.pop()
+                if self.is_instance(record):
+                    return record
+                LOGGER.warning("Pooled Asterisk %s is gone" %
+                               record.get('pid'))
+            idle.pop(key, None)
+            return None
+        return self._update(_checkout)
+
+    def checkin(self, key, record):
+        """Return an idle instance to the pool."""
+        def _checkin(idle):
+            idle.setdefault(key, []).append(record)
+        self._update(_checkin)
+
+    def discard(self, test_name):
+        """Stop the idle instances last used by a test.
+
+        This is used for a test that failed, whose instances may be left in
+        a state later tests must not see.
+        """
+        if not os.path.isdir(self.root):
+            return
+
+        def _discard(idle):
+            discarded = []
+            for key in list(idle):
+                kept = []
+                for record in idle[key]:
+                    if record.get('test') == test_name:
+                        discarded.append(record)
+                    else:
+                        kept.append(record)
+                if kept:
+                    idle[key] = kept
+                else:
+                    del idle[key]
+            return discarded
+
+        for record in self._update(_discard):
+            self._stop(record)
+
+    def drain(self):
+        """Stop every idle instance and remove the pool directory."""
+        if not os.path.isdir(self.root):
+            return
+
+        def _drain(idle):
+            records = [r for records in idle.values() for r in records]
+            idle.clear()
+            return records
+
+        for record in self._update(_drain):
+            self._stop(record)
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -190,7 +190,7 @@ class LockTestCondition(TestCondition):
                             LOGGER.warning(msg)
             return result
 
-        deferred = ast.cli_exec("core show locks")
+        deferred = self.cli_exec(ast, "core show locks")
         deferred.addCallback(__show_locks_callback)
         return deferred
 
@@ -7,21 +7,269 @@ the GNU General Public License Version 2.
 """
 
 import datetime
+import hashlib
 import logging
-import io
+import mmap
+import os
 
-from twisted.internet import reactor
+from twisted.internet import defer, reactor
+from twisted.internet.interfaces import IPushProducer
+from twisted.internet.task import LoopingCall
+from zope.interface import implementer
 from autobahn.twisted.websocket import WebSocketClientFactory, \
     WebSocketClientProtocol, connectWS, WebSocketServerFactory, \
     WebSocketServerProtocol
 
 LOGGER = logging.getLogger(__name__)
 
+# Interval between frames of a paced stream, in seconds (the codec's ptime)
+FRAME_INTERVAL = 0.02
+
+# Number of frames an unpaced stream sends before yielding to the reactor
+BURST_FRAMES = 50
+
+
+class MediaDigest(object):
+    """Incremental digest of a media stream.
+
+    The digest of the received media can be given the digest of the sent
+    media as a reference. Only as many received bytes as have been sent are
+    then hashed, since anything received beyond that is padding.
+    """
+
+    def __init__(self, reference=None):
+        """Constructor
+
+        :param reference The MediaDigest of the sent media, if any
+        """
+        self.reference = reference
+        self.hash = hashlib.sha1()
+        self.length = 0
+        self.hashed = 0
+
+    def update(self, data):
+        """Add data to the digest"""
+        self.length += len(data)
+        if self.reference is not None:
+            data = data[:max(self.reference.length - self.hashed, 0)]
+        self.hash.update(data)
+        self.hashed += len(data)
+
+    def hexdigest(self):
+        """The digest of the hashed data"""
+        return self.hash.hexdigest()
+
+    def matches(self):
+        """Check whether the hashed data is the same as the reference's"""
+        return (self.hashed == self.reference.hashed and
+                self.hexdigest() == self.reference.hexdigest())
+
+
+class MediaClock(object):
+    """A clock shared by every paced stream with the same frame interval."""
+
+    clocks = {}
+
+    def __init__(self, interval):
+        """Constructor
+
+        :param interval Time between ticks, in seconds
+        """
+        self.interval = interval
+        self.streams = []
+        self.loop = LoopingCall.withCount(self._tick)
+
+    @classmethod
+    def get(cls, interval):
+        """Get the clock for a frame interval"""
+        clock = cls.clocks.get(interval)
+        if clock is None:
+            clock = cls.clocks[interval] = cls(interval)
+        return clock
+
+    def add(self, stream):
+        """Start calling a stream on every tick"""
+        self.streams.append(stream)
+        if not self.loop.running:
+            self.loop.start(self.interval, now=True)
+
+    def remove(self, stream):
+        """Stop calling a stream"""
+        if stream in self.streams:
+            self.streams.remove(stream)
+        if not self.streams and self.loop.running:
+            self.loop.stop()
+
+    def _tick(self, count):
+        """Let every stream send the frames that are due
+
+        :param count The number of intervals since the last tick, which is
+         more than one if the reactor was busy
+        """
+        for stream in list(self.streams):
+            stream.tick(count)
+
+
+@implementer(IPushProducer)
+class MediaStream(object):
+    """Stream a media file over a media WebSocket.
+
+    The file is memory mapped and sent in frames. A paced stream sends one
+    frame per interval of its MediaClock. An unpaced stream sends frames as
+    fast as the connection takes them, yielding to the reactor every
+    BURST_FRAMES frames. Either way, the stream is registered as the producer
+    of the connection, and pauses while the connection's buffer is full.
+    """
+
+    def __init__(self, protocol, filename, frame_size=1000, interval=None,
+                 buffering=True, flow_control=False, sent_digest=None):
+        """Constructor
+
+        :param protocol The MediaWebSocketMixin protocol to send on
+        :param filename The file to send
+        :param frame_size The number of bytes in each frame
+        :param interval The time between frames, in seconds, or None to send
+         frames as fast as possible
+        :param buffering If True, tell Asterisk to buffer the media
+        :param flow_control If True, pause while Asterisk has sent MEDIA_XOFF
+        :param sent_digest A MediaDigest to update with the sent media
+        """
+        self.protocol = protocol
+        self.filename = filename
+        self.frame_size = frame_size
+        self.clock = MediaClock.get(interval) if interval else None
+        self.buffering = buffering
+        self.flow_control = flow_control
+        self.sent_digest = sent_digest
+        self.deferred = defer.Deferred()
+        self.position = 0
+        self.paused = set()
+        self.pending = None
+        self.done = False
+        self.registered = False
+
+        with open(filename, "rb") as media_file:
+            size = os.fstat(media_file.fileno()).st_size
+            self.media = mmap.mmap(media_file.fileno(), size,
+                                   access=mmap.ACCESS_READ) if size else b""
+        self.size = size
+
+    def start(self):
+        """Start streaming
+
+        :returns A deferred fired with the number of bytes sent once the
+         stream has finished
+        """
+        LOGGER.info(f"Playing '{self.filename}'")
+        try:
+            self.protocol.registerProducer(self, True)
+            self.registered = True
+        except RuntimeError:
+            LOGGER.debug("Connection already has a producer; not pausing "
+                         "while its buffer is full")
+        self.protocol.media_streams.append(self)
+        if self.buffering:
+            self.protocol.sendMessage(b"START_MEDIA_BUFFERING", isBinary=False)
+        if self.clock:
+            self.clock.add(self)
+        else:
+            self._burst()
+        return self.deferred
+
+    def _send_frame(self):
+        """Send the next frame, finishing the stream after the last one"""
+        frame = self.media[self.position:self.position + self.frame_size]
+        self.position += len(frame)
+        self.protocol.sendMessage(frame, isBinary=True)
+        if self.sent_digest is not None:
+            self.sent_digest.update(frame)
+        if self.position >= self.size:
+            self._finish(True)
+
+    def tick(self, count):
+        """Send the frames that are due on a clock tick"""
+        while count > 0 and not self.paused and not self.done:
+            self._send_frame()
+            count -= 1
+
+    def _burst(self):
+        """Send a burst of frames, and schedule the next one"""
+        self.pending = None
+        if self.size == 0:
+            self._finish(True)
+        sent = 0
+        while sent < BURST_FRAMES and not self.paused and not self.done:
+            self._send_frame()
+            sent += 1
+        if not self.paused and not self.done:
+            self.pending = reactor.callLater(0, self._burst)
+
+    def pause(self, reason):
+        """Pause the stream until resumed for the same reason"""
+        self.paused.add(reason)
+        if self.pending:
+            self.pending.cancel()
+            self.pending = None
+
+    def resume(self, reason):
+        """Resume a stream paused for a reason"""
+        self.paused.discard(reason)
+        if not self.paused and not self.done and not self.clock and \
+                not self.pending:
+            self.pending = reactor.callLater(0, self._burst)
+
+    def pauseProducing(self):
+        """The connection's buffer is full"""
+        self.pause("transport")
+
+    def resumeProducing(self):
+        """The connection's buffer has drained"""
+        self.resume("transport")
+
+    def stopProducing(self):
+        """The connection was lost"""
+        self._finish(False)
+
+    def _finish(self, completed):
+        """Stop streaming and fire the deferred"""
+        if self.done:
+            return
+        self.done = True
+        if self.pending:
+            self.pending.cancel()
+            self.pending = None
+        if self.clock:
+            self.clock.remove(self)
+        if self in self.protocol.media_streams:
+            self.protocol.media_streams.remove(self)
+        if self.registered:
+            self.registered = False
+            self.protocol.unregisterProducer()
+        if isinstance(self.media, mmap.mmap):
+            self.media.close()
+        if completed:
+            if self.buffering:
+                self.protocol.sendMessage(b"STOP_MEDIA_BUFFERING",
+                                          isBinary=False)
+            LOGGER.info(f"Stopping '{self.filename}'")
+        else:
+            LOGGER.info(f"Stopped '{self.filename}' after {self.position} "
+                        f"of {self.size} bytes")
+        self.deferred.callback(self.position)
+
+
 class MediaWebSocketMixin:
     def has_function(self, func):
         return hasattr(self.receiver, func) \
             and callable(getattr(self.receiver, func))
 
+    @property
+    def media_streams(self):
+        """The MediaStreams currently sending on this connection"""
+        if "_media_streams" not in self.__dict__:
+            self._media_streams = []
+        return self._media_streams
+
     def onConnect(self, request):
         LOGGER.debug("New WebSocket Connected")
         if self.has_function("on_ws_connect"):
@@ -34,30 +282,45 @@ class MediaWebSocketMixin:
 
     def onClose(self, wasClean, code, reason):
         LOGGER.debug(f"WebSocket closed({wasClean}, {code}, {reason})")
+        for stream in list(self.media_streams):
+            stream.stopProducing()
         if self.has_function("on_ws_closed"):
             self.receiver.on_ws_closed(self)
 
     def onMessage(self, msg, binary):
+        if not binary and msg.startswith((b"MEDIA_XOFF", b"MEDIA_XON")):
+            for stream in self.media_streams:
+                if not stream.flow_control:
+                    continue
+                if msg.startswith(b"MEDIA_XOFF"):
+                    stream.pause("xoff")
+                else:
+                    stream.resume("xoff")
         if self.has_function("on_message"):
             self.receiver.on_message(msg, binary)
 
-    def sendFile(self, filename, sent_buffer=None):
-        buff_size = 1000
-        f = io.open(filename, "rb", buffering=0)
-        LOGGER.info(f"Playing '{filename}'")
-        self.sendMessage(b"START_MEDIA_BUFFERING", isBinary=False)
-        while True:
-            buff = f.read(buff_size)
-            if buff is None or len(buff) <= 0:
-                break
-            # Send on the websocket
-            self.sendMessage(buff, isBinary=True)
-            if sent_buffer is not None:
-            # Save in buffer so we can compare to what was received.
-                sent_buffer.write(buff)
-        f.close()
-        self.sendMessage(b"STOP_MEDIA_BUFFERING", isBinary=False)
-        LOGGER.info(f"Stopping '{filename}'")
+    def sendFile(self, filename, frame_size=1000, interval=None,
+                 buffering=True, flow_control=False, sent_digest=None):
+        """Stream a media file without blocking the reactor.
+
+        :param filename The file to send
+        :param frame_size The number of bytes in each frame. A paced stream
+         should use the optimal_frame_size from MEDIA_START.
+        :param interval The time between frames in seconds, or None to send
+         as fast as the connection allows. Defaults to FRAME_INTERVAL if
+         buffering is False, since Asterisk then plays frames as they arrive.
+        :param buffering If True, the media is sent between
+         START_MEDIA_BUFFERING and STOP_MEDIA_BUFFERING
+        :param flow_control If True, sending pauses between MEDIA_XOFF and
+         MEDIA_XON
+        :param sent_digest A MediaDigest to update with the sent media
+
+        :returns A deferred fired with the number of bytes sent
+        """
+        if interval is None and not buffering:
+            interval = FRAME_INTERVAL
+        return MediaStream(self, filename, frame_size, interval, buffering,
+                           flow_control, sent_digest).start()
 
 class MediaWebSocketClientFactory(WebSocketClientFactory):
     """Twisted protocol factory for building Media WebSocket clients."""
@@ -0,0 +1,158 @@
+"""Template of the mirrored Asterisk directories
+
+Every Asterisk instance gets a copy of the system directory structure, with
+each installed file (sounds, music on hold, keys, ...) linked into it. This
+module builds that tree once, as a template, and stamps the template into
+each instance's directory in a single operation.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+
+import polyfill
+
+LOGGER = logging.getLogger(__name__)
+
+# Name of the template directory inside the test suite root directory
+TEMPLATE_DIR = "mirror-template"
+
+# Bumped whenever the layout of a template changes
+TEMPLATE_VERSION = 1
+
+# Files that are never linked into an instance
+BLACKLIST = ["astdb", "astdb.sqlite3"]
+
+
+class MirrorTemplate(object):
+    """A prebuilt tree of directories and links to installed files.
+
+    The template records the modification time of every source directory it
+    was built from. Adding or removing a file anywhere in the source tree
+    changes the modification time of its directory, so the template is only
+    rebuilt when the installation changes.
+    """
+
+    def __init__(self, root, mirrors, localtest_root=None):
+        """Create the template.
+
+        Keyword Arguments:
+        root The directory holding the templates
+        mirrors A list of (path, link_files) tuples. Each path is an Asterisk
+                directory, such as /var/lib/asterisk, whose directory tree is
+                mirrored. If link_files is False only the directories are
+                created. Each path may only be listed once.
+        localtest_root The AST_TEST_ROOT the paths are relative to, if any
+        """
+        self.mirrors = sorted(mirrors)
+        self.localtest_root = localtest_root or ""
+
+        digest = hashlib.sha1()
+        digest.update(json.dumps([TEMPLATE_VERSION, self.localtest_root,
+                                  self.mirrors]).encode('utf-8'))
+        self.path = os.path.join(root, digest.hexdigest()[:16])
+        self.tree = os.path.join(self.path, "tree")
+        self.manifest = os.path.join(self.path, "manifest.json")
+
+    def _is_current(self):
+        """Check whether the template exists and its sources are unchanged"""
+        try:
+            with open(self.manifest, 'r') as manifest_file:
+                stamps = json.load(manifest_file)
+        except (IOError, ValueError):
+            return False
+
+        for dirname, mtime in stamps.items():
+            try:
+                if os.stat(dirname).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _build(self, path):
+        """Build the template in the given directory"""
+        stamps = {}
+        tree = os.path.join(path, "tree")
+        for ast_dir_path, link_files in self.mirrors:
+            source = self.localtest_root + ast_dir_path
+            target = tree + ast_dir_path
+            if not os.path.isdir(target):
+                os.makedirs(target)
+
+            for dirname, dirnames, filenames in os.walk(source):
+                stamps[dirname] = os.stat(dirname).st_mtime_ns
+                short_dirname = dirname[len(self.localtest_root):]
+                target_dir = tree + short_dirname
+                for subdir in dirnames:
+                    subdir_path = os.path.join(target_dir, subdir)
+                    if not os.path.isdir(subdir_path):
+                        os.mkdir(subdir_path)
+                if not link_files:
+                    continue
+                for filename in filenames:
+                    link = os.path.join(target_dir, filename)
+                    if filename in BLACKLIST or os.path.lexists(link):
+                        continue
+                    os.symlink(os.path.join(dirname, filename), link)
+
+        with open(os.path.join(path, "manifest.json"), 'w') as manifest_file:
+            json.dump(stamps, manifest_file)
+
+    def update(self):
+        """Build the template if it is missing or out of date.
+
+        The new template is built next to the old one and moved into place,
+        so concurrent test runs never see a partially built template.
+        """
+        if self._is_current():
+            return
+
+        LOGGER.info("Building directory template %s" % self.path)
+        parent = os.path.dirname(self.path)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        new_path = "%s.%d.tmp" % (self.path, os.getpid())
+        old_path = "%s.%d.old" % (self.path, os.getpid())
+        shutil.rmtree(new_path, ignore_errors=True)
+        self._build(new_path)
+
+        try:
+            if os.path.exists(self.path):
+                os.rename(self.path, old_path)
+            os.rename(new_path, self.path)
+        except OSError:
+            # Somebody else replaced it at the same time; use theirs
+            LOGGER.debug("Directory template %s built concurrently" %
+                         self.path)
+        shutil.rmtree(new_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def stamp(self, base):
+        """Copy the template into the directory of an instance.
+
+        The links in the template are hard linked into the instance, so only
+        the directories are actually created. If 'cp' can't do that, the tree
+        is copied instead.
+
+        Keyword Arguments:
+        base The base directory of the instance
+        """
+        self.update()
+        if not os.path.isdir(base):
+            os.makedirs(base)
+        try:
+            subprocess.check_call(["cp", "-al", self.tree + "/.", base],
+                                  stderr=subprocess.DEVNULL)
+            return
+        except (OSError, subprocess.CalledProcessError):
+            LOGGER.debug("Unable to hard link directory template, copying")
+        polyfill.copytree(self.tree, base, symlinks=True, dirs_exist_ok=True)
@@ -0,0 +1,139 @@
+"""Spooled capture of test output
+
+The output of a test is written to a spool file as it is read, while only a
+bounded tail of it is kept in memory. Reports are built from the spool with
+a cap on their size, so a test printing hundreds of megabytes doesn't grow
+the test suite driver.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import collections
+import os
+import tempfile
+
+# Number of bytes read from a test's output at a time
+READ_SIZE = 64 * 1024
+
+# Number of characters of output kept in memory
+DEFAULT_TAIL_SIZE = 64 * 1024
+
+# Number of bytes of the spool put in a report
+DEFAULT_REPORT_SIZE = 1024 * 1024
+
+
+class OutputSpool(object):
+    """The output of a test, spooled to a file
+
+    Attributes:
+    filename The spool file
+    size     The number of bytes written to the spool
+    """
+
+    def __init__(self, filename=None, tail_size=DEFAULT_TAIL_SIZE):
+        """Constructor
+
+        Keyword Arguments:
+        filename  The spool file. Defaults to a new temporary file.
+        tail_size The number of characters of output to keep in memory
+        """
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix='testsuite-',
+                                            suffix='.out')
+            self.stream = os.fdopen(fd, 'wb')
+        else:
+            self.stream = open(filename, 'wb')
+        self.filename = filename
+        self.size = 0
+        self.tail_size = tail_size
+        self.chunks = collections.deque()
+        self.tail_length = 0
+        self.partial = ''
+
+    def write(self, text):
+        """Spool some output
+
+        Keyword Arguments:
+        text The output, including any line endings
+        """
+        data = text.encode('utf-8', 'replace')
+        self.stream.write(data)
+        self.size += len(data)
+        self.chunks.append(text)
+        self.tail_length += len(text)
+        while self.tail_length - len(self.chunks[0]) >= self.tail_size:
+            self.tail_length -= len(self.chunks.popleft())
+
+    def feed(self, data):
+        """Spool a chunk of output read from a test
+
+        Only complete lines are spooled. The rest is kept until the next
+        chunk completes it, or until finish is called.
+
+        Keyword Arguments:
+        data The bytes read
+
+        Returns:
+        A list of the lines completed by the chunk
+        """
+        lines = (self.partial + data.decode('ascii', 'ignore')).split('\n')
+        self.partial = lines.pop()
+        lines = [line.rstrip() for line in lines]
+        if lines:
+            self.write('\n'.join(lines) + '\n')
+        return lines
+
+    def finish(self):
+        """Spool the last line of output, if it had no line ending
+
+        Returns:
+        A list of the lines spooled
+        """
+        line, self.partial = self.partial.rstrip(), ''
+        if not line:
+            return []
+        self.write(line + '\n')
+        return [line]
+
+    def tail(self):
+        """The last tail_size characters of output"""
+        return ''.join(self.chunks)[-self.tail_size:]
+
+    def read(self, max_size=DEFAULT_REPORT_SIZE):
+        """Read the spooled output
+
+        Keyword Arguments:
+        max_size The most bytes of output to return. Longer output is cut
+                 in the middle, keeping its beginning and end.
+
+        Returns:
+        The output as text
+        """
+        if self.stream is not None:
+            self.stream.flush()
+        with open(self.filename, 'rb') as spool:
+            if self.size <= max_size:
+                return spool.read().decode('utf-8', 'replace')
+            head = spool.read(max_size // 2)
+            spool.seek(self.size - max_size // 2)
+            tail = spool.read()
+        return "%s\n[... %d bytes of output omitted ...]\n%s" % (
+            head.decode('utf-8', 'replace'), self.size - len(head) -
+            len(tail), tail.decode('utf-8', 'replace'))
+
+    def close(self):
+        """Close the spool file, keeping it for reading"""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def remove(self):
+        """Close and remove the spool file"""
+        self.close()
+        try:
+            os.unlink(self.filename)
+        except OSError:
+            pass
@@ -63,11 +63,21 @@ class PcapListener(object):
         buffer_size = module_config.get('buffer-size')
         self.debug_packets = module_config.get('debug-packets', False)
 
+        # Modules that neither log nor inspect packets only write the file
+        callback = None
+        if self.debug_packets or \
+                type(self).pcap_callback is not PcapListener.pcap_callback:
+            callback = self.__pcap_callback
+
         # Let exceptions propagate - if we can't create the pcap, this should
         # throw the exception to the pluggable module creation routines
 
-        PacketCapturer(device, bpf_filter, filename, self.__pcap_callback,
-            snaplen, buffer_size)
+        self.capturer = PacketCapturer(
+            device, bpf_filter, filename, callback, snaplen, buffer_size,
+            max_bytes=module_config.get('rotate-size'),
+            max_seconds=module_config.get('rotate-interval'),
+            max_files=module_config.get('max-files'),
+            compress=module_config.get('compress', False))
 
     def __pcap_callback(self, packet):
         """Private callback that logs packets if the configuration supports it
@@ -12,9 +12,12 @@ the GNU General Public License Version 2.
 """
 
 from codecs import ascii_decode
+from collections import deque
 import sys
 import logging
 import signal
+import socket
+import struct
 import argparse
 import binascii
 
@@ -31,112 +34,232 @@ from protocols.ipstack import ip_stack
 
 LOGGER = logging.getLogger(__name__)
 
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+# RTCP packet types: SR, RR, SDES, BYE and APP
+RTCP_PACKET_TYPES = range(200, 205)
+
+# Number of packets kept per source address in a sniffer's traces
+DEFAULT_TRACE_LIMIT = 10000
+
+
+class PacketView(object):
+    """A zero-copy view of the layers of a captured Ethernet frame
+
+    Only the fixed offsets needed to demultiplex the frame are read when the
+    view is created; the payload is a memoryview into the captured bytes.
+    Frames that aren't IP over Ethernet leave every attribute as None.
+
+    Attributes:
+    data     A memoryview of the whole frame
+    src_addr The source IP address, as text
+    protocol The IP protocol number of the transport layer
+    src_port The transport layer source port
+    dst_port The transport layer destination port
+    payload  A memoryview of the transport layer payload
+    """
+
+    __slots__ = ('data', 'src_addr', 'protocol', 'src_port', 'dst_port',
+                 'payload')
+
+    def __init__(self, raw_packet):
+        """Constructor
+
+        Keyword Arguments:
+        raw_packet The bytes comprising the frame
+        """
+        self.data = memoryview(raw_packet)
+        self.src_addr = None
+        self.protocol = None
+        self.src_port = None
+        self.dst_port = None
+        self.payload = None
+        try:
+            self.__decode(self.data)
+        except (struct.error, ValueError):
+            LOGGER.debug("Truncated frame of %d bytes", len(self.data))
+
+    def __decode(self, data):
+        (ether_type,) = struct.unpack_from('!H', data, 12)
+        if ether_type == ETHERTYPE_IPV4:
+            header_length = (data[14] & 0x0f) * 4
+            (total_length,) = struct.unpack_from('!H', data, 16)
+            protocol = data[23]
+            src_addr = socket.inet_ntoa(data[26:30])
+            offset = 14 + header_length
+            end = 14 + total_length
+        elif ether_type == ETHERTYPE_IPV6:
+            (payload_length,) = struct.unpack_from('!H', data, 18)
+            protocol = data[20]
+            src_addr = socket.inet_ntop(socket.AF_INET6, data[22:38])
+            offset = 54
+            end = offset + payload_length
+        else:
+            return
+
+        self.src_addr = src_addr
+        self.protocol = protocol
+        if protocol == IPPROTO_UDP:
+            self.src_port, self.dst_port, length = struct.unpack_from(
+                '!HHH', data, offset)
+            self.payload = data[offset + 8:offset + length]
+        elif protocol == IPPROTO_TCP:
+            self.src_port, self.dst_port = struct.unpack_from(
+                '!HH', data, offset)
+            self.payload = data[offset + (data[offset + 12] >> 4) * 4:end]
+
+
 class Packet():
     """Some IP packet.
 
     This class acts as a base class for everything else.
 
+    The layers are parsed the first time one of them is accessed.
+
     Attributes:
     packet_type     String name for the type of packet
     raw_packet      The raw bytes read off the socket
+    view            A PacketView of the raw bytes
     eth_layer       The layer 2 ethernet frame
     ip_layer        The layer 3 IPv4 or IPv6 frame
     transport_layer The layer 4 TCP or UDP information
     """
 
-    def __init__(self, packet_type, raw_packet):
+    def __init__(self, packet_type, raw_packet, view=None):
         """Constructor
 
         Keyword Arguments:
         packet_type A text string describing what type of packet this is
         raw_packet  The bytes comprising the packet
+        view        A PacketView of the packet, if one was already made
         """
         self.packet_type = packet_type
         self.raw_packet = raw_packet
-        if isinstance(self.raw_packet, str):
-            self.eth_layer = None
-            self.ip_layer = None
-            self.transport_layer = None
-        else:
-            self.eth_layer = ip_stack.parse(bytes(raw_packet))
-            self.ip_layer = self.eth_layer.next
-            self.transport_layer = self.ip_layer.next
+        self._view = view
+        self._eth_layer = None
+
+    @property
+    def view(self):
+        """A PacketView of the raw bytes, or None for a text packet"""
+        if self._view is None and not isinstance(self.raw_packet, str):
+            self._view = PacketView(self.raw_packet)
+        return self._view
+
+    @property
+    def eth_layer(self):
+        """The layer 2 ethernet frame"""
+        if self._eth_layer is None and not isinstance(self.raw_packet, str):
+            self._eth_layer = ip_stack.parse(bytes(self.raw_packet))
+        return self._eth_layer
+
+    @property
+    def ip_layer(self):
+        """The layer 3 IPv4 or IPv6 frame"""
+        return self.eth_layer.next if self.eth_layer else None
+
+    @property
+    def transport_layer(self):
+        """The layer 4 TCP or UDP information"""
+        return self.ip_layer.next if self.ip_layer else None
+
+    @property
+    def src_addr(self):
+        """Retrieve the source address"""
+        return self.view.src_addr if self.view else None
+
+    @property
+    def src_port(self):
+        """Retrieve the source port"""
+        return self.view.src_port if self.view else None
 
     @property
     def dst_port(self):
         """Retrieve the destination port"""
-        return self.transport_layer.header.destination
+        return self.view.dst_port if self.view else None
 
 
 class RTCPPacket(Packet):
     """An RTCP Packet
 
+    The header and reports are decoded the first time they are accessed.
+
     Attributes:
     rtcp_header     The RTCP header information
     sender_report   The SR report, if available
     receiver_report The RR report, if available
     """
 
-    def __init__(self, raw_packet, factory_manager):
+    def __init__(self, raw_packet, factory_manager, view=None):
         """Constructor
 
         Keyword Arguments:
         raw_packet      The bytes comprising this RTCP packet
         factory_manager The packet manager that created this packet
+        view            A PacketView of the packet, if one was already made
         """
-        Packet.__init__(self, packet_type='RTCP', raw_packet=raw_packet)
-        self.rtcp_header = None
-        self.sender_report = None
-        self.receiver_report = None
-        ports = factory_manager.get_global_data(self.ip_layer.header.source)
-        if ports is None:
-            raise Exception()
-        if (ports['rtcp'] != self.ip_layer.next.header.source):
-            raise Exception()
-        self.__parse_raw_data(self.transport_layer.next)
-
-    def __parse_raw_data(self, binary_blob):
-        header_def = 'rtcp_header' / BitStruct(
-                            'header' / BitStruct(
-                                      'version' / BitsInteger(2),
-                                      Padding(1),
-                                      'reception_report_count' / BitsInteger(5),
-                                      ),
-                            'packet_type' / Bytewise(Int8ub),
-                            'length' / Bytewise(Int16ub),
-                            'ssrc' / Bytewise(Int32ub)
-                            )
-        self.rtcp_header = header_def.parse(binary_blob)
-
-        report_block_def = GreedyRange(
-            'report_block' / BitStruct(
-                'ssrc' / Bytewise(Int32ub),
-                'lost_counts' / Struct(
-                    'fraction_lost' / BitsInteger(8),
-                    'packets_lost' / BitsInteger(24)
-                ),
-                'sequence_number_received' / Bytewise(Int32ub),
-                'interarrival_jitter' / Bytewise(Int32ub),
-                'last_sr' / Bytewise(Int32ub),
-                'delay_last_sr' / Bytewise(Int32ub)
-            )
-        )
-        if self.rtcp_header.packet_type == 200:
-            sender_def = Struct('sr',
-                                'sender_info' / Struct(
-                                       'ntp_msw' / Int32ub,
-                                       'ntp_lsw' / Int32ub,
-                                       'rtp_timestamp' / Int32ub,
-                                       'sender_packet_count' / Int32ub,
-                                       'sender_octet_count' / Int32ub
-                                       ),
-                                report_block_def)
-
-            self.sender_report = sender_def.parse(binary_blob[8:])
-        elif self.rtcp_header.packet_type == 201:
-            receiver_def = 'rr' / Struct(
-                                  report_block_def)
-            self.receiver_report = receiver_def.parse(binary_blob[8:])
+        Packet.__init__(self, packet_type='RTCP', raw_packet=raw_packet,
+                        view=view)
+        self._reports = None
+
+    @property
+    def rtcp_header(self):
+        """The RTCP header information"""
+        data = self.view.payload
+        first, packet_type, length, ssrc = struct.unpack_from('!BBHI', data)
+        return Container(
+            header=Container(version=first >> 6,
+                             reception_report_count=first & 0x1f),
+            packet_type=packet_type, length=length, ssrc=ssrc)
+
+    def __parse_reports(self):
+        """Decode the sender and receiver reports"""
+        if self._reports is not None:
+            return self._reports
+
+        data = self.view.payload
+        header = self.rtcp_header
+        offset = 8
+        sender_report = None
+        receiver_report = None
+        if header.packet_type == 200:
+            fields = struct.unpack_from('!IIIII', data, offset)
+            sender_info = Container(zip(
+                ('ntp_msw', 'ntp_lsw', 'rtp_timestamp',
+                 'sender_packet_count', 'sender_octet_count'), fields))
+            offset += 20
+        report_blocks = ListContainer()
+        while offset + 24 <= len(data) and \
+                len(report_blocks) < header.header.reception_report_count:
+            (ssrc, lost, received, jitter, last_sr,
+             delay_last_sr) = struct.unpack_from('!IIIIII', data, offset)
+            report_blocks.append(Container(
+                ssrc=ssrc,
+                lost_counts=Container(fraction_lost=lost >> 24,
+                                      packets_lost=lost & 0xffffff),
+                sequence_number_received=received,
+                interarrival_jitter=jitter, last_sr=last_sr,
+                delay_last_sr=delay_last_sr))
+            offset += 24
+        if header.packet_type == 200:
+            sender_report = Container(sender_info=sender_info,
+                                      report_block=report_blocks)
+        elif header.packet_type == 201:
+            receiver_report = Container(report_block=report_blocks)
+        self._reports = (sender_report, receiver_report)
+        return self._reports
+
+    @property
+    def sender_report(self):
+        """The SR report, if available"""
+        return self.__parse_reports()[0]
+
+    @property
+    def receiver_report(self):
+        """The RR report, if available"""
+        return self.__parse_reports()[1]
 
     def __str__(self):
         if self.sender_report is not None:
@@ -147,6 +270,9 @@ class RTCPPacket(Packet):
 
 class RTPPacket(Packet):
     """An RTP Packet
+
+    The fixed header fields are decoded from the captured bytes each time
+    they are accessed, rather than parsed up front.
     """
 
     rtp_header = "rtp_header" / BitStruct(
@@ -162,31 +288,40 @@ class RTPPacket(Packet):
         # 'csrc' can be added later when needed
     )
 
-    def __init__(self, raw_packet, factory_manager):
+    def __init__(self, raw_packet, factory_manager, view=None):
         """Constructor
 
         Keyword Arguments:
         raw_packet      The bytes comprising this RTP packet
         factory_manager The packet manager that created this packet
+        view            A PacketView of the packet, if one was already made
         """
-        Packet.__init__(self, packet_type='RTP', raw_packet=raw_packet)
+        Packet.__init__(self, packet_type='RTP', raw_packet=raw_packet,
+                        view=view)
 
-        self._rtp_header = self.rtp_header.parse(self.transport_layer.next)
+    @property
+    def version(self):
+        return self.view.payload[0] >> 6
 
-        ports = factory_manager.get_global_data(self.ip_layer.header.source)
-        if ports is None:
-            raise Exception()
-        if (ports['rtp'] != self.ip_layer.next.header.source):
-            raise Exception()
+    @property
+    def marker(self):
+        return self.view.payload[1] >> 7
 
+    @property
+    def payload_type(self):
+        return self.view.payload[1] & 0x7f
 
     @property
     def seqno(self):
-        return self._rtp_header.sequence_number
+        return struct.unpack_from('!H', self.view.payload, 2)[0]
 
     @property
     def timestamp(self):
-        return self._rtp_header.timestamp
+        return struct.unpack_from('!I', self.view.payload, 4)[0]
+
+    @property
+    def ssrc(self):
+        return struct.unpack_from('!I', self.view.payload, 8)[0]
 
 
 class SDPPacket(Packet):
@@ -443,14 +578,16 @@ class SIPPacket(Packet):
     ascii_packet ASCII string representation of the packet
     """
 
-    def __init__(self, ascii_packet, raw_packet):
+    def __init__(self, ascii_packet, raw_packet, view=None):
         """Constructor
 
         Keyword Arguments:
         ascii_packet The text of the SIP packet
         raw_packet   The bytes comprising this SIP packet
+        view         A PacketView of the packet, if one was already made
         """
-        Packet.__init__(self, packet_type='SIP', raw_packet=raw_packet)
+        Packet.__init__(self, packet_type='SIP', raw_packet=raw_packet,
+                        view=view)
 
         self.body = None
         self.headers = {}
@@ -493,11 +630,26 @@ class SIPPacketFactory():
         """
         self._factory_manager = factory_manager
 
-    def interpret_packet(self, packet):
+    def accepts(self, packet, view):
+        """Whether a packet may be SIP
+
+        SIP messages are text starting with a method name or 'SIP/2.0', so
+        anything not starting with an upper case letter is skipped.
+
+        Keyword Arguments:
+        packet The packet to interpret
+        view   A PacketView of the packet, or None for a text packet
+        """
+        if view is None:
+            return True
+        return bool(view.payload) and 0x41 <= view.payload[0] <= 0x5a
+
+    def interpret_packet(self, packet, view=None):
         """Interpret a packet
 
         Keyword Arguments:
         packet The packet to interpret
+        view   A PacketView of the packet, if one was already made
 
         Returns:
         None if we couldn't interpret this packet
@@ -505,13 +657,16 @@ class SIPPacketFactory():
         """
         ret_packet = None
         if not isinstance(packet, str):
-            hex_string = packet[42:]
-            ascii_string = hex_string.decode('ascii')
+            if view is None:
+                view = PacketView(packet)
+            if not view.payload:
+                return None
+            ascii_string = ascii_decode(view.payload)[0]
         else:
             ascii_string = packet
 
         if ('SIP/2.0' in ascii_string):
-            ret_packet = SIPPacket(ascii_string, packet)
+            ret_packet = SIPPacket(ascii_string, packet, view)
 
         # If we got a SIP packet, it has an SDP, and that SDP specified an
         # RTP port and RTCP port; then set that information for this particular
@@ -522,7 +677,7 @@ class SIPPacketFactory():
                 ret_packet.body.rtp_port != 0 and \
                 ret_packet.body.rtcp_port != 0:
             self._factory_manager.add_global_data(
-                ret_packet.ip_layer.header.source,
+                ret_packet.src_addr,
                 {'rtp': ret_packet.body.rtp_port,
                  'rtcp': ret_packet.body.rtcp_port})
         return ret_packet
@@ -540,22 +695,35 @@ class RTPPacketFactory():
         """
         self._factory_manager = factory_manager
 
-    def interpret_packet(self, packet):
+    def accepts(self, packet, view):
+        """Whether a packet is RTP from a port learned from an SDP
+
+        Keyword Arguments:
+        packet The packet to interpret
+        view   A PacketView of the packet, or None for a text packet
+        """
+        if view is None or view.protocol != IPPROTO_UDP or \
+                len(view.payload) < 12 or view.payload[0] >> 6 != 2:
+            return False
+        ports = self._factory_manager.get_global_data(view.src_addr)
+        return ports is not None and ports['rtp'] == view.src_port
+
+    def interpret_packet(self, packet, view=None):
         """Interpret a packet
 
         Keyword Arguments:
         packet The packet to interpret
+        view   A PacketView of the packet, if one was already made
 
         Returns:
         None if we couldn't interpret this packet
         A RTPPacket if we could
         """
-        ret_packet = None
-        try:
-            ret_packet = RTPPacket(packet, self._factory_manager)
-        except:
-            pass
-        return ret_packet
+        if view is None:
+            view = PacketView(packet)
+            if not self.accepts(packet, view):
+                return None
+        return RTPPacket(packet, self._factory_manager, view)
 
 
 class RTCPPacketFactory():
@@ -570,22 +738,36 @@ class RTCPPacketFactory():
         """
         self._factory_manager = factory_manager
 
-    def interpret_packet(self, packet):
+    def accepts(self, packet, view):
+        """Whether a packet is RTCP from a port learned from an SDP
+
+        Keyword Arguments:
+        packet The packet to interpret
+        view   A PacketView of the packet, or None for a text packet
+        """
+        if view is None or view.protocol != IPPROTO_UDP or \
+                len(view.payload) < 8 or view.payload[0] >> 6 != 2 or \
+                view.payload[1] not in RTCP_PACKET_TYPES:
+            return False
+        ports = self._factory_manager.get_global_data(view.src_addr)
+        return ports is not None and ports['rtcp'] == view.src_port
+
+    def interpret_packet(self, packet, view=None):
         """Interpret a packet
 
         Keyword Arguments:
         packet The packet to interpret
+        view   A PacketView of the packet, if one was already made
 
         Returns:
         None if we couldn't interpret this packet
         A RTCPPacket if we could
         """
-        ret_packet = None
-        try:
-            ret_packet = RTCPPacket(packet, self._factory_manager)
-        except:
-            pass
-        return ret_packet
+        if view is None:
+            view = PacketView(packet)
+            if not self.accepts(packet, view):
+                return None
+        return RTCPPacket(packet, self._factory_manager, view)
 
 
 class PacketFactoryManager():
@@ -639,21 +821,28 @@ class PacketFactoryManager():
         """Interpret a packet
 
         Iterate over all of the factories and ask them to interpret a packet.
-        Keep going until one of them says they got it.
+        Keep going until one of them says they got it. Factories with an
+        accepts method are only asked if it accepts the packet's ports and
+        leading bytes, so most packets are decoded by a single factory.
 
         Returns:
         An interpreted packet if some packet factory handled it
         None otherwise
         """
+        view = None if isinstance(packet, str) else PacketView(packet)
         interpreted_packet = None
         for factory in self._packet_factories:
+            accepts = getattr(factory, 'accepts', None)
             try:
-                interpreted_packet = factory.interpret_packet(packet)
+                if accepts is None:
+                    interpreted_packet = factory.interpret_packet(packet)
+                elif accepts(packet, view):
+                    interpreted_packet = factory.interpret_packet(packet,
+                                                                  view)
             except Exception as e:
-                LOGGER.debug('{0} threw Exception {1}'.format(factory, e))
+                LOGGER.debug('%s threw Exception %s', factory, e)
 
             if interpreted_packet is not None:
-                LOGGER.debug("Packet interpreted")
                 break
 
         return interpreted_packet
@@ -662,6 +851,13 @@ class PacketFactoryManager():
 class VOIPSniffer(object):
     """Base class for a pluggable module that wants to inspect packets
 
+    Configuration options:
+    trace-limit        The number of packets kept in the traces per source
+                       address. Older packets are dropped. 0 keeps every
+                       packet. Defaults to 10000.
+    trace-packet-types A list of the packet types kept in the traces, for
+                       example ['SIP']. Defaults to every type.
+
     Attributes:
     callbacks      Registered callbacks by packet type
     packet_factory The one and only PacketFactoryManager
@@ -676,12 +872,16 @@ class VOIPSniffer(object):
         module_config The module configuration for this pluggable module
         test_object   The object we will attach to
         """
+        module_config = module_config or {}
         self.packet_factory = PacketFactoryManager()
         self.packet_factory.create_factory(SIPPacketFactory)
         self.packet_factory.create_factory(RTPPacketFactory)
         self.packet_factory.create_factory(RTCPPacketFactory)
         self.callbacks = {}
         self.traces = {}
+        self.trace_limit = module_config.get('trace-limit',
+                                             DEFAULT_TRACE_LIMIT) or None
+        self.trace_packet_types = module_config.get('trace-packet-types')
 
     def process_packet(self, packet, addr):
         """Store a known packet in our traces and call our callbacks
@@ -697,15 +897,18 @@ class VOIPSniffer(object):
             LOGGER.debug("Interpreted packet is empty")
             return
 
-        if packet.ip_layer:
-            host = packet.ip_layer.header.source
-        if packet.transport_layer:
-            port = packet.transport_layer.header.source
-
-        LOGGER.debug('Processing packet from {0}:{1}'.format(host, port))
-        if host not in self.traces:
-            self.traces[host] = []
-        self.traces[host].append(packet)
+        if packet.src_addr is not None:
+            host = packet.src_addr
+        if packet.src_port is not None:
+            port = packet.src_port
+
+        LOGGER.debug('Processing %s packet from %s:%s', packet.packet_type,
+                     host, port)
+        if self.trace_packet_types is None or \
+                packet.packet_type in self.trace_packet_types:
+            if host not in self.traces:
+                self.traces[host] = deque(maxlen=self.trace_limit)
+            self.traces[host].append(packet)
         if packet.packet_type in self.callbacks:
             for callback in self.callbacks[packet.packet_type]:
                 callback(packet)
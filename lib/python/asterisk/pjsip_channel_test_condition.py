@@ -56,7 +56,7 @@ class PJSipChannelTestCondition(TestCondition):
         # Set to pass and let a failure override
         super(PJSipChannelTestCondition, self).pass_check()
 
-        exec_list = [ast.cli_exec('pjsip show channels').addCallback(
+        exec_list = [self.cli_exec(ast, 'pjsip show channels').addCallback(
             __channel_callback) for ast in self.ast]
         defer.DeferredList(exec_list).addCallback(__raise_finished,
                                                   finished_deferred)
@@ -410,8 +410,9 @@ class CallFiles(object):
 
 class SoundChecker(object):
     """ This class allows the user to check if a given sound file exists,
-    whether a sound file fits within a range of file size, and has enough
-    energy in it to pass a BackgroundDetect threshold of silence"""
+    whether a sound file fits within a range of file size, has enough
+    energy in it to pass a BackgroundDetect threshold of silence, and holds
+    the expected tones or DTMF digits"""
 
     def __init__(self, module_config, test_object):
         """Constructor"""
@@ -485,15 +486,19 @@ class SoundChecker(object):
 
     def energy_check(self, ami):
         """Checks the energy levels of a given sound file.
-        This is done by creating a local channel into a dialplan extension
-        that does a BackgroundDetect on the sound file.  The extensions must
-        be defined by the user.
+        If the action has a channel, this is done by creating a local channel
+        into a dialplan extension that does a BackgroundDetect on the sound
+        file.  The extensions must be defined by the user.  Otherwise the
+        sound file is analyzed by audio_check.
 
         Keyword Arguments:
         ami- the AMI instance used by this test
         """
-        energyfile = self.filepath[:self.filepath.find('.')]
         action = self.actions[self.action_index]
+        if 'channel' not in action:
+            self.audio_check(ami)
+            return
+        energyfile = self.filepath[:self.filepath.find('.')]
         #ami.originate has no type var, so action['type'] has to be popped
         action.pop('type')
         action['variable'] = {'SOUNDFILE': energyfile}
@@ -501,6 +506,55 @@ class SoundChecker(object):
         dfr = ami.originate(**action)
         dfr.addErrback(self.test_object.handle_originate_failure)
 
+    def audio_check(self, ami):
+        """Analyzes the contents of the sound file without Asterisk.
+        Checks that the file holds sound, the expected tones, or the expected
+        DTMF digits, depending on the type of the action. Fails if it
+        doesn't.  Iterates action_index so that the next action can be done.
+
+        Keyword Arguments:
+        ami- the AMI instance used by this test, not used by this function
+        but needs to be passed into sound_check_actions to continue
+        """
+        # Imported here, as it loads NumPy, which most tests don't need
+        from . import audio_analysis
+
+        action = self.actions[self.action_index]
+        actiontype = action['type']
+        try:
+            with audio_analysis.AudioFile(self.filepath) as audio:
+                if actiontype == 'energy_check':
+                    passed = audio_analysis.has_sound(
+                        audio, action.get('threshold',
+                                          audio_analysis.SILENCE_THRESHOLD),
+                        action.get('min-duration', 20) / 1000.0)
+                    if not passed:
+                        LOGGER.error("File '%s' failed energy check: no "
+                                     "sound found", self.filepath)
+                elif actiontype == 'tone_check':
+                    passed = audio_analysis.compare_tones(
+                        action['tones'], audio_analysis.detect_tones(audio),
+                        action.get('frequency-tolerance', 7),
+                        action.get('duration-tolerance', 1000))
+                else:
+                    digits = audio_analysis.detect_dtmf(audio)
+                    passed = digits == str(action['digits'])
+                    if not passed:
+                        LOGGER.error("File '%s' failed DTMF check: expected "
+                                     "'%s', actual '%s'", self.filepath,
+                                     action['digits'], digits)
+        except (IOError, audio_analysis.AudioError) as e:
+            LOGGER.error("Unable to analyze file '%s': %s", self.filepath, e)
+            passed = False
+        if not passed:
+            self.test_object.set_passed(False)
+            if self.auto_stop:
+                self.test_object.stop_reactor()
+            return
+        else:
+            self.action_index += 1
+            self.sound_check_actions(ami)
+
     def sound_check_actions(self, ami):
         """The second, usually larger part of the sound check.
         Iterates through the actions that will be used to check various
@@ -528,6 +582,8 @@ class SoundChecker(object):
                 self.size_check(ami)
             elif actiontype == 'energy_check':
                 self.energy_check(ami)
+            elif actiontype in ('tone_check', 'dtmf_check'):
+                self.audio_check(ami)
 
     def verify_presence(self, ami, event):
         """UserEvent verifier for the energy check.
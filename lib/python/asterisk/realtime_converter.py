@@ -41,6 +41,23 @@ This is a list of objects that conform to the following specifications:
 REALTIME_FILE_REGISTRY = []
 
 
+def get_table(table_name, meta, engine):
+    """Get a database table, reflecting it only the first time it is used
+
+    Reflected tables are kept in the MetaData, which belongs to a single
+    engine.
+
+    Keyword Arguments:
+    table_name: The name of the table
+    meta: sqlalchemy MetaData
+    engine: sqlalchemy Engine used to reflect the table
+    """
+    table = meta.tables.get(table_name)
+    if table is None:
+        table = Table(table_name, meta, autoload_with=engine)
+    return table
+
+
 class ConfigFile(object):
     """A config file to be written by a realtime converter
 
@@ -144,6 +161,10 @@ class SorceryRealtimeFile(object):
         """
         conf = astconfigparser.MultiOrderedConfigParser()
         conf.read(os.path.join(config_dir, self.filename))
+        ast = test_object.ast[0]
+        # Rows are grouped by table and by the columns they set, so each
+        # group can be inserted with a single executemany
+        rows = {}
         for title, sections in conf.sections().items():
             LOGGER.info("Inspecting objects with title {0}".format(title))
             for section in sections:
@@ -166,15 +187,21 @@ class SorceryRealtimeFile(object):
                     LOGGER.info("No corresponding section found for object "
                                 "type {0}".format(obj_type))
                     continue
-                table = Table(self.sections[sorcery_section][obj_type], meta,
-                              autoload_with=engine)
+                table_name = self.sections[sorcery_section][obj_type]
                 vals = {'id': title}
                 for key in section.keys():
-                    key_name = test_object.ast[0].configuration_replace_string(key)
+                    key_name = ast.configuration_replace_string(key)
                     if key_name != 'type':
-                        vals[key_name] = ";".join(test_object.ast[0].configuration_replace_string(value).replace(";", "^3B") for value in section.get(key))
+                        vals[key_name] = ";".join(ast.configuration_replace_string(value).replace(";", "^3B") for value in section.get(key))
+
+                columns = tuple(sorted(vals))
+                rows.setdefault((table_name, columns), []).append(vals)
 
-                conn.execute(table.insert().values(**vals))
+        # Reflect every table before inserting anything
+        tables = dict((table_name, get_table(table_name, meta, engine))
+                      for table_name, _ in rows)
+        for (table_name, _), values in rows.items():
+            conn.execute(tables[table_name].insert(), values)
 
     def find_section_for_object(self, obj_type):
         """Get the sorcery.conf section a particular object type belongs to
@@ -205,8 +232,9 @@ class SorceryRealtimeFile(object):
         engine: sqlalchemy Engine
         conn: sqlalchemy Connection to database
         """
-        for table_name in self.tables:
-            table = Table(table_name, meta, autoload_with=engine)
+        tables = [get_table(table_name, meta, engine)
+                  for table_name in self.tables]
+        for table in tables:
             conn.execute(table.delete())
         conn.commit()
 
@@ -7,6 +7,7 @@ This program is free software, distributed under the terms of
 the GNU General Public License Version 2.
 """
 from encodings import utf_8
+import bisect
 import logging
 import sys
 import html
@@ -23,11 +24,168 @@ LOGGER = logging.getLogger(__name__)
 THIS_MODULE = sys.modules[__name__]
 
 
+# Characters with a special meaning in a regular expression
+REGEX_SPECIAL = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+# Compiled where clause patterns, keyed on the pattern
+PATTERNS = {}
+
+
+def compile_pattern(pattern):
+    """Compile a where clause pattern, caching the result.
+
+    :param pattern: Regular expression matched against the start of a value.
+    :returns: Tuple of the literal prefix every matching value starts with,
+     and the compiled pattern. The compiled pattern is None if the pattern is
+     a plain literal, in which case matching the prefix is sufficient.
+    """
+    try:
+        return PATTERNS[pattern]
+    except KeyError:
+        pass
+
+    special = REGEX_SPECIAL.search(pattern)
+    if not special:
+        compiled = (pattern, None)
+    elif '|' in pattern:
+        compiled = ('', re.compile(pattern))
+    else:
+        prefix = pattern[:special.start()]
+        if special.group() in '*?{':
+            # The quantifier applies to the last character of the prefix
+            prefix = prefix[:-1]
+        compiled = (prefix, re.compile(pattern))
+    PATTERNS[pattern] = compiled
+    return compiled
+
+
+class RealtimeTable(object):
+    """A table of rows, with indexes on the columns that are searched.
+
+    Rows are dictionaries, stored in insertion order under a row id. The
+    first time a column is used in a where clause, an index of the column's
+    values to the ids of the rows holding them is built. A sorted list of the
+    distinct values of the column allows rows to be found by prefix, which is
+    what a regular expression matched against the start of a value needs.
+    """
+    def __init__(self):
+        self.rows = {}
+        self.next_id = 0
+        self.indexes = {}
+        self.sorted_values = {}
+
+    def __iter__(self):
+        return iter(list(self.rows.values()))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _index_add(self, column, value, row_id):
+        """Add a row to the index of a column."""
+        ids = self.indexes[column].get(value)
+        if ids is None:
+            ids = self.indexes[column][value] = set()
+            bisect.insort(self.sorted_values[column], value)
+        ids.add(row_id)
+
+    def _index_remove(self, column, value, row_id):
+        """Remove a row from the index of a column."""
+        ids = self.indexes[column][value]
+        ids.discard(row_id)
+        if not ids:
+            del self.indexes[column][value]
+            values = self.sorted_values[column]
+            del values[bisect.bisect_left(values, value)]
+
+    def _index(self, column):
+        """Get the index of a column, building it if needed."""
+        index = self.indexes.get(column)
+        if index is None:
+            index = self.indexes[column] = {}
+            for row_id, row in self.rows.items():
+                if column in row:
+                    index.setdefault(row[column], set()).add(row_id)
+            self.sorted_values[column] = sorted(index)
+        return index
+
+    def _lookup(self, column, prefix):
+        """Get the ids of the rows whose value of a column has a prefix."""
+        index = self._index(column)
+        if not prefix:
+            return set().union(*index.values())
+        values = self.sorted_values[column]
+        ids = set()
+        for pos in range(bisect.bisect_left(values, prefix), len(values)):
+            if not values[pos].startswith(prefix):
+                break
+            ids.update(index[values[pos]])
+        return ids
+
+    def add(self, row):
+        """Add a row to the table."""
+        row_id = self.next_id
+        self.next_id += 1
+        self.rows[row_id] = row
+        for column in self.indexes:
+            if column in row:
+                self._index_add(column, row[column], row_id)
+
+    def find(self, where):
+        """Find the rows matching a where clause.
+
+        :param where: Dictionary of column names to regular expressions that
+         must match the start of the column's value.
+        :returns: List of (row id, row) tuples in insertion order.
+        """
+        if not where:
+            return list(self.rows.items())
+
+        checks = [(column,) + compile_pattern(pattern)
+                  for column, pattern in where.items()]
+        # Look up the longest plain literal, as it is likely the most
+        # selective, and check the remaining columns on each candidate
+        checks.sort(key=lambda check: (check[2] is not None,
+                                     -len(check[1])))
+        column, prefix, compiled = checks[0]
+        candidates = self._lookup(column, prefix)
+        if compiled is None:
+            checks = checks[1:]
+
+        found = []
+        for row_id in sorted(candidates):
+            row = self.rows[row_id]
+            for column, prefix, compiled in checks:
+                value = row.get(column)
+                if value is None or not value.startswith(prefix) or \
+                        (compiled is not None and not compiled.match(value)):
+                    break
+            else:
+                found.append((row_id, row))
+        return found
+
+    def update(self, row_id, update):
+        """Update the values of a row."""
+        row = self.rows[row_id]
+        for column, value in update.items():
+            if column in self.indexes:
+                if column in row:
+                    self._index_remove(column, row[column], row_id)
+                self._index_add(column, value, row_id)
+            row[column] = value
+
+    def remove(self, row_id):
+        """Remove a row from the table."""
+        row = self.rows.pop(row_id)
+        for column in self.indexes:
+            if column in row:
+                self._index_remove(column, row[column], row_id)
+
+
 class RealtimeData(object):
     """This class holds all of the data that is being stored in realtime. The
     class cotains a dictionary of "tables" at the top level keyed on the
-    table's name. Each table consists of "rows" represented by a list of
-    dictionaries.
+    table's name. Each table consists of "rows" represented by dictionaries,
+    held in a RealtimeTable which indexes the columns that are searched.
 
     All variables are stored as strings since that is how they get passed in by
     Asterisk and that is the format in which they are returned to Asterisk.
@@ -44,10 +202,11 @@ class RealtimeData(object):
         :param table_name: String representing table to update.
         :param rows: List of dictionaries to add to the table.
         """
-        try:
-            self.tables[table_name].extend(rows)
-        except KeyError:
-            self.tables[table_name] = rows
+        table = self.tables.get(table_name)
+        if table is None:
+            table = self.tables[table_name] = RealtimeTable()
+        for row in rows:
+            table.add(row)
 
     def add_row(self, table_name, row):
         """Add a single row to a table.
@@ -71,7 +230,7 @@ class RealtimeData(object):
         """
         rows = self.retrieve_rows(table_name, where)
         if rows:
-            LOGGER.debug("Retrieved rows %s" % rows)
+            LOGGER.debug("Retrieved rows %s", rows)
             return rows[0]
         else:
             return {}
@@ -83,17 +242,13 @@ class RealtimeData(object):
          table name).
         :param where: A dictionary of key/value pairs used to filter rows from
          the table.
-        :returns: A list of rows that match the given input.
+        :returns: A list of (row id, row) tuples that match the given input.
 
         If a value is empty in the where clause, then it matches all rows in
         the table that have the specified key.
         """
-        LOGGER.debug("Table has %s" % table)
-        LOGGER.debug("Searching table for %s" % where)
-
-        return [row for row in table
-                if all(key in row and re.match(value, row[key])
-                       for key, value in where.items())]
+        LOGGER.debug("Searching table of %d rows for %s", len(table), where)
+        return table.find(where)
 
     def retrieve_rows(self, table_name, where):
         """Retrieve multiple rows from a table.
@@ -103,7 +258,8 @@ class RealtimeData(object):
         :returns: List of rows that match the given input.
         :raises: Keyerror if a table does not exist with name table_name
         """
-        return self._filter_rows(self.tables[table_name], where)
+        return [row for _, row in
+                self._filter_rows(self.tables[table_name], where)]
 
     def update_rows(self, table_name, where, update):
         """Update row data in a table.
@@ -114,12 +270,13 @@ class RealtimeData(object):
         :returns: number of rows that have been updated.
         :raises: KeyError if a table does not exist with name table_name.
         """
-        to_update = self._filter_rows(self.tables[table_name], where)
+        table = self.tables[table_name]
+        to_update = self._filter_rows(table, where)
 
-        for item in to_update:
-            item.update(update)
+        for row_id, _ in to_update:
+            table.update(row_id, update)
 
-        LOGGER.debug("After update, table has %s" % self.tables[table_name])
+        LOGGER.debug("Updated %d rows with %s", len(to_update), update)
 
         return len(to_update)
 
@@ -130,11 +287,12 @@ class RealtimeData(object):
         :returns: number of rows deleted.
         :raises: KeyError if a table does not exist with name table_name.
         """
-        LOGGER.debug("Being told to remove where %s" % where)
-        to_delete = self._filter_rows(self.tables[table_name], where)
-        LOGGER.debug("Items to delete are %s" % to_delete)
-        self.tables[table_name] = [row for row in self.tables[table_name]
-                                   if row not in to_delete]
+        LOGGER.debug("Being told to remove where %s", where)
+        table = self.tables[table_name]
+        to_delete = self._filter_rows(table, where)
+        LOGGER.debug("Items to delete are %s", to_delete)
+        for row_id, _ in to_delete:
+            table.remove(row_id)
         return len(to_delete)
 
 
@@ -239,7 +397,7 @@ class LeafResource(Resource):
         Example output: {'foo': 'cat', 'bar': 'dog'}
         """
         stringDict = {k.decode("utf-8"):v.decode("utf-8") for (k,v) in args.items()}
-        LOGGER.debug('adjusted args is %s' % stringDict)
+        LOGGER.debug('adjusted args is %s', stringDict)
         return stringDict
 
     def unpack_args(self, args):
@@ -268,7 +426,7 @@ class LeafResource(Resource):
             else:
                 filtered_args[key] = values
 
-        LOGGER.debug('filtered args is %s' % filtered_args)
+        LOGGER.debug('filtered args is %s', filtered_args)
 
         return dict((key, values[0] if values else '.*') for key, values in
                     filtered_args.items())
@@ -283,7 +441,7 @@ class LeafResource(Resource):
         """
         string = '&'.join(['{0}={1}'.format(html.escape(key), html.escape(val))
                            for key, val in row.items()])
-        LOGGER.debug("Returning response %s" % string)
+        LOGGER.debug("Returning response %s", string)
         return string
 
     def encode_multi_row(self, rows):
@@ -293,7 +451,7 @@ class LeafResource(Resource):
          feed.
         """
         string = '\r\n'.join([self.encode_row(row) for row in rows])
-        LOGGER.debug("Returning response %s" % string)
+        LOGGER.debug("Returning response %s", string)
         return string
 
     def return_404(self, request):
@@ -323,7 +481,7 @@ class _singleResource(LeafResource):
         database.
         """
         LOGGER.debug("Asked to render_POST in the single resource")
-        LOGGER.debug("request.args is %s" % request.args)
+        LOGGER.debug("request.args is %s", request.args)
         argstrings = self.stringize_args(self.unpack_args(request.args))
         try:
             return bytes(
@@ -354,7 +512,7 @@ class _multiResource(LeafResource):
         # If this were python 2.7+ we could use a dict comprehension here
         LOGGER.debug("Asked to render POST on the multi resource")
         uristring = (request.uri).decode("utf-8")
-        LOGGER.debug("Multi URI: %s" % uristring)
+        LOGGER.debug("Multi URI: %s", uristring)
         stringedargs = self.stringize_args(self.unpack_args(request.args))
         try:
             return bytes(
@@ -396,8 +554,8 @@ class _updateResource(LeafResource):
                                      if key not in uri_args)))
 
         uri_string_args = self.stringize_args(uri_args)
-        LOGGER.debug("URI args: %s" % uri_string_args)
-        LOGGER.debug("POST args: %s" % post_args)
+        LOGGER.debug("URI args: %s", uri_string_args)
+        LOGGER.debug("POST args: %s", post_args)
         try:
             affected = self.rt_data.update_rows(self.table_name,
                                                 uri_string_args,
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""AMI event routing unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import itertools
+import re
+import unittest
+
+from harness_shared import main
+from asterisk.ami import AMIEventInstance, AMIEventDispatcher, \
+    HeaderConditions
+
+
+class AMIMock(object):
+    """mock AMI connection delivering events to registered handlers"""
+
+    def __init__(self, ami_id=0):
+        """Constructor"""
+        self.id = ami_id
+        self.handlers = {}
+
+    def registerEvent(self, event, handler):
+        """Register a handler for an event type"""
+        self.handlers.setdefault(event, []).append(handler)
+
+    def deregisterEvent(self, event, handler):
+        """Remove a handler for an event type"""
+        self.handlers[event].remove(handler)
+        if not self.handlers[event]:
+            del self.handlers[event]
+
+    def fire(self, event):
+        """Deliver an event to the handlers of its type"""
+        for handler in list(self.handlers.get(event['event'], [])):
+            handler(self, event)
+
+
+class TestObjectMock(object):
+    """mock test object"""
+
+    def register_ami_observer(self, observer):
+        """Ignore the AMI connect observer"""
+        pass
+
+    def register_ami_reconnect_observer(self, observer):
+        """Ignore the AMI reconnect observer"""
+        pass
+
+    def register_stop_observer(self, observer):
+        """Ignore the stop observer"""
+        pass
+
+
+def linear_scan(configs, event):
+    """Match an event against instance configs one at a time, the way each
+    AMIEventInstance did before events were routed through a dispatcher
+
+    Returns:
+    The names of the matching configs, in order
+    """
+    matched = []
+    for name, config in configs:
+        conditions = config['conditions']
+        if config.get('escape-pattern', False):
+            match = (lambda pattern, s:
+                     re.match(re.escape(str(pattern)), s))
+        else:
+            match = (lambda pattern, s: re.match(str(pattern), s))
+        if conditions['match']['Event'] != event['event']:
+            continue
+        if not all(key.lower() in event and match(value, event[key.lower()])
+                   for key, value in conditions['match'].items()):
+            continue
+        if not all(key.lower() in event and
+                   not match(value, event[key.lower()])
+                   for key, value in conditions.get('nomatch', {}).items()):
+            continue
+        matched.append(name)
+    return matched
+
+
+class AMIEventRoutingTests(unittest.TestCase):
+    """Unit tests for routing AMI events to AMIEventInstances"""
+
+    def setUp(self):
+        self.ami = AMIMock()
+        self.test_object = TestObjectMock()
+        self.received = []
+
+    def add_instance(self, name, match, nomatch=None, escape=False):
+        config = {'conditions': {'match': match}, 'escape-pattern': escape}
+        if nomatch:
+            config['conditions']['nomatch'] = nomatch
+        instance = AMIEventInstance(config, self.test_object)
+        instance.register_event_observer(
+            lambda ami, event: self.received.append(name))
+        instance.register_handler(self.ami)
+        return instance
+
+    def fire(self, **headers):
+        self.received = []
+        self.ami.fire(headers)
+        return self.received
+
+    def test_001_literal_and_regex(self):
+        """Test routing on literal and regex header conditions"""
+        literal = self.add_instance('literal', {
+            'Event': 'Newchannel', 'Channel': 'PJSIP/alice'})
+        regex = self.add_instance('regex', {
+            'Event': 'Newchannel', 'Channel': 'PJSIP/(alice|bob)-'})
+        self.assertEqual(literal.conditions.index_key,
+                         ('channel', 'PJSIP/alice'))
+        self.assertIsNone(regex.conditions.index_key)
+
+        self.assertEqual(self.fire(event='Newchannel',
+                                   channel='PJSIP/alice-00000001'),
+                         ['literal', 'regex'])
+        self.assertEqual(self.fire(event='Newchannel',
+                                   channel='PJSIP/bob-00000002'),
+                         ['regex'])
+        self.assertEqual(self.fire(event='Newchannel',
+                                   channel='PJSIP/carol-00000003'), [])
+        self.assertEqual(self.fire(event='Newchannel'), [])
+
+    def test_002_escaped_literal(self):
+        """Test that escaped patterns are indexed as literals"""
+        instance = self.add_instance('escaped', {
+            'Event': 'UserEvent', 'UserEvent': 'Test(1)'}, escape=True)
+        self.assertEqual(instance.conditions.index_key,
+                         ('userevent', 'Test(1)'))
+        self.assertEqual(self.fire(event='UserEvent', userevent='Test(1)'),
+                         ['escaped'])
+        self.assertEqual(self.fire(event='UserEvent', userevent='Test1'), [])
+
+    def test_003_multiple_instances(self):
+        """Test several instances on one event, in registration order"""
+        first = self.add_instance('first', {
+            'Event': 'Hangup', 'Channel': 'PJSIP/alice'})
+        self.add_instance('second', {'Event': 'Hangup'})
+        self.add_instance('third', {
+            'Event': 'Hangup', 'Channel': 'PJSIP/alice'})
+        self.add_instance('fourth', {
+            'Event': 'Hangup', 'Cause': '16'})
+        self.assertEqual(len(self.ami.handlers['Hangup']), 1)
+
+        self.assertEqual(self.fire(event='Hangup', channel='PJSIP/alice-1',
+                                   cause='16'),
+                         ['first', 'second', 'third', 'fourth'])
+        self.assertEqual(self.fire(event='Hangup', channel='PJSIP/bob-1',
+                                   cause='16'),
+                         ['second', 'fourth'])
+
+        first.dispose(self.ami)
+        self.assertEqual(self.fire(event='Hangup', channel='PJSIP/alice-1',
+                                   cause='17'),
+                         ['second', 'third'])
+
+    def test_004_no_literal_header(self):
+        """Test instances without a literal header other than Event"""
+        event_only = self.add_instance('event_only', {'Event': 'VarSet'})
+        nomatch = self.add_instance('nomatch', {'Event': 'VarSet'},
+                                    nomatch={'Variable': 'IGNORED'})
+        self.assertIsNone(event_only.conditions.index_key)
+        self.assertIsNone(nomatch.conditions.index_key)
+
+        self.assertEqual(self.fire(event='VarSet', variable='FOO'),
+                         ['event_only', 'nomatch'])
+        self.assertEqual(self.fire(event='VarSet', variable='IGNORED'),
+                         ['event_only'])
+        self.assertEqual(self.fire(event='Newexten', variable='FOO'), [])
+
+        event_only.dispose(self.ami)
+        nomatch.dispose(self.ami)
+        self.assertNotIn('VarSet', self.ami.handlers)
+        self.assertNotIn('VarSet', AMIEventDispatcher.get(self.ami).routes)
+
+    def test_005_linear_scan(self):
+        """Test that routing matches checking every instance in turn"""
+        configs = []
+        matches = [
+            {'Event': 'Newstate'},
+            {'Event': 'Newstate', 'Channel': 'PJSIP/alice'},
+            {'Event': 'Newstate', 'Channel': 'PJSIP/alice-00000001'},
+            {'Event': 'Newstate', 'Channel': 'PJSIP/.*'},
+            {'Event': 'Newstate', 'ChannelState': '6'},
+            {'Event': 'Newstate', 'ChannelState': '6',
+             'Channel': 'PJSIP/bob'},
+            {'Event': 'Newstate', 'ChannelStateDesc': 'Up|Ring'},
+            {'Event': 'Newstate', 'Channel': 'Local/s@default;1'},
+            {'Event': 'Hangup', 'Channel': 'PJSIP/alice'},
+        ]
+        for i, match in enumerate(matches):
+            configs.append(('match%d' % i, {'conditions': {'match': match}}))
+            configs.append(('nomatch%d' % i, {'conditions': {
+                'match': match, 'nomatch': {'ChannelState': '4'}}}))
+        configs.append(('escaped', {'escape-pattern': True, 'conditions': {
+            'match': {'Event': 'Newstate', 'Channel': 'Local/s@default;1'}}}))
+        configs.append(('escaped_regex', {'escape-pattern': True,
+            'conditions': {'match': {'Event': 'Newstate',
+                                     'Channel': 'PJSIP/.*'}}}))
+
+        for name, config in configs:
+            match = dict(config['conditions']['match'])
+            self.add_instance(name, match,
+                              config['conditions'].get('nomatch'),
+                              config.get('escape-pattern', False))
+
+        channels = [None, 'PJSIP/alice-00000001', 'PJSIP/alice-00000002',
+                    'PJSIP/bob-00000003', 'PJSIP/.*', 'Local/s@default;1',
+                    'PJSIP/alic']
+        states = [None, ('4', 'Ring'), ('6', 'Up'), ('5', 'Ringing')]
+        for event_name, channel, state in itertools.product(
+                ['Newstate', 'Hangup'], channels, states):
+            event = {'event': event_name}
+            if channel is not None:
+                event['channel'] = channel
+            if state is not None:
+                event['channelstate'], event['channelstatedesc'] = state
+            self.assertEqual(self.fire(**event), linear_scan(configs, event),
+                             event)
+
+
+class HeaderConditionsTests(unittest.TestCase):
+    """Unit tests for HeaderConditions"""
+
+    def test_001_index_key(self):
+        """Test the choice of the header to index on"""
+        self.assertEqual(HeaderConditions(
+            {'Event': 'Foo', 'Channel': 'PJSIP/a.*', 'Uniqueid': '123'},
+            None).index_key, ('uniqueid', '123'))
+        self.assertIsNone(HeaderConditions(
+            {'Event': 'Foo', 'Channel': 'PJSIP/a.*'}, None).index_key)
+        self.assertIsNone(HeaderConditions(
+            {'Event': 'Foo', 'Channel': ''}, None).index_key)
+
+    def test_002_missing_header(self):
+        """Test that conditions on missing headers never match"""
+        conditions = HeaderConditions({'Event': 'Foo'}, {'Cause': '16'})
+        self.assertFalse(conditions({'event': 'Foo'}))
+        self.assertTrue(conditions({'event': 'Foo', 'cause': '17'}))
+        self.assertFalse(conditions({'event': 'Foo', 'cause': '16'}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""ARI REST client unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import json
+import unittest
+
+from requests.exceptions import HTTPError
+from twisted.internet import defer, task
+from twisted.python.failure import Failure
+from twisted.web.client import ResponseDone
+
+from harness_shared import main
+from asterisk import ari
+from asterisk.ari import ARI, ARIRequest, ARIPluggableRequestModule
+
+
+class ResponseMock(object):
+    """mock twisted.web response"""
+
+    def __init__(self, code, content=b'', phrase=b'OK'):
+        """Constructor"""
+        self.code = code
+        self.phrase = phrase
+        self.content = content
+
+    def deliverBody(self, protocol):
+        """Hand the body to the protocol reading it"""
+        protocol.dataReceived(self.content)
+        protocol.connectionLost(Failure(ResponseDone()))
+
+
+class AgentMock(object):
+    """mock twisted.web Agent whose requests complete when told to"""
+
+    def __init__(self):
+        """Constructor"""
+        self.requests = []
+
+    def request(self, method, url, headers=None, body=None):
+        """Record the request and return a deferred for its response"""
+        deferred = defer.Deferred()
+        self.requests.append((method, url, headers, deferred))
+        return deferred
+
+    def respond(self, index, code=200, content=b''):
+        """Complete a recorded request"""
+        self.requests[index][3].callback(ResponseMock(code, content))
+
+
+class TestObjectMock(object):
+    """mock test object recording the test result"""
+
+    def __init__(self, ari_client):
+        """Constructor"""
+        self.ari = ari_client
+        self.passed = None
+
+    def set_passed(self, value):
+        """Accumulate the pass/fail value"""
+        if self.passed is False:
+            return
+        self.passed = value
+
+
+class ARITests(unittest.TestCase):
+    """Unit tests for the non-blocking ARI client"""
+
+    def make_ari(self, pipeline=False):
+        ari_client = ARI('127.0.0.1', ('user', 'secret'), pipeline=pipeline)
+        ari_client._agent = AgentMock()
+        return ari_client
+
+    def test_001_serial(self):
+        """Test that requests are sent one at a time, in order"""
+        ari_client = self.make_ari()
+        agent = ari_client._agent
+        results = []
+        for name in ('a', 'b'):
+            ari_client.async_request('get', 'channels', name).addCallback(
+                lambda response: results.append(response.text))
+
+        self.assertEqual(len(agent.requests), 1)
+        self.assertTrue(agent.requests[0][1].endswith(b'/ari/channels/a'))
+        agent.respond(0, content=b'first')
+        self.assertEqual(results, ['first'])
+        self.assertEqual(len(agent.requests), 2)
+        agent.respond(1, content=b'second')
+        self.assertEqual(results, ['first', 'second'])
+
+    def test_002_pipelined(self):
+        """Test that pipelined results are delivered in request order"""
+        ari_client = self.make_ari(pipeline=True)
+        agent = ari_client._agent
+        results = []
+        for name in ('a', 'b', 'c'):
+            ari_client.async_request('get', 'channels', name).addCallback(
+                lambda response: results.append(response.text))
+
+        self.assertEqual(len(agent.requests), 3)
+        agent.respond(2, content=b'c')
+        agent.respond(1, content=b'b')
+        self.assertEqual(results, [])
+        agent.respond(0, content=b'a')
+        self.assertEqual(results, ['a', 'b', 'c'])
+
+    def test_003_request(self):
+        """Test the query string, headers and body of a request"""
+        ari_client = self.make_ari()
+        agent = ari_client._agent
+        ari_client.async_request('post', 'channels', endpoint='PJSIP/bob',
+                                 app=None, json={'variables': {}})
+
+        method, url, headers, _ = agent.requests[0]
+        self.assertEqual(method, b'POST')
+        self.assertEqual(url, b'http://127.0.0.1:8088/ari/channels?'
+                              b'endpoint=PJSIP%2Fbob')
+        self.assertEqual(headers.getRawHeaders(b'Authorization'),
+                         [b'Basic dXNlcjpzZWNyZXQ='])
+        self.assertEqual(headers.getRawHeaders('Content-type'),
+                         ['application/json'])
+
+    def test_004_errors(self):
+        """Test that error responses fail unless errors are allowed"""
+        ari_client = self.make_ari()
+        agent = ari_client._agent
+        failures = []
+        ari_client.async_request('get', 'channels', 'a').addErrback(
+            failures.append)
+        agent.respond(0, code=404)
+        self.assertTrue(failures[0].check(HTTPError))
+
+        ari_client.set_allow_errors(True)
+        responses = []
+        ari_client.async_request('get', 'channels', 'a').addCallback(
+            responses.append)
+        agent.respond(1, code=404)
+        self.assertEqual(responses[0].status_code, 404)
+
+
+class ARIRequestTests(unittest.TestCase):
+    """Unit tests for ARIRequest and the ari-requests pluggable action"""
+
+    def setUp(self):
+        self.ari_client = ARI('127.0.0.1', ('user', 'secret'))
+        self.ari_client._agent = AgentMock()
+        self.clock = task.Clock()
+        self.saved_reactor = ari.reactor
+        ari.reactor = self.clock
+
+    def tearDown(self):
+        ari.reactor = self.saved_reactor
+
+    def test_001_check_response(self):
+        """Test matching a response against the expected one"""
+        request = ARIRequest(self.ari_client, {
+            'method': 'get', 'uri': 'channels', 'expect': 404})
+        self.assertFalse(request.check_response(ari.ARIResponse(
+            'url', 200, 'OK', b'')))
+        self.assertTrue(request.check_response(ari.ARIResponse(
+            'url', 404, 'Not Found', b'')))
+
+        request = ARIRequest(self.ari_client, {
+            'method': 'get', 'uri': 'channels',
+            'response_body': {'match': {'state': 'Up'}}})
+        self.assertTrue(request.check_response(ari.ARIResponse(
+            'url', 200, 'OK', json.dumps({'state': 'Up'}).encode())))
+        self.assertFalse(request.check_response(ari.ARIResponse(
+            'url', 200, 'OK', json.dumps({'state': 'Down'}).encode())))
+
+    def test_002_delayed_request(self):
+        """Test that a delayed request that fails fails the test"""
+        test_object = TestObjectMock(self.ari_client)
+        module = ARIPluggableRequestModule(test_object, {
+            'method': 'delete', 'uri': 'channels/{channel_id}',
+            'delay': 2})
+        module.run(None, None, {'channel_id': 'abc'})
+        self.assertEqual(self.ari_client._agent.requests, [])
+
+        self.clock.advance(2)
+        method, url, _, _ = self.ari_client._agent.requests[0]
+        self.assertTrue(url.endswith(b'/channels/abc'))
+        self.ari_client._agent.respond(0, code=500)
+        self.assertIs(test_object.passed, False)
+
+
+if __name__ == "__main__":
+    main()
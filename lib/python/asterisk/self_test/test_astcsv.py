@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Asterisk CSV record matching unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk.astcsv import AsteriskCSVMatcher
+from asterisk.cdr import AsteriskCSVCDR, AsteriskCSVCDRLine
+
+
+class AsteriskCSVMatcherTests(unittest.TestCase):
+    """Unit tests for AsteriskCSVMatcher"""
+
+    def test_001_assignment(self):
+        """Test that a greedy assignment is corrected"""
+        matcher = AsteriskCSVMatcher([
+            AsteriskCSVCDRLine(channel='SIP/.*', lastapp='Dial'),
+            AsteriskCSVCDRLine(channel='SIP/alice-.*', lastapp='.*'),
+        ])
+        self.assertTrue(matcher.add(AsteriskCSVCDRLine(
+            channel='SIP/alice-0001', lastapp='Dial')))
+        self.assertFalse(matcher.matched())
+        self.assertTrue(matcher.add(AsteriskCSVCDRLine(
+            channel='SIP/bob-0001', lastapp='Dial')))
+        self.assertTrue(matcher.matched())
+        self.assertEqual(matcher.assignment, [1, 0])
+
+    def test_002_unmatched(self):
+        """Test that only the records that can't be matched are reported"""
+        matcher = AsteriskCSVMatcher([
+            AsteriskCSVCDRLine(destination='100'),
+            AsteriskCSVCDRLine(destination='200'),
+            AsteriskCSVCDRLine(destination='[34]00'),
+        ])
+        for destination in ['300', '100', '500', '100']:
+            matcher.add(AsteriskCSVCDRLine(destination=destination))
+        self.assertFalse(matcher.matched())
+        self.assertFalse(matcher.matched(partial=True))
+        self.assertEqual(matcher.unmatched_expected(), [1])
+        self.assertEqual(matcher.unmatched_actual(), [2, 3])
+
+
+class AsteriskCSVFollowerTests(unittest.TestCase):
+    """Unit tests for following a CSV file as it is written"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'Master.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, data, mode='a'):
+        """Write to the CSV file"""
+        with open(self.path, mode) as csv_file:
+            csv_file.write(data)
+
+    def test_001_follow(self):
+        """Test that records are matched as they are written"""
+        expected = AsteriskCSVCDR(records=[
+            AsteriskCSVCDRLine(destination='100', lastarg='a,\nb'),
+            AsteriskCSVCDRLine(destination='200')])
+        matcher = expected.matcher(self.path)
+        matcher.update()
+        self.assertEqual(matcher.actual, [])
+
+        self.write('"","","200"\n"","","100","","","","","","a,')
+        matcher.update()
+        self.assertEqual(len(matcher.actual), 1)
+        self.write('\nb"\n')
+        matcher.update()
+        self.assertEqual(len(matcher.actual), 2)
+        self.assertTrue(matcher.matched())
+
+        # A restarted Asterisk starts the file again
+        self.write('"","","200"\n', mode='w')
+        matcher.update()
+        self.assertEqual(len(matcher.actual), 1)
+        self.assertEqual(matcher.unmatched_expected(), [0])
+
+
+if __name__ == "__main__":
+    main()
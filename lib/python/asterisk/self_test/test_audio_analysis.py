@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Audio analysis unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from harness_shared import main
+from asterisk import audio_analysis
+
+RATE = 8000
+
+
+def tone(frequency, seconds, amplitude=16000):
+    """Generate a sine wave"""
+    times = np.arange(int(RATE * seconds)) / float(RATE)
+    return amplitude * np.sin(2 * np.pi * frequency * times)
+
+
+def silence(seconds):
+    """Generate silence"""
+    return np.zeros(int(RATE * seconds))
+
+
+def dtmf(digit, seconds=0.1):
+    """Generate a DTMF digit"""
+    for row, keys in enumerate(audio_analysis.DTMF_KEYS):
+        if digit in keys:
+            return (tone(audio_analysis.DTMF_ROWS[row], seconds, 8000) +
+                    tone(audio_analysis.DTMF_COLUMNS[keys.index(digit)],
+                         seconds, 8000))
+
+
+class AudioAnalysisTests(unittest.TestCase):
+    """Unit tests for audio_analysis"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, samples, encoding):
+        """Write samples to a headerless file"""
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as audio_file:
+            audio_file.write(audio_analysis.encode(samples, encoding))
+        return path
+
+    def test_001_g711(self):
+        """Test the G.711 tables against known values and the encoder"""
+        self.assertEqual(audio_analysis.ULAW_TABLE[[0x00, 0x7f, 0x80, 0xff]]
+                         .tolist(), [-32124, 0, 32124, 0])
+        self.assertEqual(audio_analysis.ALAW_TABLE[[0x55, 0xd5, 0x2a, 0xaa]]
+                         .tolist(), [-8, 8, -32256, 32256])
+        samples = np.arange(-32000, 32000, 7)
+        for encoding, table in (('ulaw', audio_analysis.ULAW_TABLE),
+                                ('alaw', audio_analysis.ALAW_TABLE)):
+            codes = np.frombuffer(audio_analysis.encode(samples, encoding),
+                                  dtype=np.uint8)
+            error = np.abs(table[codes].astype(np.int32) - samples)
+            self.assertLessEqual(error.max(), 512)
+
+    def test_002_tones(self):
+        """Test detecting tones in a ulaw file"""
+        path = self.write('tones.ulaw', np.concatenate(
+            [silence(2), tone(440, 4), tone(1004, 1), silence(2)]), 'ulaw')
+        with audio_analysis.AudioFile(path) as audio:
+            self.assertEqual(audio.duration, 9)
+            tones = audio_analysis.detect_tones(audio)
+        self.assertEqual([round(t['frequency']) for t in tones],
+                         [0, 440, 1004, 0])
+        self.assertEqual([t['duration'] for t in tones], [2, 4, 1, 2])
+        self.assertTrue(audio_analysis.compare_tones(
+            [{'frequency': 0, 'duration': 2000},
+             {'frequency': 442, 'duration': 3500},
+             {'frequency': 1000, 'duration': 1000},
+             {'frequency': 0, 'duration': 2000}], tones))
+        self.assertFalse(audio_analysis.compare_tones(
+            [{'frequency': 0, 'duration': 2000},
+             {'frequency': 450, 'duration': 4000},
+             {'frequency': 1004, 'duration': 1000},
+             {'frequency': 0, 'duration': 2000}], tones))
+
+    def test_003_wav_energy(self):
+        """Test finding sound and silence in a WAV file"""
+        data = audio_analysis.encode(np.concatenate(
+            [silence(1), tone(800, 0.5, 2000), silence(1)]), 'slin')
+        path = os.path.join(self.tmpdir, 'energy.wav')
+        with open(path, 'wb') as wav_file:
+            wav_file.write(struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF',
+                                       36 + len(data), b'WAVE', b'fmt ', 16,
+                                       1, 1, RATE, RATE * 2, 2, 16, b'data',
+                                       len(data)) + data)
+        with audio_analysis.AudioFile(path) as audio:
+            self.assertEqual(audio.encoding, 'slin')
+            self.assertEqual(
+                [(s['sound'], s['seconds'], s['duration'])
+                 for s in audio_analysis.segments(audio)],
+                [(False, 0, 1), (True, 1, 0.5), (False, 1.5, 1)])
+            self.assertTrue(audio_analysis.has_sound(audio))
+            self.assertFalse(audio_analysis.has_sound(audio, 2000))
+            self.assertFalse(audio_analysis.has_sound(audio,
+                                                      min_duration=1))
+
+        path = self.write('quiet.alaw', np.random.normal(0, 50, RATE),
+                          'alaw')
+        with audio_analysis.AudioFile(path) as audio:
+            self.assertTrue(audio_analysis.is_silent(audio))
+
+    def test_004_dtmf(self):
+        """Test detecting DTMF digits in noise"""
+        digits = '1234567890*#ABCD11'
+        samples = np.concatenate(
+            [np.concatenate([dtmf(digit), silence(0.05)])
+             for digit in digits])
+        samples += np.random.RandomState(1).normal(0, 200, len(samples))
+        path = self.write('digits.sln', samples, 'slin')
+        with audio_analysis.AudioFile(path) as audio:
+            self.assertEqual(audio_analysis.detect_dtmf(audio), digits)
+
+        path = self.write('tone.sln', tone(941, 1), 'slin')
+        with audio_analysis.AudioFile(path) as audio:
+            self.assertEqual(audio_analysis.detect_dtmf(audio), '')
+
+    def test_005_errors(self):
+        """Test files that can't be analyzed"""
+        path = self.write('sound.gsm', silence(1), 'slin')
+        self.assertRaises(audio_analysis.AudioError,
+                          audio_analysis.AudioFile, path)
+        path = self.write('empty.ulaw', silence(0), 'ulaw')
+        with audio_analysis.AudioFile(path) as audio:
+            self.assertEqual(len(audio), 0)
+            self.assertEqual(audio_analysis.detect_tones(audio), [])
+            self.assertEqual(audio_analysis.detect_dtmf(audio), '')
+
+
+if __name__ == "__main__":
+    main()
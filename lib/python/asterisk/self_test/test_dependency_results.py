@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Dependency result caching unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from harness_shared import main
+from asterisk.test_config import TestConfig, DependencyResults
+
+
+class DependencyResultsTests(unittest.TestCase):
+    """Unit tests for DependencyResults"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'deps.pickle')
+        self.saved_results = TestConfig.dependency_results
+        TestConfig.dependency_cache = {}
+
+    def tearDown(self):
+        TestConfig.dependency_results = self.saved_results
+        TestConfig.dependency_cache = {}
+        shutil.rmtree(self.tmpdir)
+
+    def make_config(self):
+        config_path = os.path.join(self.tmpdir, 'test-config.yaml')
+        with open(config_path, 'w') as config_file:
+            config_file.write('properties:\n  dependencies:\n'
+                              '    - python: os\n'
+                              '    - app: no-such-app-anywhere\n'
+                              '    - custom: remote\n'
+                              '    - custom: ipv6\n')
+        return TestConfig(config_path, TestConfig(self.tmpdir))
+
+    def test_001_persisted(self):
+        """Test that results are stored and reused"""
+        TestConfig.dependency_results = DependencyResults(self.path)
+        deps = self.make_config().get_deps()
+        self.assertEqual([d.met for d in deps][:3], [True, False, False])
+        TestConfig.dependency_results.save()
+
+        # Environment probes are never stored
+        results = DependencyResults(self.path)
+        self.assertEqual(len(results.results), 2)
+
+        # Fake a stored result to show it is used instead of checking again
+        key = [k for k in results.results if ('python', 'os') in k][0]
+        results.results[key] = (results.results[key][0], ('os', '', False))
+        TestConfig.dependency_results = results
+        TestConfig.dependency_cache = {}
+        deps = self.make_config().get_deps()
+        self.assertEqual([d.met for d in deps][:3], [False, False, False])
+
+    def test_002_invalidated(self):
+        """Test that results from a different Asterisk are discarded"""
+        results = DependencyResults(self.path)
+        results.stamp = ('other',)
+        results.add('key', {'app': 'sh'},
+                    SimpleNamespace(name='x', version='', met=True))
+        results.save()
+        self.assertEqual(DependencyResults(self.path).results, {})
+
+    def test_003_application_changed(self):
+        """Test that an application installed since is checked again"""
+        app = os.path.join(self.tmpdir, 'some-app')
+        dep = {'app': app}
+        results = DependencyResults()
+        results.add('key', dep,
+                    SimpleNamespace(name=app, version='', met=False))
+        self.assertEqual(results.get('key', dep), (app, '', False))
+
+        with open(app, 'w') as app_file:
+            app_file.write('#!/bin/sh\n')
+        os.chmod(app, 0o755)
+        self.assertIsNone(results.get('key', dep))
+
+
+if __name__ == "__main__":
+    main()
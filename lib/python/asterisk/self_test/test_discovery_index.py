@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Test discovery index unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk.discovery_index import DiscoveryIndex
+from asterisk.test_config import TestConfig
+
+
+class DiscoveryIndexTests(unittest.TestCase):
+    """Unit tests for DiscoveryIndex"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'index.pickle')
+        self.yaml_path = os.path.join(self.tmpdir, 'test-config.yaml')
+        self.write_yaml('properties:\n  tags: [a]\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_yaml(self, text, mtime=1000000000):
+        with open(self.yaml_path, 'w') as yaml_file:
+            yaml_file.write(text)
+        os.utime(self.yaml_path, (mtime, mtime))
+
+    def test_001_cached(self):
+        """Test that unchanged files are served from a saved index"""
+        index = DiscoveryIndex(self.path)
+        self.assertEqual(index.load_yaml(self.yaml_path),
+                         {'properties': {'tags': ['a']}})
+        index.save()
+
+        index = DiscoveryIndex(self.path)
+        self.assertEqual(index.load_yaml(self.yaml_path),
+                         {'properties': {'tags': ['a']}})
+        self.assertFalse(index.dirty)
+
+    def test_002_changed(self):
+        """Test that changed files are parsed again"""
+        index = DiscoveryIndex(self.path)
+        index.load_yaml(self.yaml_path)
+        index.save()
+
+        self.write_yaml('properties:\n  tags: [b]\n', mtime=1000000001)
+        index = DiscoveryIndex(self.path)
+        self.assertEqual(index.load_yaml(self.yaml_path),
+                         {'properties': {'tags': ['b']}})
+        self.assertTrue(index.dirty)
+
+    def test_003_unreadable(self):
+        """Test that a corrupt index is ignored"""
+        with open(self.path, 'w') as index_file:
+            index_file.write('garbage')
+        self.assertEqual(DiscoveryIndex(self.path).entries, {})
+
+    def test_004_metadata(self):
+        """Test that derived metadata is only built when the file changed"""
+        built = []
+
+        def build(config):
+            built.append(config)
+            return {'tags': config['properties']['tags']}
+
+        index = DiscoveryIndex(self.path)
+        self.assertEqual(index.metadata(self.yaml_path, build), {'tags': ['a']})
+        self.assertEqual(index.metadata(self.yaml_path, build), {'tags': ['a']})
+        index.save()
+
+        index = DiscoveryIndex(self.path)
+        self.assertEqual(index.metadata(self.yaml_path, build), {'tags': ['a']})
+        self.assertEqual(len(built), 1)
+        self.assertFalse(index.dirty)
+
+        self.write_yaml('properties:\n  tags: [b]\n', mtime=1000000001)
+        self.assertEqual(index.metadata(self.yaml_path, build), {'tags': ['b']})
+        self.assertEqual(len(built), 2)
+
+    def test_005_pruned(self):
+        """Test that entries of removed files are dropped on save"""
+        index = DiscoveryIndex(self.path)
+        index.load_yaml(self.yaml_path)
+        index.save()
+
+        os.remove(self.yaml_path)
+        index = DiscoveryIndex(self.path)
+        index.save()
+        self.assertEqual(DiscoveryIndex(self.path).entries, {})
+
+    def test_006_test_config(self):
+        """Test that a TestConfig is restored from the stored metadata"""
+        self.write_yaml(
+            'testinfo:\n'
+            '  summary: A test\n'
+            'properties:\n'
+            '  expected-result: False\n'
+            '  tags: [pjsip]\n'
+            '  features: [cdr]\n'
+            '  dependencies:\n'
+            '    - python: yaml\n')
+        index = DiscoveryIndex(self.path)
+        TestConfig(self.yaml_path, config_index=index)
+        index.save()
+
+        index = DiscoveryIndex(self.path)
+        config = TestConfig(self.yaml_path, config_index=index)
+        self.assertFalse(index.dirty)
+        self.assertEqual(config.summary, 'A test')
+        self.assertEqual(config.description, '(none)')
+        self.assertFalse(config.expect_pass)
+        self.assertEqual(config.tags, ['pjsip'])
+        self.assertEqual(config.feature_check, {'cdr': True})
+        self.assertEqual(config.dependency_specs,
+                         [(frozenset([('python', 'yaml')]), {'python': 'yaml'})])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""HEPv3 codec unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import unittest
+import zlib
+
+from harness_shared import main
+from asterisk import hep
+
+
+class HEPTests(unittest.TestCase):
+    """Unit tests for encoding and decoding HEPv3 packets"""
+
+    def packet(self, **kwargs):
+        """Build a SIP packet"""
+        fields = dict(ip_family=hep.IP_FAMILY.v4, ip_id=17, src_port=5067,
+                      dst_port=5060, time_sec=1700000000, time_usec=1234,
+                      protocol_type=hep.HEP_PROTOCOL_TYPE.SIP,
+                      capture_agent_id=12345, src_addr='127.0.0.1',
+                      dst_addr='127.0.0.2', auth_key='secret',
+                      payload='OPTIONS sip:test SIP/2.0\r\n\r\n',
+                      uuid='1@127.0.0.1')
+        fields.update(kwargs)
+        return hep.HEPPacket(**fields)
+
+    def test_001_round_trip(self):
+        """Test decoding an encoded packet"""
+        for kwargs in ({}, {'ip_family': hep.IP_FAMILY.v6,
+                            'src_addr': '::1', 'dst_addr': 'fe80::1'}):
+            packet = self.packet(**kwargs)
+            decoded = hep.decode(hep.encode(packet))
+            self.assertEqual(decoded.to_dict(), packet.to_dict())
+            self.assertEqual(decoded.hep_ctrl, b'HEP3')
+
+    def test_002_lazy_payload(self):
+        """Test that the payload is decoded when read"""
+        data = bytearray(hep.encode(self.packet()))
+        decoded = hep.decode(data)
+        self.assertIsInstance(decoded.raw_payload, memoryview)
+        self.assertEqual(decoded.payload, 'OPTIONS sip:test SIP/2.0\r\n\r\n')
+
+        compressed = self.packet(
+            payload=None, compressed_payload=zlib.compress(b'{"ssrc": 1}'))
+        self.assertEqual(hep.decode(hep.encode(compressed)).payload,
+                         '{"ssrc": 1}')
+
+    def test_003_chunks(self):
+        """Test that chunk order and unknown chunks don't matter"""
+        body = (hep.CHUNK.pack(0, 15, 8) + b'hi' +
+                hep.CHUNK.pack(0x0020, 15, 7) + b'x' +
+                hep.CHUNK.pack(0, 99, 6) +
+                hep.CHUNK.pack(0, 7, 8) + b'\x13\xc4')
+        decoded = hep.decode(hep.HEADER.pack(b'HEP3', 6 + len(body)) + body)
+        self.assertEqual((decoded.payload, decoded.src_port), ('hi', 5060))
+
+    def test_004_invalid(self):
+        """Test that malformed packets are rejected"""
+        data = hep.encode(self.packet())
+        self.assertRaises(hep.HEPError, hep.decode, b'HEP2' + data[4:])
+        self.assertRaises(hep.HEPError, hep.decode, data[:-1])
+        self.assertRaises(hep.HEPError, hep.decode,
+                          data[:6] + hep.CHUNK.pack(0, 1, 2) + data[12:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Asterisk instance pool unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk.instance_pool import InstancePool
+
+
+class InstancePoolTests(unittest.TestCase):
+    """Unit tests for InstancePool"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pool = InstancePool(os.path.join(self.tmpdir, 'pool'))
+
+        self.ctl = os.path.join(self.tmpdir, 'asterisk.ctl')
+        self.ctl_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.ctl_sock.bind(self.ctl)
+
+    def tearDown(self):
+        self.ctl_sock.close()
+        shutil.rmtree(self.tmpdir)
+
+    def record(self, base, pid, binary=sys.executable, test='tests/a'):
+        return {'base': base, 'pid': pid, 'binary': binary, 'ctl': self.ctl,
+                'test': test}
+
+    def install(self, base, text):
+        etc = os.path.join(base, 'etc', 'asterisk')
+        os.makedirs(etc)
+        with open(os.path.join(etc, 'asterisk.conf'), 'w') as conf:
+            conf.write(text % {'base': base})
+        os.symlink('/dev/null', os.path.join(etc, 'link'))
+
+    def test_001_instance_key(self):
+        """Test that keys ignore the base directory and symbolic links"""
+        base1 = self.pool.new_base(1)
+        base2 = self.pool.new_base(1)
+        base3 = self.pool.new_base(1)
+        self.install(base1, 'astlogdir => %(base)s/var/log\n')
+        self.install(base2, 'astlogdir => %(base)s/var/log\n')
+        self.install(base3, 'astlogdir => %(base)s/var/log/other\n')
+
+        key1 = InstancePool.instance_key(base1, ['127.0.0.1'])
+        self.assertEqual(key1, InstancePool.instance_key(base2, ['127.0.0.1']))
+        self.assertNotEqual(key1,
+                            InstancePool.instance_key(base3, ['127.0.0.1']))
+        self.assertNotEqual(key1,
+                            InstancePool.instance_key(base1, ['127.0.0.2']))
+
+    def test_002_checkout(self):
+        """Test that only running instances are handed out"""
+        self.assertEqual(self.pool.checkout('key'), None)
+
+        self.pool.checkin('key', self.record('/a', os.getpid()))
+        self.pool.checkin('key', self.record('/b', 2 ** 22 + 1))
+        self.assertEqual(self.pool.checkout('other'), None)
+        self.assertEqual(self.pool.checkout('key')['base'], '/a')
+        self.assertEqual(self.pool.checkout('key'), None)
+
+    def test_003_reused_pid(self):
+        """Test that a process which isn't the pooled instance is ignored"""
+        self.assertTrue(InstancePool.is_instance(
+            self.record('/a', os.getpid())))
+        self.assertFalse(InstancePool.is_instance(
+            self.record('/a', os.getpid(), binary='/no/such/asterisk')))
+        self.assertFalse(InstancePool.is_instance(
+            {'base': '/a', 'pid': os.getpid()}))
+
+        record = self.record('/a', os.getpid())
+        record['ctl'] = os.path.join(self.tmpdir, 'gone.ctl')
+        self.assertFalse(InstancePool.is_instance(record))
+
+    def test_004_discard(self):
+        """Test that the instances of a failed test are stopped"""
+        sleep = shutil.which('sleep')
+        process = subprocess.Popen([sleep, '30'])
+        try:
+            failed = self.record(self.pool.new_base(1), process.pid,
+                                 binary=sleep, test='tests/failed')
+            passed = self.record(self.pool.new_base(1), os.getpid())
+            self.pool.checkin('key', failed)
+            self.pool.checkin('key', passed)
+
+            self.pool.discard('tests/failed')
+            self.assertEqual(process.wait(timeout=10), -9)
+            self.assertFalse(os.path.exists(failed['base']))
+            self.assertEqual(self.pool.checkout('key'), passed)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def test_005_drain_reused_pid(self):
+        """Test that draining doesn't kill a process that reused a PID"""
+        sleep = shutil.which('sleep')
+        process = subprocess.Popen([sleep, '30'])
+        try:
+            self.pool.checkin('key', self.record(self.pool.new_base(1),
+                                                 process.pid))
+            self.pool.drain()
+            self.assertIsNone(process.poll())
+            self.assertFalse(os.path.exists(self.pool.root))
+        finally:
+            process.kill()
+            process.wait()
+
+if __name__ == "__main__":
+    main()
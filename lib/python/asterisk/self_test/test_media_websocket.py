@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Media WebSocket streaming unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk.media_websocket import MediaDigest, MediaWebSocketMixin
+
+
+class ProtocolMock(MediaWebSocketMixin):
+    """mock media WebSocket connection whose buffer fills up"""
+
+    def __init__(self, buffer_frames=None):
+        """Constructor"""
+        self.receiver = None
+        self.messages = []
+        self.producer = None
+        self.buffer_frames = buffer_frames
+
+    def registerProducer(self, producer, streaming):
+        """Register a streaming producer"""
+        self.producer = producer
+
+    def unregisterProducer(self):
+        """Unregister the producer"""
+        self.producer = None
+
+    def sendMessage(self, payload, isBinary=False):
+        """Record a message, pausing the producer when the buffer is full"""
+        self.messages.append(payload)
+        if isBinary and self.buffer_frames is not None:
+            self.buffer_frames -= 1
+            if self.buffer_frames == 0:
+                self.producer.pauseProducing()
+
+
+class MediaStreamTests(unittest.TestCase):
+    """Unit tests for streaming media files"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.media = os.path.join(self.tmpdir, 'test.ulaw')
+        self.data = bytes(range(256)) * 10
+        with open(self.media, 'wb') as media_file:
+            media_file.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_001_send(self):
+        """Test sending a file in frames"""
+        protocol = ProtocolMock()
+        digest = MediaDigest()
+        sent = []
+        protocol.sendFile(self.media, frame_size=1000,
+                          sent_digest=digest).addCallback(sent.append)
+
+        self.assertEqual(sent, [len(self.data)])
+        self.assertEqual(protocol.messages[0], b"START_MEDIA_BUFFERING")
+        self.assertEqual(protocol.messages[-1], b"STOP_MEDIA_BUFFERING")
+        self.assertEqual([len(msg) for msg in protocol.messages[1:-1]],
+                         [1000, 1000, 560])
+        self.assertEqual(b"".join(protocol.messages[1:-1]), self.data)
+        self.assertEqual(digest.length, len(self.data))
+        self.assertIsNone(protocol.producer)
+        self.assertEqual(protocol.media_streams, [])
+
+    def test_002_backpressure(self):
+        """Test that a full connection pauses the stream"""
+        protocol = ProtocolMock(buffer_frames=2)
+        sent = []
+        protocol.sendFile(self.media, frame_size=100).addCallback(sent.append)
+
+        self.assertEqual(len(protocol.messages), 3)
+        self.assertEqual(sent, [])
+        protocol.onClose(False, 1006, "lost")
+        self.assertEqual(sent, [200])
+        self.assertNotIn(b"STOP_MEDIA_BUFFERING", protocol.messages)
+
+    def test_003_digest(self):
+        """Test comparing received media to the sent media"""
+        sent = MediaDigest()
+        received = MediaDigest(sent)
+        sent.update(self.data[:1000])
+        received.update(self.data[:600])
+        sent.update(self.data[1000:])
+        received.update(self.data[600:] + b"\xff" * 100)
+
+        self.assertEqual(received.length, len(self.data) + 100)
+        self.assertTrue(received.matches())
+
+        corrupt = MediaDigest(sent)
+        corrupt.update(self.data[:-1] + b"\x00")
+        self.assertFalse(corrupt.matches())
+
+
+if __name__ == "__main__":
+    main()
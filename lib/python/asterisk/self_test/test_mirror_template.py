@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Mirrored directory template unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk.mirror_template import MirrorTemplate
+
+
+class MirrorTemplateTests(unittest.TestCase):
+    """Unit tests for MirrorTemplate"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'root')
+        sounds = os.path.join(self.root, 'var/lib/asterisk/sounds/en')
+        os.makedirs(sounds)
+        os.makedirs(os.path.join(self.root, 'var/spool/asterisk/outgoing'))
+        for name in ['hello.gsm', 'bye.gsm']:
+            open(os.path.join(sounds, name), 'w').close()
+        open(os.path.join(self.root, 'var/lib/asterisk/astdb.sqlite3'),
+             'w').close()
+        open(os.path.join(self.root, 'var/spool/asterisk/outgoing/call'),
+             'w').close()
+
+        self.template = MirrorTemplate(
+            os.path.join(self.tmpdir, 'templates'),
+            [('/var/lib/asterisk', True), ('/var/spool/asterisk', False)],
+            self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_001_stamp(self):
+        """Test that files are linked and directories created"""
+        base = os.path.join(self.tmpdir, 'ast1')
+        self.template.stamp(base)
+
+        link = os.path.join(base, 'var/lib/asterisk/sounds/en/hello.gsm')
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(os.readlink(link), os.path.join(
+            self.root, 'var/lib/asterisk/sounds/en/hello.gsm'))
+        self.assertFalse(os.path.lexists(
+            os.path.join(base, 'var/lib/asterisk/astdb.sqlite3')))
+        self.assertTrue(os.path.isdir(
+            os.path.join(base, 'var/spool/asterisk/outgoing')))
+        self.assertFalse(os.path.lexists(
+            os.path.join(base, 'var/spool/asterisk/outgoing/call')))
+
+        # The instance's directories are its own
+        open(os.path.join(base, 'var/lib/asterisk/sounds/en/new.gsm'),
+             'w').close()
+        self.assertFalse(os.path.exists(os.path.join(
+            self.template.tree, 'var/lib/asterisk/sounds/en/new.gsm')))
+
+    def test_002_invalidate(self):
+        """Test that the template is rebuilt only when the source changes"""
+        self.template.update()
+        manifest = os.stat(self.template.manifest)
+
+        self.template.update()
+        self.assertEqual(os.stat(self.template.manifest).st_ino,
+                         manifest.st_ino)
+
+        sounds = os.path.join(self.root, 'var/lib/asterisk/sounds/en')
+        open(os.path.join(sounds, 'new.gsm'), 'w').close()
+        os.utime(sounds, ns=(0, 0))
+
+        base = os.path.join(self.tmpdir, 'ast1')
+        self.template.stamp(base)
+        self.assertTrue(os.path.islink(
+            os.path.join(base, 'var/lib/asterisk/sounds/en/new.gsm')))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Test output spool unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import unittest
+
+from harness_shared import main
+from asterisk.output_spool import OutputSpool
+
+
+class OutputSpoolTests(unittest.TestCase):
+    """Unit tests for OutputSpool"""
+
+    def setUp(self):
+        self.spool = OutputSpool(tail_size=20)
+
+    def tearDown(self):
+        self.spool.remove()
+
+    def test_001_lines(self):
+        """Test that chunks are split into lines"""
+        self.assertEqual(self.spool.feed(b"first\nsec"), ["first"])
+        self.assertEqual(self.spool.feed(b"ond  \r\n\n  third\xe2"),
+                         ["second", ""])
+        self.assertEqual(self.spool.finish(), ["  third"])
+        self.assertEqual(self.spool.finish(), [])
+        self.assertEqual(self.spool.read(), "first\nsecond\n\n  third\n")
+
+    def test_002_tail(self):
+        """Test that only the tail of the output is kept in memory"""
+        for i in range(100):
+            self.spool.write("line %d\n" % i)
+        self.assertEqual(self.spool.tail(), " 97\nline 98\nline 99\n")
+        self.assertLessEqual(self.spool.tail_length, 20 + len("line 99\n"))
+        self.spool.close()
+        self.assertEqual(os.path.getsize(self.spool.filename),
+                         self.spool.size)
+        self.assertEqual(self.spool.read().count("\n"), 100)
+
+    def test_003_read_capped(self):
+        """Test that reading long output keeps its beginning and end"""
+        self.spool.write("a" * 100 + "b" * 100)
+        self.assertEqual(self.spool.read(20), "a" * 10 +
+                         "\n[... 180 bytes of output omitted ...]\n" +
+                         "b" * 10)
+
+
+if __name__ == "__main__":
+    main()
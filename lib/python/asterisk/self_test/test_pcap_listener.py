@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Packet capture writer unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from harness_shared import main
+from pcap_listener import PcapRingWriter
+
+
+def read_pcap(pcap_file):
+    """Read the packets of a pcap file
+
+    Returns:
+    A list of (timestamp, original length, captured bytes) tuples
+    """
+    data = pcap_file.read()
+    packets = []
+    offset = 24
+    while offset < len(data):
+        seconds, nsec, captured, length = struct.unpack_from('=IIII', data,
+                                                             offset)
+        offset += 16
+        packets.append((seconds + nsec / 1e9, length,
+                        data[offset:offset + captured]))
+        offset += captured
+    return packets
+
+
+class PcapRingWriterTests(unittest.TestCase):
+    """Unit tests for PcapRingWriter"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'packet.pcap')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_001_write(self):
+        """Test writing truncated packets"""
+        writer = PcapRingWriter(self.path, snaplen=4)
+        writer.write(b'abcdef', 1000.5)
+        writer.write(b'xy', 1001.25)
+        writer.close()
+
+        with open(self.path, 'rb') as pcap_file:
+            self.assertEqual(struct.unpack('=I', pcap_file.read(4))[0],
+                             0xa1b23c4d)
+            pcap_file.seek(0)
+            self.assertEqual(read_pcap(pcap_file),
+                             [(1000.5, 6, b'abcd'), (1001.25, 2, b'xy')])
+
+    def test_002_rotate(self):
+        """Test rotating, compressing and removing old files"""
+        writer = PcapRingWriter(self.path, max_bytes=170, max_files=2,
+                                compress=True)
+        for i in range(10):
+            writer.write(bytes([i]) * 60, 1000 + i)
+        writer.close()
+
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['packet.3.pcap.gz', 'packet.4.pcap.gz',
+                          'packet.pcap'])
+        with gzip.open(os.path.join(self.tmpdir, 'packet.4.pcap.gz')) as f:
+            self.assertEqual([packet[0] for packet in read_pcap(f)],
+                             [1006, 1007])
+        with open(self.path, 'rb') as pcap_file:
+            self.assertEqual([packet[0] for packet in read_pcap(pcap_file)],
+                             [1008, 1009])
+
+    def test_003_rotate_interval(self):
+        """Test rotating by time"""
+        writer = PcapRingWriter(self.path, max_seconds=5)
+        for i in range(12):
+            writer.write(b'x', 1000 + i)
+        writer.close()
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['packet.1.pcap', 'packet.2.pcap', 'packet.pcap'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""VoIP packet interpretation unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import socket
+import struct
+import unittest
+
+from harness_shared import main
+from asterisk.pcap_proxy import VOIPSniffer
+
+SIP = (b"INVITE sip:100@127.0.0.1 SIP/2.0\r\n"
+       b"Via: SIP/2.0/UDP 127.0.0.2:5060\r\n"
+       b"Content-Type: application/sdp\r\n"
+       b"Content-Length: 30\r\n\r\n"
+       b"v=0\r\nm=audio 10000 RTP/AVP 0\r\n")
+
+
+def udp_frame(src_port, payload, src_addr='127.0.0.2'):
+    """Build an Ethernet/IPv4/UDP frame"""
+    ip_header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 28 + len(payload), 0,
+                            0, 64, 17, 0, socket.inet_aton(src_addr),
+                            socket.inet_aton('127.0.0.1'))
+    udp_header = struct.pack('!HHHH', src_port, 20000, 8 + len(payload), 0)
+    return b'\x00' * 12 + b'\x08\x00' + ip_header + udp_header + payload
+
+
+def rtp_payload(seqno):
+    """Build an RTP packet"""
+    return struct.pack('!BBHII', 0x80, 0x80, seqno, seqno * 160, 1234) + \
+        b'\xff' * 160
+
+
+class VOIPSnifferTests(unittest.TestCase):
+    """Unit tests for interpreting captured packets"""
+
+    def setUp(self):
+        self.sniffer = VOIPSniffer({'trace-limit': 3}, None)
+        self.packets = []
+        self.sniffer.add_callback('*', self.packets.append)
+
+    def test_001_demultiplex(self):
+        """Test that media is only interpreted from ports in an SDP"""
+        self.sniffer.process_packet(udp_frame(10000, rtp_payload(1)),
+                                    (None, None))
+        self.assertEqual(self.packets, [])
+
+        self.sniffer.process_packet(udp_frame(5060, SIP), (None, None))
+        self.sniffer.process_packet(udp_frame(10000, rtp_payload(2)),
+                                    (None, None))
+        rtcp = struct.pack('!BBHI', 0x80, 201, 1, 1234)
+        self.sniffer.process_packet(udp_frame(10001, rtcp), (None, None))
+        self.sniffer.process_packet(udp_frame(10000, rtp_payload(3),
+                                              '127.0.0.3'), (None, None))
+
+        sip, rtp, rtcp = self.packets
+        self.assertEqual(sip.packet_type, 'SIP')
+        self.assertEqual(sip.src_addr, '127.0.0.2')
+        self.assertEqual(sip.body.rtp_port, 10000)
+        self.assertEqual(sip.ip_layer.header.source, '127.0.0.2')
+        self.assertEqual(rtp.packet_type, 'RTP')
+        self.assertEqual((rtp.seqno, rtp.timestamp, rtp.ssrc, rtp.marker),
+                         (2, 320, 1234, 1))
+        self.assertEqual(rtp.dst_port, 20000)
+        self.assertEqual(rtcp.packet_type, 'RTCP')
+        self.assertEqual(rtcp.rtcp_header.ssrc, 1234)
+        self.assertEqual(len(rtcp.receiver_report.report_block), 0)
+
+    def test_002_trace_limit(self):
+        """Test that only the latest packets are kept in the traces"""
+        self.sniffer.process_packet(udp_frame(5060, SIP), (None, None))
+        for seqno in range(5):
+            self.sniffer.process_packet(udp_frame(10000, rtp_payload(seqno)),
+                                        (None, None))
+        self.assertEqual(len(self.packets), 6)
+        self.assertEqual([packet.seqno for packet in
+                          self.sniffer.traces['127.0.0.2']], [2, 3, 4])
+
+
+if __name__ == "__main__":
+    main()
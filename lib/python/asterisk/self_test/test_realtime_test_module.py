@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Realtime test module data store unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import unittest
+
+from harness_shared import main
+from asterisk.realtime_test_module import RealtimeData
+
+
+class RealtimeDataTests(unittest.TestCase):
+    """Unit tests for RealtimeData"""
+
+    def setUp(self):
+        self.rt_data = RealtimeData()
+        self.rt_data.add_rows('endpoint', [
+            {'id': 'alice', 'context': 'default'},
+            {'id': 'alice2', 'context': 'other'},
+            {'id': 'bob', 'context': 'default'},
+            {'id': 'carol'},
+        ])
+
+    def ids(self, where):
+        """Get the ids of the rows matching a where clause"""
+        return [row['id'] for row in
+                self.rt_data.retrieve_rows('endpoint', where)]
+
+    def test_001_retrieve(self):
+        """Test matching values against the start of each value"""
+        self.assertEqual(self.ids({'id': 'alice'}), ['alice', 'alice2'])
+        self.assertEqual(self.ids({'id': 'alice$'}), ['alice'])
+        self.assertEqual(self.ids({'context': 'default'}), ['alice', 'bob'])
+        self.assertEqual(self.ids({'context': '.*'}),
+                         ['alice', 'alice2', 'bob'])
+        self.assertEqual(self.ids({'id': 'a|b', 'context': 'def'}),
+                         ['alice', 'bob'])
+        self.assertEqual(self.ids({}), ['alice', 'alice2', 'bob', 'carol'])
+        self.assertEqual(self.rt_data.retrieve_row('endpoint',
+                                                   {'id': 'dave'}), {})
+        self.assertRaises(KeyError, self.rt_data.retrieve_rows, 'aor', {})
+
+    def test_002_update(self):
+        """Test that updated values are found"""
+        self.assertEqual(self.rt_data.update_rows(
+            'endpoint', {'context': 'default'}, {'context': 'moved'}), 2)
+        self.assertEqual(self.ids({'context': 'default'}), [])
+        self.assertEqual(self.ids({'context': 'moved'}), ['alice', 'bob'])
+
+    def test_003_delete(self):
+        """Test that deleted rows are no longer found"""
+        self.assertEqual(self.ids({'id': 'carol'}), ['carol'])
+        self.assertEqual(self.rt_data.delete_rows('endpoint',
+                                                  {'id': 'alice'}), 2)
+        self.assertEqual(self.ids({'id': '.*'}), ['bob', 'carol'])
+        self.rt_data.add_row('endpoint', {'id': 'alice'})
+        self.assertEqual(self.ids({'id': 'a'}), ['alice'])
+        self.assertEqual(len(self.rt_data.tables['endpoint']), 3)
+
+    def test_004_index_choice(self):
+        """Test that a plain literal is looked up before a regex"""
+        table = self.rt_data.tables['endpoint']
+        self.assertEqual(self.ids({'id': 'alice2', 'context': '.*'}),
+                         ['alice2'])
+        self.assertEqual(list(table.indexes), ['id'])
+
+
+if __name__ == "__main__":
+    main()
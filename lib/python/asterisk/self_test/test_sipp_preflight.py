@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""SIPp scenario preflight unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk import sipp_preflight
+
+UAC = """<?xml version="1.0" encoding="ISO-8859-1" ?>
+<!DOCTYPE scenario SYSTEM "sipp.dtd">
+<scenario name="uac">
+  <!-- Comments may hold -- as SIPp doesn't mind -->
+  <send retrans="500">
+    <![CDATA[
+      INVITE sip:[service]@[remote_ip]:[remote_port] SIP/2.0
+      From: [field0] <sip:[field1]@[local_ip]>
+    ]]>
+  </send>
+  <recv response="100" optional="true" />
+  <recv response="200" rrs="true">
+    <action>
+      <ereg regexp="\\"(.*)\\"" search_in="hdr" header="From:" />
+      <exec play_pcap_audio="audio.pcap" />
+      <exec rtp_stream="pause" />
+    </action>
+  </recv>
+  <send next="end">
+    <![CDATA[
+      SIP/2.0 200 OK
+    ]]>
+  </send>
+  <Reference variables="1","2" />
+  <label id="end" />
+</scenario>
+"""
+
+
+class SIPpPreflightTests(unittest.TestCase):
+    """Unit tests for the SIPp scenario preflight"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.test_dir, 'sipp'))
+        self.write('uac.xml', UAC)
+        self.write('audio.pcap', '')
+        self.write('users.csv', 'SEQUENTIAL\nalice;1234\n')
+        self.index = sipp_preflight.ScenarioIndex(
+            os.path.join(self.test_dir, 'index.pickle'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, contents):
+        """Write a file to the test's sipp directory"""
+        with open(os.path.join(self.test_dir, 'sipp', name), 'w') as f:
+            f.write(contents)
+
+    def preflight(self, scenarios):
+        """Run the preflight on a SIPpTestCase configuration"""
+        config = {'test-object-config': {'test-iterations': [
+            {'scenarios': scenarios}]}}
+        return sipp_preflight.preflight(self.test_dir, config, self.index)
+
+    def test_001_parse(self):
+        """Test that a scenario is parsed the way SIPp reads it"""
+        plans, errors = self.preflight([
+            {'key-args': {'scenario': 'uac.xml', '-p': '5061',
+                          '-inf': 'users.csv', '-t': 't1'},
+             'target': '127.0.0.2'}])
+        self.assertEqual(errors, [])
+        self.assertEqual(plans[0]['messages'], [
+            ('send', 'INVITE', False), ('recv', '100', True),
+            ('recv', '200', False), ('send', '200', False)])
+        self.assertEqual(plans[0]['fields'], 2)
+        self.assertEqual(plans[0]['transport'], 'tcp')
+        self.assertEqual(plans[0]['port'], '5061')
+        self.assertEqual(plans[0]['target'], '127.0.0.2')
+        self.assertEqual(plans[0]['files'],
+                         [os.path.join(self.test_dir, 'sipp', 'users.csv')])
+
+    def test_002_errors(self):
+        """Test that broken scenarios and missing files are found"""
+        self.write('broken.xml', UAC.replace('<label id="end" />', '')
+                   .replace('</recv>', '</recv_>'))
+        self.write('labels.xml', UAC.replace('<label id="end" />', ''))
+        plans, errors = self.preflight([
+            {'key-args': {'scenario': 'uac.xml', '-tls_cert': 'x.pem',
+                          '-t': 'q1'}},
+            {'key-args': {'scenario': 'missing.xml'}},
+            {'key-args': {'scenario': 'broken.xml'}},
+            {'key-args': {'scenario': 'labels.xml', '-inf': 'users.csv'}}])
+        self.assertEqual(len(plans), 3)
+        self.assertEqual(len(errors), 6)
+        for error, expected in zip(errors, [
+                "x.pem used by scenario", "uses injected fields",
+                "unknown transport mode 'q1'", "missing.xml not found",
+                "unexpected </recv_>", "undefined label 'end'"]):
+            self.assertIn(expected, error)
+
+    def test_003_index(self):
+        """Test that parsed scenarios are shared and saved"""
+        path = os.path.join(self.test_dir, 'sipp', 'uac.xml')
+        self.write('copy.xml', UAC)
+        first = self.index.get(path, sipp_preflight.parse_scenario)
+        copy = self.index.get(os.path.join(self.test_dir, 'sipp', 'copy.xml'),
+                              sipp_preflight.parse_scenario)
+        self.assertIs(first, copy)
+        self.index.save()
+
+        index = sipp_preflight.ScenarioIndex(self.index.path)
+        self.assertEqual(index.get(path, sipp_preflight.parse_scenario),
+                         first)
+        self.assertFalse(index.dirty)
+
+        self.write('uac.xml', UAC.replace('INVITE', 'OPTIONS'))
+        os.utime(path, (0, 0))
+        info = index.get(path, sipp_preflight.parse_scenario)
+        self.assertEqual(info['messages'][0], ('send', 'OPTIONS', False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Test condition controller unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import unittest
+
+from twisted.internet import defer
+
+from harness_shared import main
+from asterisk.test_conditions import (SharedCliOutput, TestCondition,
+                                      TestConditionController)
+
+
+class AstMockPending(object):
+    """mock Asterisk whose CLI commands complete when told to"""
+
+    def __init__(self):
+        """Constructor"""
+        self.commands = []
+
+    def cli_exec(self, command):
+        """Record the command and return a deferred for its output"""
+        deferred = defer.Deferred()
+        self.commands.append((command, deferred))
+        return deferred
+
+
+class ConfigMock(object):
+    """mock test condition configuration"""
+
+    def __init__(self, name):
+        """Constructor"""
+        self.class_type_name = name
+        self.enabled = True
+        self.pass_expected = True
+
+
+class ShowCondition(TestCondition):
+    """test condition that runs 'core show channels' on every instance"""
+
+    def evaluate(self, related_test_condition=None):
+        """Evaluate the condition"""
+
+        def __output(result):
+            """Check the command output"""
+            if result != "0 active channels":
+                self.fail_check(result)
+            return result
+
+        def __finished(result):
+            """Mark the condition as evaluated"""
+            self.pass_check()
+            return self
+
+        exec_list = [self.cli_exec(ast, "core show channels").addCallback(
+            __output) for ast in self.ast]
+        return defer.DeferredList(exec_list).addCallback(__finished)
+
+
+class SharedCliOutputTests(unittest.TestCase):
+    """Unit tests for SharedCliOutput"""
+
+    def test_001_shared(self):
+        """Test that identical commands are executed once"""
+        ast = AstMockPending()
+        shared = SharedCliOutput()
+        results = []
+        shared.cli_exec(ast, "core show channels").addCallback(results.append)
+        shared.cli_exec(ast, "core show channels").addCallback(results.append)
+        shared.cli_exec(ast, "core show locks").addCallback(results.append)
+        self.assertEqual([cmd for cmd, _ in ast.commands],
+                         ["core show channels", "core show locks"])
+
+        ast.commands[0][1].callback("output")
+        self.assertEqual(results, ["output", "output"])
+
+        # Later callers get the same output straight away
+        shared.cli_exec(ast, "core show channels").addCallback(results.append)
+        self.assertEqual(results, ["output", "output", "output"])
+        self.assertEqual(len(ast.commands), 2)
+
+    def test_002_failure(self):
+        """Test that a failed command fails every caller"""
+        ast = AstMockPending()
+        shared = SharedCliOutput()
+        failures = []
+        for _ in range(2):
+            shared.cli_exec(ast, "core show fd").addErrback(failures.append)
+        ast.commands[0][1].errback(RuntimeError("gone"))
+        self.assertEqual(len(failures), 2)
+        self.assertTrue(failures[0].check(RuntimeError))
+
+
+class TestConditionControllerTests(unittest.TestCase):
+    """Unit tests for TestConditionController"""
+
+    def test_001_concurrent(self):
+        """Test that conditions are evaluated together"""
+        ast = AstMockPending()
+        controller = TestConditionController(None, [ast])
+        first = ShowCondition(ConfigMock("first"))
+        second = ShowCondition(ConfigMock("second"))
+        disabled = ShowCondition(ConfigMock("disabled"))
+        disabled._enabled = False
+        for condition in [first, disabled, second]:
+            controller.register_pre_test_condition(condition)
+
+        done = []
+        controller.evaluate_pre_checks().addCallback(done.append)
+        self.assertEqual(len(ast.commands), 1)
+        self.assertEqual(done, [])
+
+        ast.commands[0][1].callback("1 active channels")
+        self.assertEqual(done, [controller])
+        self.assertEqual(first.get_status(), "Failed")
+        self.assertEqual(second.get_status(), "Failed")
+        self.assertEqual(disabled.get_status(), "Inconclusive")
+
+
+if __name__ == "__main__":
+    main()
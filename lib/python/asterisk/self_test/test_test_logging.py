@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Asynchronous test logging unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk import test_logging
+
+
+class TestLoggingTests(unittest.TestCase):
+    """Unit tests for the test logging pipeline"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.logger = logging.getLogger('test_logging_self_test')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.handlers = []
+
+    def tearDown(self):
+        test_logging.stop()
+        for handler in list(self.logger.handlers) + self.handlers:
+            self.logger.removeHandler(handler)
+            handler.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_001_text(self):
+        """Test that records are written once the writer is stopped"""
+        path = os.path.join(self.tmpdir, 'full.txt')
+        handler = test_logging.BatchFileHandler(path)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        messages = test_logging.BatchFileHandler(
+            os.path.join(self.tmpdir, 'messages.txt'))
+        messages.setLevel(logging.INFO)
+        self.handlers = [handler, messages]
+        test_logging.start(self.logger, self.handlers)
+
+        args = {'count': 1}
+        self.logger.debug("event %s", args)
+        args['count'] = 2
+        self.logger.info("done")
+        test_logging.stop()
+
+        with open(path) as log_file:
+            self.assertEqual(log_file.read(),
+                             "DEBUG event {'count': 1}\nINFO done\n")
+        with open(os.path.join(self.tmpdir, 'messages.txt')) as log_file:
+            self.assertEqual(log_file.read(), "done\n")
+
+    def test_002_binary(self):
+        """Test writing and reading the binary format"""
+        path = os.path.join(self.tmpdir, test_logging.BINARY_LOG)
+        self.handlers = [test_logging.BinaryRecordHandler(path)]
+        test_logging.start(self.logger, self.handlers)
+        for i in range(3):
+            self.logger.debug("event %d", i)
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            self.logger.exception("failed")
+        test_logging.stop()
+
+        records = list(test_logging.read_records(path))
+        self.assertEqual([record.getMessage() for record in records],
+                         ["event 0", "event 1", "event 2", "failed"])
+        self.assertIn("ValueError: bad", records[3].exc_text)
+        lines = list(test_logging.format_records(path))
+        self.assertIn("DEBUG[%d]: test_logging_self_test:" % os.getpid(),
+                      lines[0])
+
+    def test_003_rate_limit(self):
+        """Test that debug records beyond the rate limit are dropped"""
+        limiter = test_logging.RateLimiter({'asterisk.ami': 2})
+        results = [limiter.check('asterisk.ami.events') for _ in range(4)]
+        self.assertEqual([allowed for _, allowed, _ in results],
+                         [True, True, False, False])
+        self.assertEqual(results[0][0], 'asterisk.ami')
+        self.assertEqual(limiter.check('asterisk.amiextra'),
+                         (None, True, 0))
+
+        limiter.buckets['asterisk.ami'][0] = 2
+        self.assertEqual(limiter.check('asterisk.ami'),
+                         ('asterisk.ami', True, 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""Test duration history and sharding unit tests
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from harness_shared import main
+from asterisk.test_timing import TestTimings, parse_shard, shard, \
+    shard_by_name, DEFAULT_DURATION
+
+
+class TestTimingsTests(unittest.TestCase):
+    """Unit tests for the timing database"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'timings.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_001_record_and_save(self):
+        """Test recording durations and loading them back"""
+        timings = TestTimings(self.path)
+        self.assertEqual(timings.estimate('tests/a'), DEFAULT_DURATION)
+
+        timings.record('tests/a', 10.0)
+        timings.record('tests/a', 20.0)
+        timings.record('tests/b', 4.0)
+        timings.save()
+
+        timings = TestTimings(self.path)
+        self.assertEqual(timings.estimate('tests/a'), 15.0)
+        self.assertEqual(timings.timings['tests/a']['runs'], 2)
+        self.assertEqual(timings.estimate('tests/c', 1.0), 1.0)
+        self.assertEqual(timings.default_duration(), 15.0)
+
+    def test_002_unreadable(self):
+        """Test that a corrupt database is ignored"""
+        with open(self.path, 'w') as db_file:
+            db_file.write('{not json')
+        self.assertEqual(TestTimings(self.path).timings, {})
+
+
+class ShardTests(unittest.TestCase):
+    """Unit tests for sharding"""
+
+    def test_001_parse_shard(self):
+        """Test parsing shard specifications"""
+        self.assertEqual(parse_shard('1/3'), (1, 3))
+        self.assertEqual(parse_shard('3/3'), (3, 3))
+        self.assertRaises(ValueError, parse_shard, '0/3')
+        self.assertRaises(ValueError, parse_shard, '4/3')
+        self.assertRaises(ValueError, parse_shard, '3')
+
+    def test_002_balanced(self):
+        """Test that shards are balanced by duration"""
+        durations = {'a': 10, 'b': 7, 'c': 6, 'd': 5, 'e': 2}
+        shards = shard(durations.keys(), 2, lambda n: durations[n])
+
+        self.assertEqual(shards, [['a', 'd'], ['b', 'c', 'e']])
+        self.assertEqual(sorted(sum(shards, [])), sorted(durations))
+
+    def test_003_more_shards_than_items(self):
+        """Test that extra shards are simply empty"""
+        shards = shard(['a', 'b'], 3, lambda n: 1)
+        self.assertEqual(shards, [['a'], ['b'], []])
+
+    def test_004_by_name(self):
+        """Test that shards by name cover every item once, stably"""
+        names = ['tests/%d' % i for i in range(100)]
+        shards = shard_by_name(names, 4)
+        self.assertEqual(sorted(sum(shards, [])), sorted(names))
+        self.assertTrue(all(shards))
+        self.assertEqual(shard_by_name(reversed(names), 4), shards)
+
+
+if __name__ == "__main__":
+    main()
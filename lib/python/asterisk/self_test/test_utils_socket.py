@@ -11,9 +11,14 @@ the GNU General Public License Version 2.
 """
 
 from harness_shared import main
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 from socket import SOCK_STREAM, SOCK_DGRAM, AF_INET, AF_INET6
-from asterisk.utils_socket import Ports, PortError, get_available_port, MIN_PORT
+from asterisk.utils_socket import Ports, PortError, PortBroker, \
+    get_available_port, get_port_range, MIN_PORT
 
 
 class PortTests(unittest.TestCase):
@@ -159,6 +164,74 @@ class PortTests(unittest.TestCase):
         self.assertEqual(get_available_port(
             '[::]', p, SOCK_STREAM, AF_INET6, 2), p)
 
+    def test_007_port_range(self):
+        """Test picking random ports from a configured port range"""
+
+        self.assertEqual(get_port_range(''), None)
+        self.assertEqual(get_port_range('51000-51009'), (51000, 51009))
+        self.assertRaises(ValueError, get_port_range, '51009-51000')
+        self.assertRaises(ValueError, get_port_range, 'abc')
+
+        ports = Ports((51000, 51009))
+        res = ports.get_range_and_reserve('127.0.0.1', num=4)
+        self.assertEqual(len(res), 4)
+        for port in res:
+            self.assertTrue(51000 <= port <= 51009)
+
+        res2 = ports.get_range_and_reserve('127.0.0.1', num=4)
+        self.assertFalse(set(res) & set(res2))
+        for port in res2:
+            self.assertTrue(51000 <= port <= 51009)
+
+
+
+class PortBrokerTests(unittest.TestCase):
+    """Unit tests for machine-wide port leases."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_001_disjoint_leases(self):
+        """Test that brokers lease disjoint blocks in the port range"""
+
+        brokers = [PortBroker(self.path, (51000, 51399)) for i in range(5)]
+        blocks = [broker.lease() for broker in brokers[:4]]
+
+        self.assertEqual(sorted(blocks), [(51000, 51099), (51100, 51199),
+                                          (51200, 51299), (51300, 51399)])
+        self.assertEqual(brokers[4].lease(), None)
+
+        brokers[0].release()
+        self.assertEqual(brokers[4].lease(), blocks[0])
+
+    def test_002_reclaim(self):
+        """Test that the leases of exited processes are reclaimed"""
+
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        with open(PortBroker(self.path).registry, 'w') as registry:
+            registry.write('{"51000": %d}' % child.pid)
+
+        self.assertEqual(PortBroker(self.path, (51000, 51099)).lease(),
+                         (51000, 51099))
+
+    def test_003_ports(self):
+        """Test picking random ports from leased blocks"""
+
+        ports = Ports(broker=PortBroker(self.path, (51000, 51199)))
+        res = ports.get_range_and_reserve('127.0.0.1', num=4)
+        self.assertEqual(len(res), 4)
+        for port in res:
+            self.assertTrue(51000 <= port <= 51199)
+
+        # Another process picks ports from a different block
+        other = Ports(broker=PortBroker(self.path, (51000, 51199)))
+        res2 = other.get_range_and_reserve('127.0.0.1', num=4)
+        self.assertNotEqual(res[0] // 100, res2[0] // 100)
+
 
 if __name__ == "__main__":
     """Run the unit tests"""
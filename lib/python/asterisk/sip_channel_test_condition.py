@@ -58,7 +58,7 @@ class SipChannelTestCondition(TestCondition):
         # Set to pass and let a failure override
         super(SipChannelTestCondition, self).pass_check()
 
-        exec_list = [ast.cli_exec('sip show channels').addCallback(
+        exec_list = [self.cli_exec(ast, 'sip show channels').addCallback(
             __channel_callback) for ast in self.ast]
         defer.DeferredList(exec_list).addCallback(__raise_finished,
                                                   finished_deferred)
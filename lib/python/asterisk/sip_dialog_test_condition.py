@@ -63,7 +63,7 @@ class SipDialogTestCondition(TestCondition):
             deferreds = []
             for name in dialog_names:
                 LOGGER.debug("Retrieving history for SIP dialog %s" % name)
-                deferred = ast.cli_exec("sip show history %s" % name)
+                deferred = self.cli_exec(ast, "sip show history %s" % name)
                 deferred.addCallback(__show_history_callback)
                 deferreds.append(deferred)
             defer.DeferredList(deferreds).addCallback(__history_complete)
@@ -88,7 +88,8 @@ class SipDialogTestCondition(TestCondition):
 
         self.dialogs_history[ast.host] = {}
         self._finished_deferred = defer.Deferred()
-        ast.cli_exec("sip show objects").addCallback(__show_objects_callback)
+        self.cli_exec(ast, "sip show objects").addCallback(
+            __show_objects_callback)
 
         return self._finished_deferred
 
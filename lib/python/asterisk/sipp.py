@@ -9,20 +9,34 @@ This program is free software, distributed under the terms of
 the GNU General Public License Version 2.
 """
 
+import collections
 import logging
+import os
 from . import test_suite_utils
 
 from abc import ABCMeta, abstractmethod
 from twisted.internet import reactor, defer, protocol, error
 from .test_case import TestCase
-from .utils_socket import get_available_port
+from .utils_socket import get_available_port, PortError
 from .test_runner import load_and_parse_module
+from .sipp_preflight import PATH_ARGS
 from .pluggable_registry import PLUGGABLE_EVENT_REGISTRY,\
     PLUGGABLE_ACTION_REGISTRY
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Number of characters of a scenario's output kept in memory
+OUTPUT_LIMIT = 64 * 1024
+
+# Number of media ports SIPp binds: audio rtp/rtcp and video rtp/rtcp
+MEDIA_PORTS = 4
+
+# Most media ports reserved in one range. This keeps a range within a block
+# of ports leased from the port broker.
+MEDIA_RANGE_SIZE = 96
+
+
 class ScenarioGenerator(object):
     """Scenario Generators provide a generator function for creating scenario
     sets for use by SIPpTestCase"""
@@ -488,6 +502,13 @@ class SIPpScenarioSequence(object):
         if type(scenarios) is not list:
             scenarios = [scenarios]
 
+        # Build the command lines of the whole group before starting any of
+        # them, so that the scenarios start as close together as possible.
+        self._allocate_media_ports(scenarios)
+        for scenario in scenarios:
+            if hasattr(scenario, 'prepare'):
+                scenario.prepare()
+
         deferds = []
         for scenario in scenarios:
             # If we fail on any, let the SIPp scenario handle it by passing it
@@ -510,6 +531,18 @@ class SIPpScenarioSequence(object):
             deferred_list.addCallback(self._intermediate_cb_fn)
         deferred_list.addCallback(__execute_next)
 
+    def _allocate_media_ports(self, scenarios):
+        """Reserve the media ports of a group of scenarios about to start
+
+        Ports are only reserved for the next group, as Asterisk may bind
+        ports in its RTP range while earlier groups run.
+        """
+        hosts = collections.Counter()
+        for scenario in scenarios:
+            hosts.update(getattr(scenario, 'media_hosts', list)())
+        for host, count in hosts.items():
+            LAUNCHER.allocate_media_ports(host, count)
+
 
 class SIPpProtocol(protocol.ProcessProtocol):
     """Class that manages a single SIPp instance"""
@@ -523,7 +556,8 @@ class SIPpProtocol(protocol.ProcessProtocol):
                         process has exited
         """
         self._name = name
-        self.output = ""
+        self._output = collections.deque()
+        self._output_length = 0
         self.exitcode = 0
         self.exited = False
         self.stderr = []
@@ -539,11 +573,19 @@ class SIPpProtocol(protocol.ProcessProtocol):
             except error.ProcessExitedAlready:
                 LOGGER.warn("Process for scenario %s exited" % self._name)
 
+    @property
+    def output(self):
+        """The last OUTPUT_LIMIT characters of output of the scenario"""
+        return ''.join(self._output)[-OUTPUT_LIMIT:]
+
     def outReceived(self, data):
         """Override of ProcessProtocol.outReceived"""
-        LOGGER.debug("Received from SIPp scenario %s:\n %s" % (self._name,
-                        data.decode('utf-8', 'ignore')))
-        self.output += data.decode('utf-8', 'ignore')
+        text = data.decode('utf-8', 'ignore')
+        LOGGER.debug("Received from SIPp scenario %s:\n %s", self._name, text)
+        self._output.append(text)
+        self._output_length += len(text)
+        while self._output_length - len(self._output[0]) >= OUTPUT_LIMIT:
+            self._output_length -= len(self._output.popleft())
 
     def connectionMade(self):
         """Override of ProcessProtocol.connectionMade"""
@@ -581,6 +623,67 @@ class SIPpProtocol(protocol.ProcessProtocol):
         return reason
 
 
+class SIPpLauncher(object):
+    """Does the work of launching SIPp that doesn't change between scenarios.
+
+    The sipp binary is looked up once for each PATH, and media ports are
+    reserved in one block for a group of scenarios started together rather
+    than probed and reserved for each scenario of the group.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self._binaries = {}
+        self._media_ports = {}
+
+    def binary(self):
+        """The path to the sipp binary, or None if it isn't installed"""
+        path = os.environ.get('PATH', '')
+        if path not in self._binaries:
+            self._binaries[path] = test_suite_utils.which("sipp")
+        return self._binaries[path]
+
+    def allocate_media_ports(self, host, count):
+        """Reserve the media ports for a number of scenarios
+
+        Ports left over from a previous block are dropped, as they may have
+        been taken since they were probed.
+
+        Keyword Arguments:
+        host  The local address of the scenarios
+        count The number of scenarios
+        """
+        ports = self._media_ports.setdefault(host, collections.deque())
+        ports.clear()
+        while count > 0:
+            num = min(count * MEDIA_PORTS, MEDIA_RANGE_SIZE)
+            try:
+                first = get_available_port(host, num=num)
+            except PortError as e:
+                # Leave it to each scenario to find its own ports
+                LOGGER.debug("Unable to reserve media ports: %s", e)
+                return
+            ports.extend(range(first, first + num, MEDIA_PORTS))
+            count -= num // MEDIA_PORTS
+
+    def media_port(self, host):
+        """Take the first of a block of media ports for a scenario
+
+        Ports allocated by allocate_media_ports are handed out first. Once
+        they run out a new block is reserved.
+
+        Keyword Arguments:
+        host The local address of the scenario
+        """
+        ports = self._media_ports.get(host)
+        if ports:
+            return ports.popleft()
+        return get_available_port(host, num=MEDIA_PORTS)
+
+
+LAUNCHER = SIPpLauncher()
+
+
 class SIPpScenario(object):
     """A SIPp based scenario for the Asterisk testsuite.
 
@@ -630,7 +733,7 @@ class SIPpScenario(object):
         self.positional_args = tuple(positional_args)
         self.test_dir = test_dir
         self.default_port = 5061
-        self.sipp = test_suite_utils.which("sipp")
+        self.sipp = LAUNCHER.binary()
         self.passed = False
         self.exited = False
         self.result = None
@@ -638,6 +741,7 @@ class SIPpScenario(object):
         self.target = target
         self._our_exit_deferred = None
         self._test_case = None
+        self._args = None
         if not self.sipp:
             raise ValueError("SIPpTestObject requires that sipp is installed")
 
@@ -647,47 +751,23 @@ class SIPpScenario(object):
             self._process.kill()
         return
 
-    def run(self, test_case=None, start_deferred=None):
-        """Execute a SIPp scenario
+    def media_hosts(self):
+        """The local addresses this scenario needs media ports on"""
+        if '-mp' in self.scenario:
+            return []
+        return [self.scenario.get('-i', '127.0.0.1')]
 
-        Execute the SIPp scenario that was passed to this object
+    def prepare(self):
+        """Build the SIPp command line for the next run of the scenario
 
-        Keyword Arguments:
-        _test_case  If not None, the scenario will automatically evaluate its
-                    pass/fail status at the end of the run. In the event of a
-                    failure, it will fail the test case scenario and call
-                    stop_reactor.
+        This is done by run if it hasn't been done already.
 
         Returns:
-        A deferred that can be used to determine when the SIPp Scenario
-        has exited.
+        The command line, as a list
         """
+        if self._args is not None:
+            return self._args
 
-        def __scenario_callback(result):
-            """Callback called when a scenario completes"""
-            self.exited = True
-            self.result = result
-            if (result.exitcode == 0):
-                self.passed = True
-                LOGGER.info("SIPp Scenario %s Exited" %
-                            (self.scenario['scenario']))
-            else:
-                LOGGER.warning("SIPp Scenario %s Failed [%d]" %
-                               (self.scenario['scenario'], result.exitcode))
-            self._our_exit_deferred.callback(self)
-            return result
-
-        def __evaluate_scenario_results(result):
-            """Convenience function. If the test case is injected into this
-            method, then auto-fail the test if the scenario fails. """
-            if not self.passed:
-                LOGGER.warning("SIPp Scenario %s Failed" %
-                               self.scenario['scenario'])
-                self._test_case.passed = False
-                self._test_case.stop_reactor()
-            return result
-
-        self.result = None
         sipp_args = [
             self.sipp, self.target,
             '-sf',
@@ -708,9 +788,8 @@ class SIPpScenario(object):
         del default_args['scenario']
 
         # correct file paths to be relative to the test's sipp directory
-        correctable_paths = { "-slave_cfg", "-inf", "-oocsf", "-tls_cert", "-tls_key", "-tls_ca", "-tls_crl" }
         for defarg in default_args:
-            if defarg in correctable_paths:
+            if defarg in PATH_ARGS:
                 default_args[defarg] = ('%s/sipp/%s' % (
                     self.test_dir, default_args[defarg]))
 
@@ -722,10 +801,8 @@ class SIPpScenario(object):
             #
             # So as a work around, if not given, we'll specify the media port
             # ourselves, and make sure all associated ports are available.
-            #
-            # num = 4 = ports for audio rtp/rtcp and video rtp/rtcp
-            default_args['-mp'] = str(get_available_port(
-                default_args.get('-i'), num=4))
+            default_args['-mp'] = str(LAUNCHER.media_port(
+                default_args.get('-i')))
 
         for (key, val) in default_args.items():
             sipp_args.extend([key, val])
@@ -741,6 +818,54 @@ class SIPpScenario(object):
             sipp_args.append('-nr')
             sipp_args.extend(self.positional_args)
 
+        self._args = sipp_args
+        return sipp_args
+
+    def run(self, test_case=None, start_deferred=None):
+        """Execute a SIPp scenario
+
+        Execute the SIPp scenario that was passed to this object
+
+        Keyword Arguments:
+        _test_case  If not None, the scenario will automatically evaluate its
+                    pass/fail status at the end of the run. In the event of a
+                    failure, it will fail the test case scenario and call
+                    stop_reactor.
+
+        Returns:
+        A deferred that can be used to determine when the SIPp Scenario
+        has exited.
+        """
+
+        def __scenario_callback(result):
+            """Callback called when a scenario completes"""
+            self.exited = True
+            self.result = result
+            if (result.exitcode == 0):
+                self.passed = True
+                LOGGER.info("SIPp Scenario %s Exited" %
+                            (self.scenario['scenario']))
+            else:
+                LOGGER.warning("SIPp Scenario %s Failed [%d]" %
+                               (self.scenario['scenario'], result.exitcode))
+            self._our_exit_deferred.callback(self)
+            return result
+
+        def __evaluate_scenario_results(result):
+            """Convenience function. If the test case is injected into this
+            method, then auto-fail the test if the scenario fails. """
+            if not self.passed:
+                LOGGER.warning("SIPp Scenario %s Failed" %
+                               self.scenario['scenario'])
+                self._test_case.passed = False
+                self._test_case.stop_reactor()
+            return result
+
+        self.result = None
+        sipp_args = self.prepare()
+        # A scenario run again gets new media ports
+        self._args = None
+
         LOGGER.info("Executing SIPp scenario: %s" % self.scenario['scenario'])
         LOGGER.debug(sipp_args)
 
@@ -819,6 +944,15 @@ class CoordinatedScenario(object):
         self.receiver.kill()
         return
 
+    def media_hosts(self):
+        """The local addresses the scenarios need media ports on"""
+        return self.receiver.media_hosts() + self.sender.media_hosts()
+
+    def prepare(self):
+        """Build the SIPp command lines of the scenarios"""
+        self.receiver.prepare()
+        self.sender.prepare()
+
     def run(self, test_case=None):
         """Execute a coordinated SIPp scenario
 
@@ -0,0 +1,357 @@
+"""SIPp scenario preflight checks
+
+This module checks the SIPp scenarios referenced by a test's configuration
+before the test is run, so that a broken scenario or a missing injection
+file fails the test without starting Asterisk. Parsed scenarios are kept in
+a persistent index keyed on the hash of the scenario file, which also
+records each scenario's message sequence for use by schedulers.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the stored index changes
+INDEX_VERSION = 1
+
+# SIPp arguments naming files in the test's sipp directory
+PATH_ARGS = ('-slave_cfg', '-inf', '-oocsf', '-tls_cert', '-tls_key',
+             '-tls_ca', '-tls_crl')
+
+# SIPp transport modes to the transport they use
+TRANSPORTS = {
+    'u1': 'udp', 'un': 'udp', 'ui': 'udp', 'c1': 'udp', 'cn': 'udp',
+    't1': 'tcp', 'tn': 'tcp',
+    'l1': 'tls', 'ln': 'tls',
+    's1': 'sctp', 'sn': 'sctp',
+}
+
+# Attributes of an exec action naming a media file, and whether the value
+# is followed by comma separated options
+MEDIA_ATTRIBUTES = (('play_pcap_audio', False), ('play_pcap_video', False),
+                    ('play_pcap_image', False), ('rtp_stream', True))
+
+# Attributes of a scenario element naming the label to go to
+LABEL_ATTRIBUTES = ('next', 'ontimeout')
+
+FIELD_RE = re.compile(r'\[field(\d+)')
+
+# SIPp reads scenarios with its own parser, which is more lenient than an
+# XML parser: comments may hold '--', and attribute values may hold escaped
+# quotes or be followed by stray values, as in variables="a","b".
+COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+TOKEN_RE = re.compile(r'<!\[CDATA\[(.*?)\]\]>|<([?!])[^>]*>|'
+                      r'<(/?)([\w:.-]+)((?:[^>"]|"(?:\\.|[^"\\])*")*?)(/?)>',
+                      re.DOTALL)
+ATTRIBUTE_RE = re.compile(r'([\w:.-]+)\s*=\s*"((?:\\.|[^"\\])*)"')
+
+
+class Element(object):
+    """An element of a scenario"""
+
+    def __init__(self, tag, attrib):
+        self.tag = tag
+        self.attrib = attrib
+        self.text = ''
+        self.children = []
+
+    def get(self, name, default=None):
+        """The value of an attribute"""
+        return self.attrib.get(name, default)
+
+    def iter(self, tag=None):
+        """This element and those below it, optionally of one tag"""
+        if tag is None or self.tag == tag:
+            yield self
+        for child in self.children:
+            for element in child.iter(tag):
+                yield element
+
+
+def parse_elements(text):
+    """Parse a scenario the way SIPp does
+
+    Returns:
+    The root Element
+
+    Raises:
+    ValueError if an element is closed out of order, or there isn't one
+    root element
+    """
+    root = Element(None, {})
+    stack = [root]
+    for match in TOKEN_RE.finditer(COMMENT_RE.sub('', text)):
+        cdata, special, closing, tag, attributes, empty = match.groups()
+        if cdata is not None:
+            stack[-1].text += cdata
+        elif special:
+            continue
+        elif closing:
+            if len(stack) == 1 or stack[-1].tag != tag:
+                raise ValueError("unexpected </%s>" % tag)
+            stack.pop()
+        else:
+            element = Element(tag, dict(ATTRIBUTE_RE.findall(attributes)))
+            stack[-1].children.append(element)
+            if not empty:
+                stack.append(element)
+    # Like SIPp, elements left open at the end of the file are accepted
+    if len(root.children) != 1:
+        raise ValueError("expected one root element, found %d" %
+                         len(root.children))
+    return root.children[0]
+
+
+def parse_scenario(path):
+    """Parse a SIPp scenario
+
+    Keyword Arguments:
+    path The scenario file
+
+    Returns:
+    A dictionary of the scenario's 'messages', a list of ('send' or 'recv',
+    method or response code, optional) tuples, the number of 'fields' it
+    needs from an injection file, the 'media' files it plays and the
+    'errors' found.
+    """
+    info = {'messages': [], 'fields': 0, 'media': [], 'errors': []}
+    try:
+        with open(path, 'r', errors='replace') as scenario_file:
+            root = parse_elements(scenario_file.read())
+    except (ValueError, IOError) as e:
+        info['errors'].append("Unable to parse scenario %s: %s" % (path, e))
+        return info
+    if root.tag != 'scenario':
+        info['errors'].append("Scenario %s has root element '%s'" %
+                              (path, root.tag))
+        return info
+
+    labels = set(label.get('id') for label in root.iter('label'))
+    for element in root.children:
+        optional = element.get('optional') == 'true'
+        if element.tag == 'send':
+            text = element.text.strip()
+            if not text:
+                info['errors'].append("Scenario %s has an empty send" % path)
+                continue
+            words = text.split(None, 2)
+            if words[0].startswith('SIP/') and len(words) > 1:
+                info['messages'].append(('send', words[1], optional))
+            else:
+                info['messages'].append(('send', words[0], optional))
+        elif element.tag == 'recv':
+            expected = element.get('request') or element.get('response')
+            if expected is None and not (element.get('pcap') or
+                                         element.get('rtp')):
+                info['errors'].append("Scenario %s has a recv without a "
+                                      "request or response" % path)
+                continue
+            info['messages'].append(('recv', expected, optional))
+        for attribute in LABEL_ATTRIBUTES:
+            label = element.get(attribute)
+            if label is not None and label not in labels:
+                info['errors'].append("Scenario %s goes to undefined label "
+                                      "'%s'" % (path, label))
+
+    for element in root.iter():
+        for value in [element.text] + list(element.attrib.values()):
+            for field in FIELD_RE.findall(value):
+                info['fields'] = max(info['fields'], int(field) + 1)
+    for element in root.iter('exec'):
+        for attribute, has_options in MEDIA_ATTRIBUTES:
+            value = element.get(attribute)
+            if value and has_options:
+                value = value.split(',')[0]
+            if value and value != 'pause':
+                info['media'].append(value)
+    return info
+
+
+class ScenarioIndex(object):
+    """A cache of parsed SIPp files, keyed on the hash of their contents.
+
+    A file is only hashed again once its modification time or size change,
+    and only parsed again once its contents change. Files with the same
+    contents share an entry. The returned dictionaries are shared with the
+    index and must not be modified by callers.
+    """
+
+    def __init__(self, path=None):
+        """Load the index.
+
+        Keyword Arguments:
+        path The path of the index file. None keeps the index in memory
+             only. A missing, unreadable or outdated index results in an
+             empty one.
+        """
+        self.path = path
+        self.files = {}
+        self.parsed = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'rb') as index_file:
+                index = pickle.load(index_file)
+            if index.get('version') == INDEX_VERSION:
+                self.files = index['files']
+                self.parsed = index['parsed']
+        except Exception as err:
+            LOGGER.warning("Ignoring unreadable SIPp scenario index %s: %s" %
+                           (path, err))
+
+    def get(self, path, parser):
+        """Retrieve the parsed contents of a file.
+
+        Keyword Arguments:
+        path   The file
+        parser The function parsing the file, such as parse_scenario. Its
+               name is part of the key.
+
+        Raises IOError if the file can't be read.
+        """
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.files.get(path)
+            if entry and entry[0] == key:
+                digest = entry[1]
+            else:
+                with open(path, 'rb') as parsed_file:
+                    digest = hashlib.sha1(parsed_file.read()).hexdigest()
+                self.files[path] = (key, digest)
+                self.dirty = True
+            parsed_key = (parser.__name__, digest)
+            if parsed_key not in self.parsed:
+                self.parsed[parsed_key] = parser(path)
+                self.dirty = True
+            return self.parsed[parsed_key]
+
+    def save(self):
+        """Write the index to disk if anything changed."""
+        if not self.path or not self.dirty:
+            return
+
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as index_file:
+                pickle.dump({'version': INDEX_VERSION, 'files': self.files,
+                             'parsed': self.parsed},
+                            index_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self.path)
+            self.dirty = False
+        except (IOError, OSError, pickle.PicklingError) as err:
+            LOGGER.warning("Failed to save SIPp scenario index %s: %s" %
+                           (self.path, err))
+
+
+def find_scenarios(config):
+    """Find the SIPp scenarios in a test configuration
+
+    Scenarios are given either as a dictionary of 'key-args', with optional
+    'ordered-args' and 'target', or as a dictionary of SIPp arguments.
+
+    Keyword Arguments:
+    config The parsed test-config.yaml
+
+    Returns:
+    A generator of (key arguments, ordered arguments, target) tuples
+    """
+    if isinstance(config, list):
+        for item in config:
+            for scenario in find_scenarios(item):
+                yield scenario
+    elif isinstance(config, dict):
+        key_args = config.get('key-args')
+        if isinstance(key_args, dict) and 'scenario' in key_args:
+            yield (key_args, config.get('ordered-args') or [],
+                   config.get('target') or '127.0.0.1')
+            return
+        scenario = config.get('scenario')
+        if isinstance(scenario, str) and scenario.endswith('.xml'):
+            yield config, [], '127.0.0.1'
+            return
+        for value in config.values():
+            for scenario in find_scenarios(value):
+                yield scenario
+
+
+def _find_media(media, scenario_dir):
+    """Check whether SIPp can find a media file, which it looks for
+    relative to the current directory and then to the scenario"""
+    return (os.path.exists(media) or
+            os.path.exists(os.path.join(scenario_dir, media)))
+
+
+def preflight(test_dir, config, index):
+    """Check the SIPp scenarios of a test
+
+    Keyword Arguments:
+    test_dir The test's directory, relative to the current directory
+    config   The parsed test-config.yaml
+    index    The ScenarioIndex to parse the files through
+
+    Returns:
+    A tuple of a list of plans, and a list of errors. A plan is a
+    dictionary of a scenario's 'scenario' file, 'messages', 'files' it
+    uses, number of injected 'fields', 'transport', local 'port' and 'media-port' (None unless
+    given), and 'target'.
+    """
+    plans = []
+    errors = []
+    sipp_dir = os.path.join(test_dir, 'sipp')
+    for key_args, ordered_args, target in find_scenarios(config):
+        path = os.path.join(sipp_dir, str(key_args['scenario']))
+        if not os.path.exists(path):
+            errors.append("Scenario %s not found" % path)
+            continue
+        info = index.get(path, parse_scenario)
+        errors.extend(info['errors'])
+
+        files = []
+        for arg in PATH_ARGS:
+            if arg in key_args:
+                files.append(os.path.join(sipp_dir, str(key_args[arg])))
+        for name in files:
+            if not os.path.exists(name):
+                errors.append("File %s used by scenario %s not found" %
+                              (name, path))
+
+        injected = '-inf' in key_args or '-inf' in ordered_args
+        if info['fields'] and not injected:
+            errors.append("Scenario %s uses injected fields but no -inf "
+                          "file is given" % path)
+
+        for media in info['media']:
+            if not _find_media(media, sipp_dir):
+                errors.append("Media file %s played by scenario %s not "
+                              "found" % (media, path))
+
+        mode = str(key_args.get('-t', 'u1'))
+        if mode not in TRANSPORTS:
+            errors.append("Scenario %s has unknown transport mode '%s'" %
+                          (path, mode))
+
+        plans.append({
+            'scenario': path,
+            'messages': info['messages'],
+            'files': files,
+            'fields': info['fields'],
+            'transport': TRANSPORTS.get(mode),
+            'port': key_args.get('-p'),
+            'media-port': key_args.get('-mp'),
+            'target': target,
+        })
+    return plans, errors
@@ -85,7 +85,7 @@ class TaskprocessorTestCondition(TestCondition):
 
             self.task_processors[result.host] = task_processors
 
-        return ast.cli_exec("core show taskprocessors").addCallback(__show_taskprocessors_callback)
+        return self.cli_exec(ast, "core show taskprocessors").addCallback(__show_taskprocessors_callback)
 
 
 class TaskprocessorPreTestCondition(TaskprocessorTestCondition):
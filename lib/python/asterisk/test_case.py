@@ -23,14 +23,31 @@ from .asterisk import Asterisk
 from .test_config import TestConfig
 from .test_config import PCAP_AVAILABLE
 from .test_conditions import TestConditionController
+from . import test_logging
 # This needs to be the PcapListener from the pcap_listener module
 # not the one from the .pcap module.  
-from pcap_listener import PcapListener
+from pcap_listener import (PcapListener, DEFAULT_ROTATE_SIZE,
+                           DEFAULT_MAX_FILES)
 
 LOGGER = None
 
-def setup_logging(log_dir, log_full, log_messages):
-    """Initialize the logger"""
+def setup_logging(log_dir, log_full, log_messages, log_format='text',
+                  rate_limits=None):
+    """Initialize the logger
+
+    Records are written to the log files by a separate thread, so that
+    logging doesn't stall the reactor.
+
+    Keyword Arguments:
+    log_dir The directory to write full.txt and messages.txt to
+    log_full Whether to write the full DEBUG log
+    log_messages Whether to write the INFO log, messages.txt
+    log_format 'text' to write the full log to full.txt, or 'binary' to write
+               it to a compressed full.bin, which test_logging.py turns into
+               text
+    rate_limits An optional dictionary of logger names to the number of
+                debug records per second they may log
+    """
 
     global LOGGER
 
@@ -50,7 +67,6 @@ def setup_logging(log_dir, log_full, log_messages):
         logging.basicConfig(level=logging.DEBUG)
 
     root_logger = logging.getLogger()
-    root_logger.setLevel(level=logging.DEBUG)
 
     LOGGER = logging.getLogger(__name__)
 
@@ -59,17 +75,30 @@ def setup_logging(log_dir, log_full, log_messages):
     datefmt = '%b %d %H:%M:%S'
     form = logging.Formatter(fmt=fmt, datefmt=datefmt)
 
+    handlers = list(root_logger.handlers)
+
     if log_full:
-        full_handler = logging.FileHandler(os.path.join(log_dir, 'full.txt'))
+        if log_format == 'binary':
+            full_handler = test_logging.BinaryRecordHandler(
+                os.path.join(log_dir, test_logging.BINARY_LOG))
+        else:
+            full_handler = test_logging.BatchFileHandler(
+                os.path.join(log_dir, 'full.txt'))
         full_handler.setLevel(logging.DEBUG)
         full_handler.setFormatter(form)
-        root_logger.addHandler(full_handler)
+        handlers.append(full_handler)
 
     if log_messages:
-        messages_handler = logging.FileHandler(os.path.join(log_dir, 'messages.txt'))
+        messages_handler = test_logging.BatchFileHandler(
+            os.path.join(log_dir, 'messages.txt'))
         messages_handler.setLevel(logging.INFO)
         messages_handler.setFormatter(form)
-        root_logger.addHandler(messages_handler)
+        handlers.append(messages_handler)
+
+    # Nothing below the level of the most verbose handler is written, so
+    # don't create records for it
+    root_logger.setLevel(level=test_logging.lowest_level(handlers))
+    test_logging.start(root_logger, handlers, rate_limits)
 
 
 class TestCase(object):
@@ -141,6 +170,9 @@ class TestCase(object):
         self._stop_deferred = None
         log_full = True
         log_messages = True
+        log_format = 'text'
+        log_rate_limits = None
+        pcap_config = {}
 
         if os.getenv("VALGRIND_ENABLE") == "true":
             self.reactor_timeout *= 20
@@ -161,6 +193,9 @@ class TestCase(object):
             self.ast_conf_options = test_config.get('ast-config-options')
             log_full = test_config.get('log-full', True)
             log_messages = test_config.get('log-messages', True)
+            log_format = test_config.get('log-full-format', 'text')
+            log_rate_limits = test_config.get('log-rate-limits')
+            pcap_config = test_config
             self.allow_ami_reconnects = test_config.get('allow-ami-reconnects', False)
         else:
             self.ast_conf_options = None
@@ -169,7 +204,8 @@ class TestCase(object):
         os.makedirs(self.testlogdir)
 
         # Set up logging
-        setup_logging(self.testlogdir, log_full, log_messages)
+        setup_logging(self.testlogdir, log_full, log_messages, log_format,
+                      log_rate_limits)
 
         LOGGER.info("Executing " + self.test_name)
 
@@ -179,7 +215,16 @@ class TestCase(object):
             # is meant for use by tests.
             # It's triggered by the --pcap command line.
             dumpfile = os.path.join(self.testlogdir, "packet.pcap")
-            PcapListener("lo", dumpfile=dumpfile)
+            self.pcap = PcapListener(
+                "lo", bpf_filter=pcap_config.get('pcap-filter'),
+                dumpfile=dumpfile,
+                snaplen=pcap_config.get('pcap-snaplen'),
+                max_bytes=pcap_config.get('pcap-rotate-size',
+                                          DEFAULT_ROTATE_SIZE),
+                max_seconds=pcap_config.get('pcap-rotate-interval'),
+                max_files=pcap_config.get('pcap-max-files',
+                                          DEFAULT_MAX_FILES),
+                compress=pcap_config.get('pcap-compress', True))
 
         self._setup_conditions()
 
@@ -273,8 +318,6 @@ class TestCase(object):
                           configuration can be overwritten by individual tests,
                           however.
         """
-        # delay first cli call for waitfullybooted by 1 second per asterisk instance
-        wfbootdelay = count
         for i, ast_config in enumerate(self.get_asterisk_hosts(count)):
             local_num = ast_config.get('num')
             host = ast_config.get('host')
@@ -287,14 +330,12 @@ class TestCase(object):
                 LOGGER.info("Creating Asterisk instance %d" % local_num)
                 ast_instance = Asterisk(base=self.testlogdir, host=host,
                                         ast_conf_options=self.ast_conf_options,
-                                        test_config=test_config,
-                                        bootdelay=wfbootdelay)
+                                        test_config=test_config)
             else:
                 LOGGER.info("Managing Asterisk instance at %s" % host)
                 ast_instance = Asterisk(base=self.testlogdir, host=host,
                                         remote_config=ast_config,
-                                        test_config=test_config,
-                                        bootdelay=wfbootdelay)
+                                        test_config=test_config)
             self.ast.append(ast_instance)
             self.condition_controller.register_asterisk_instance(self.ast[i])
 
@@ -420,7 +461,11 @@ class TestCase(object):
         # tests can create their own. Tests may only want to watch a specific
         # port, while a general logger will want to watch more general traffic
         # which can be filtered later.
-        return PcapListener(device, bpf_filter, dumpfile, self.pcap_callback,
+        # Tests that don't inspect packets only get the dump file.
+        callback = None
+        if type(self).pcap_callback is not TestCase.pcap_callback:
+            callback = self.pcap_callback
+        return PcapListener(device, bpf_filter, dumpfile, callback,
                             snaplen, buffer_size)
 
     def start_asterisk(self):
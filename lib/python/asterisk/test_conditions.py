@@ -21,6 +21,7 @@ import logging.config
 
 from .buildoptions import AsteriskBuildOptions
 from twisted.internet import defer
+from twisted.python.failure import Failure
 
 LOGGER = logging.getLogger(__name__)
 
@@ -45,6 +46,60 @@ def handle_condition_failure(test_condition):
             LOGGER.warning(test_condition)
 
 
+class SharedCliOutput(object):
+    """The output of CLI commands shared by test conditions.
+
+    Each CLI command is only executed once per instance of Asterisk. Every
+    condition asking for it is given the same result once it is available.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self._results = {}
+
+    def cli_exec(self, ast, cli_cmd):
+        """Execute a CLI command, or share the output of an earlier execution
+        of the same command on the same instance
+
+        Keyword arguments:
+        ast The instance of Asterisk to execute the command on
+        cli_cmd The CLI command
+
+        Returns:
+        A deferred that will be raised with the result of the command
+        """
+
+        def __done(result, entry):
+            """Hand the result to everyone waiting for it"""
+            waiters = entry['waiters']
+            entry['result'] = result
+            entry['waiters'] = None
+            for waiter in waiters:
+                self.__fire(waiter, result)
+
+        key = (id(ast), cli_cmd)
+        entry = self._results.get(key)
+        if entry is None:
+            entry = {'ast': ast, 'result': None, 'waiters': []}
+            self._results[key] = entry
+            ast.cli_exec(cli_cmd).addBoth(__done, entry)
+
+        deferred = defer.Deferred()
+        if entry['waiters'] is None:
+            self.__fire(deferred, entry['result'])
+        else:
+            entry['waiters'].append(deferred)
+        return deferred
+
+    @staticmethod
+    def __fire(deferred, result):
+        """Fire a deferred with a result or failure"""
+        if isinstance(result, Failure):
+            deferred.errback(result)
+        else:
+            deferred.callback(result)
+
+
 class TestConditionController(object):
     """Class that manages the pre and post-test condition checking.
 
@@ -155,9 +210,7 @@ class TestConditionController(object):
             return None
 
         LOGGER.debug("Evaluating pre checks")
-        finished_deferred = defer.Deferred()
-        self.__evaluate_check(self._prechecks, 0, finished_deferred)
-        return finished_deferred
+        return self.__evaluate_checks(self._prechecks)
 
     def evaluate_post_checks(self):
         """
@@ -171,53 +224,57 @@ class TestConditionController(object):
             return None
 
         LOGGER.debug("Evaluating post checks")
-        finished_deferred = defer.Deferred()
-        self.__evaluate_check(self._postchecks, 0, finished_deferred)
-        return finished_deferred
+        return self.__evaluate_checks(self._postchecks)
+
+    def __evaluate_checks(self, check_list):
+        """Register the instances of Asterisk and evaluate the conditions
 
-    def __evaluate_check(self, check_list, counter, finished_deferred):
-        """ Register the instances of Asterisk and evaluate """
+        The conditions are evaluated concurrently. A related condition is
+        always a pre-test condition, which has finished by the time the
+        post-test conditions are evaluated. Conditions evaluated together
+        share the output of identical CLI commands.
+
+        Returns:
+        A deferred that will be raised when all conditions have finished
+        """
 
-        def __evaluate_callback(result, params):
+        def __evaluate_callback(result, condition):
             """Called when a test condition finished successfully"""
-            check_list, counter, finished_deferred = params
-            self.__check_observers(result)
-            counter += 1
-            self.__evaluate_check(check_list, counter, finished_deferred)
+            self.__check_observers(condition)
             return result
 
-        def __evaluate_errback(result, params):
+        def __evaluate_errback(reason, condition):
             """Called when an error occurred in processing a test condition"""
-            check_list, counter, finished_deferred = params
             LOGGER.warning("Failed to evaluate condition check %s" %
-                           str(result))
-            self.__check_observers(result)
-            counter += 1
-            self.__evaluate_check(check_list, counter, finished_deferred)
-            return result
+                           str(reason))
+            self.__check_observers(condition)
 
-        if (counter >= len(check_list)):
-            # All done - raise the finished deferred
-            finished_deferred.callback(self)
-            return
+        shared_cli = SharedCliOutput()
+        deferreds = []
 
         # A check object is a tuple of a pre/post condition check, and either
         # a matching check object used in the evaluation, or None
-        condition, related_condition = check_list[counter]
+        for condition, related_condition in check_list:
+            # Check to see if the build supports this condition check
+            if not (condition.check_build_options()):
+                continue
 
-        # Check to see if the build supports this condition check
-        if not (condition.check_build_options()):
-            counter += 1
-            self.__evaluate_check(check_list, counter, finished_deferred)
+            for ast in self._ast:
+                condition.register_asterisk_instance(ast)
+            if not (condition.get_enabled()):
+                continue
 
-        for ast in self._ast:
-            condition.register_asterisk_instance(ast)
-        if (condition.get_enabled()):
             LOGGER.debug("Evaluating %s" % condition.get_name())
+            condition.shared_cli = shared_cli
             defrd = condition.evaluate(related_test_condition=related_condition)
-            params = check_list, counter, finished_deferred
-            defrd.addCallback(__evaluate_callback, params=params)
-            defrd.addErrback(__evaluate_errback, params=params)
+            defrd.addCallbacks(__evaluate_callback, __evaluate_errback,
+                               callbackArgs=(condition,),
+                               errbackArgs=(condition,))
+            deferreds.append(defrd)
+
+        finished_deferred = defer.DeferredList(deferreds, consumeErrors=True)
+        finished_deferred.addCallback(lambda result: self)
+        return finished_deferred
 
     def __check_observers(self, test_condition):
         """Notify observers that a test condition finished"""
@@ -267,6 +324,9 @@ class TestCondition(object):
         self.my_build_options = []
         self._enabled = test_config.enabled
         self.pass_expected = test_config.pass_expected
+        # Set by the TestConditionController while this condition and others
+        # are evaluated together
+        self.shared_cli = None
 
     def __str__(self):
         """Convert the object to a string representation"""
@@ -323,6 +383,23 @@ class TestCondition(object):
         """
         self.ast.append(ast)
 
+    def cli_exec(self, ast, cli_cmd):
+        """Execute a CLI command that doesn't change the state of Asterisk
+
+        The output is shared with other conditions evaluated at the same time
+        that execute the same command.
+
+        Keyword arguments:
+        ast The instance of Asterisk to execute the command on
+        cli_cmd The CLI command
+
+        Returns:
+        A deferred that will be raised with the result of the command
+        """
+        if self.shared_cli:
+            return self.shared_cli.cli_exec(ast, cli_cmd)
+        return ast.cli_exec(cli_cmd)
+
     def evaluate(self, related_test_condition=None):
         """Evaluate the test condition
 
@@ -9,12 +9,15 @@ This program is free software, distributed under the terms of
 the GNU General Public License Version 2.
 """
 
+import importlib.util
 import sys
 import os
+import pickle
 import subprocess
 import yaml
 import socket
 import traceback
+import logging
 
 try:
     from yaml import CSafeLoader as MyLoader
@@ -37,6 +40,11 @@ try:
 except:
     PCAP_AVAILABLE = False
 
+LOGGER = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the stored dependency results changes
+DEPENDENCY_RESULTS_VERSION = 2
+
 class TestConditionConfig(object):
     """This class creates a test condition config and will build up an
     object that derives from TestCondition based on that configuration
@@ -100,18 +108,26 @@ class Dependency(object):
     except:
         ast = None
 
-    def __init__(self, dep, global_config=None):
+    # The installed SIPp version, probed the first time it is needed
+    installed_sipp_version = None
+
+    def __init__(self, dep, global_config=None, result=None):
         """Construct a new dependency
 
         Keyword arguments:
         dep A tuple containing the dependency type name and its subinformation.
+        global_config The global TestConfig
+        result An optional (name, version, met) tuple from a previous check of
+               this dependency. If given, the dependency is not checked again.
         """
 
         self.global_config = global_config
         self.name = ""
         self.version = ""
         self.met = False
-        if "app" in dep:
+        if result is not None:
+            self.name, self.version, self.met = result
+        elif "app" in dep:
             self.name = dep["app"]
             self.met = test_suite_utils.which(self.name) is not None
         elif "python" in dep:
@@ -137,7 +153,9 @@ class Dependency(object):
                 version = dep['sipp']['version']
             if 'feature' in dep['sipp']:
                 feature = dep['sipp']['feature']
-            self.sipp_version = SIPpVersion()
+            if Dependency.installed_sipp_version is None:
+                Dependency.installed_sipp_version = SIPpVersion()
+            self.sipp_version = Dependency.installed_sipp_version
             self.version = SIPpVersion(version, feature)
             if self.sipp_version >= self.version:
                 self.met = True
@@ -278,6 +296,122 @@ class Dependency(object):
         return False
 
 
+class DependencyResults(object):
+    """Results of dependency checks, optionally persisted to disk.
+
+    Only dependencies on installed software are stored, each along with what
+    its result depends on: the resolved path and modification time of an
+    application or of SIPp, or the file of a Python module. Results for
+    Asterisk modules and build options are only used while the Asterisk
+    binary and module directory are unchanged. Probes of the environment,
+    such as the custom and pcap dependencies, are never stored.
+    """
+
+    def __init__(self, path=None):
+        """Load the stored results.
+
+        Keyword Arguments:
+        path The file the results are stored in. If None, results are only
+             kept in memory.
+        """
+        self.path = path
+        self.results = {}
+        self.dirty = False
+        self.stamp = self._environment_stamp()
+
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'rb') as results_file:
+                stored = pickle.load(results_file)
+            if (stored.get('version') == DEPENDENCY_RESULTS_VERSION and
+                    stored.get('stamp') == self.stamp):
+                self.results = stored['results']
+        except Exception as err:
+            LOGGER.warning("Ignoring unreadable dependency results %s: %s" %
+                           (path, err))
+
+    @staticmethod
+    def _mtime(path):
+        """The modification time of a file, or None"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+    @staticmethod
+    def _environment_stamp():
+        """Describe the Asterisk installation dependency results depend on"""
+        ast = Dependency.ast
+        return (DependencyResults._mtime(ast and ast.ast_binary),
+                DependencyResults._mtime(ast and ast.original_astmoddir),
+                sys.version)
+
+    @staticmethod
+    def validator(dep):
+        """Describe what the result of a dependency depends on
+
+        Returns:
+        A value that changes whenever the result of the dependency may, or
+        None if the result must not be stored
+        """
+        if "app" in dep or "sipp" in dep:
+            path = test_suite_utils.which(dep.get("app") or "sipp")
+            return (path, DependencyResults._mtime(path))
+        if "python" in dep:
+            try:
+                spec = importlib.util.find_spec(dep["python"].split('.')[0])
+            except (ImportError, ValueError):
+                return None
+            origin = spec and spec.origin
+            return (origin, DependencyResults._mtime(origin))
+        if "asterisk" in dep or "buildoption" in dep:
+            return ()
+        return None
+
+    def get(self, key, dep):
+        """Retrieve the (name, version, met) result for a dependency
+
+        Keyword Arguments:
+        key The frozen dependency
+        dep The dependency specification
+
+        Returns:
+        The stored result, or None if there is none or it is outdated
+        """
+        stored = self.results.get(key)
+        if stored is None or stored[0] != self.validator(dep):
+            return None
+        return stored[1]
+
+    def add(self, key, dep, dependency):
+        """Store the result of a checked dependency, if it may be stored"""
+        validator = self.validator(dep)
+        if validator is None:
+            return
+        self.results[key] = (validator, (dependency.name, dependency.version,
+                                         dependency.met))
+        self.dirty = True
+
+    def save(self):
+        """Write the results to disk if anything changed"""
+        if not self.path or not self.dirty:
+            return
+
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as results_file:
+                pickle.dump({'version': DEPENDENCY_RESULTS_VERSION,
+                             'stamp': self.stamp,
+                             'results': self.results},
+                            results_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self.path)
+            self.dirty = False
+        except (IOError, OSError, pickle.PicklingError) as err:
+            LOGGER.warning("Failed to save dependency results %s: %s" %
+                           (self.path, err))
+
+
 class TestConfig(object):
     """Class that contains the configuration for a specific test, as parsed
     by that tests test.yaml file.
@@ -285,12 +419,18 @@ class TestConfig(object):
 
     dependency_cache = {}
 
-    def __init__(self, test_name, global_test_config=None):
+    # Results of dependency checks shared by all TestConfig objects. Replace
+    # with a persisted DependencyResults to reuse results across runs.
+    dependency_results = DependencyResults()
+
+    def __init__(self, test_name, global_test_config=None, config_index=None):
         """Create a new TestConfig
 
         Keyword arguments:
         test_name The path to the directory containing the test-config.yaml
                   file to load
+        global_test_config The TestConfig of the top-level test-config.yaml
+        config_index Optional DiscoveryIndex to load the file through
         """
         self.can_run = True
         self.test_name = test_name
@@ -299,6 +439,7 @@ class TestConfig(object):
         self.summary = None
         self.description = None
         self.deps = []
+        self.dependency_specs = None
         self.tags = []
         self.expect_pass = True
         self.excluded_tests = []
@@ -307,6 +448,7 @@ class TestConfig(object):
         self.test_configuration = None
         self.condition_definitions = []
         self.global_test_config = global_test_config
+        self.config_index = config_index
 
         try:
             self._parse_config()
@@ -387,8 +529,11 @@ class TestConfig(object):
         else:
             test_config = self.test_name
 
-        with open(test_config, "r") as config_file:
-            self.config = yaml.load(config_file, Loader=MyLoader)
+        if self.config_index:
+            self.config = self.config_index.load_yaml(test_config)
+        else:
+            with open(test_config, "r") as config_file:
+                self.config = yaml.load(config_file, Loader=MyLoader)
 
         if not self.config:
             print("ERROR: Failed to load configuration for test '%s'" %
@@ -396,8 +541,50 @@ class TestConfig(object):
             return
 
         self._process_global_settings()
+        if self.config_index:
+            self._apply_metadata(self.config_index.metadata(
+                test_config, lambda config: self._build_metadata()))
+        else:
+            self._process_testinfo()
+            self._process_properties()
+
+    def _build_metadata(self):
+        """Process the test information and properties of the config
+
+        Returns:
+        A dictionary of the derived settings, suitable for storing in a
+        DiscoveryIndex
+        """
         self._process_testinfo()
         self._process_properties()
+        dependencies = []
+        if self.config and "properties" in self.config:
+            dependencies = [
+                (self.freeze(dep), dep)
+                for dep in self.config["properties"].get("dependencies") or []
+            ]
+        return {
+            'skip': self.skip,
+            'summary': self.summary,
+            'description': self.description,
+            'expect_pass': self.expect_pass,
+            'tags': self.tags,
+            'features': self.features,
+            'dependencies': dependencies,
+        }
+
+    def _apply_metadata(self, metadata):
+        """Apply settings previously derived by _build_metadata"""
+        self.skip = metadata['skip']
+        if self.skip:
+            self.can_run = False
+        self.summary = metadata['summary']
+        self.description = metadata['description']
+        self.expect_pass = metadata['expect_pass']
+        self.tags = list(metadata['tags'])
+        self.features = set(metadata['features'])
+        self.feature_check = dict((feature, True) for feature in self.features)
+        self.dependency_specs = metadata['dependencies']
 
     def get_conditions(self):
         """
@@ -450,9 +637,14 @@ class TestConfig(object):
             raise ValueError("%s: Missing properties section" % self.test_name)
 
         if not self.deps:
+            if self.dependency_specs is None:
+                self.dependency_specs = [
+                    (self.freeze(dep), dep)
+                    for dep in self.config["properties"].get("dependencies") or []
+                ]
             self.deps = [
-                self.dependency_factory(dep)
-                for dep in self.config["properties"].get("dependencies") or []
+                self.dependency_factory(dep, key)
+                for key, dep in self.dependency_specs
             ]
         return self.deps
 
@@ -497,22 +689,35 @@ class TestConfig(object):
         # all tags matched successfully
         return self.can_run
 
-    def dependency_factory(self, dep):
+    @staticmethod
+    def freeze(d):
+        """Convert a dependency specification into a hashable key"""
+        # freeze() implementation from https://stackoverflow.com/a/13264725/21926
+        if isinstance(d, dict):
+            return frozenset((key, TestConfig.freeze(value))
+                             for key, value in d.items())
+        elif isinstance(d, list):
+            return tuple(TestConfig.freeze(value) for value in d)
+        return d
+
+    def dependency_factory(self, dep, key=None):
         """Creates a Dependency from the given specification or returns
         the Dependency if it already exists
 
+        Keyword Arguments:
+        dep The dependency specification
+        key The frozen specification, if already known
+
         Returns:
         A Dependency
         """
-        # freeze() implementation from https://stackoverflow.com/a/13264725/21926
-        def freeze(d):
-            if isinstance(d, dict):
-                return frozenset((key, freeze(value)) for key, value in d.items())
-            elif isinstance(d, list):
-                return tuple(freeze(value) for value in d)
-            return d
-
-        key = freeze(dep)
+        if key is None:
+            key = self.freeze(dep)
         if key not in TestConfig.dependency_cache:
-            TestConfig.dependency_cache[key] = Dependency(dep, self.global_test_config)
+            results = TestConfig.dependency_results
+            result = results.get(key, dep)
+            dependency = Dependency(dep, self.global_test_config, result)
+            if result is None:
+                results.add(key, dep, dependency)
+            TestConfig.dependency_cache[key] = dependency
         return TestConfig.dependency_cache[key]
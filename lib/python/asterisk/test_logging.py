@@ -0,0 +1,339 @@
+"""Asynchronous logging for tests
+
+Log records are handed to a queue on the thread that logs them, and written
+to the log files in batches by a separate writer thread, so that logging
+doesn't stall the reactor. Debug-heavy loggers can be rate limited, and the
+full log can be written in a compressed binary format that is only turned
+into text when it is read.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import atexit
+import logging
+import pickle
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from logging.handlers import QueueHandler, QueueListener
+
+# Name of the full log when written in the binary format
+BINARY_LOG = "full.bin"
+
+# Maximum number of records written between flushes of the log files
+BATCH_SIZE = 512
+
+# Attributes of a record that are kept in the binary format
+RECORD_FIELDS = ('name', 'levelno', 'levelname', 'pathname', 'filename',
+                 'module', 'lineno', 'funcName', 'created', 'msecs',
+                 'relativeCreated', 'thread', 'threadName', 'process', 'msg',
+                 'exc_text', 'stack_info')
+
+_LISTENER = None
+
+
+class BatchFileHandler(logging.FileHandler):
+    """A file handler that leaves flushing to whoever writes the batch"""
+
+    def emit(self, record):
+        """Write a record without flushing the file"""
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class BinaryRecordHandler(logging.Handler):
+    """A handler writing records in a compressed binary format.
+
+    Each batch of records is written as a 4 byte length followed by a zlib
+    compressed pickle of a list of record dictionaries. Formatting the
+    records as text is left to read_records and format_records.
+    """
+
+    def __init__(self, filename):
+        """Constructor
+
+        Keyword Arguments:
+        filename The file to append the records to
+        """
+        logging.Handler.__init__(self)
+        self.filename = filename
+        self.stream = open(filename, 'ab')
+        self.pending = []
+
+    def emit(self, record):
+        """Add a record to the current batch"""
+        self.pending.append(dict((field, getattr(record, field, None))
+                                 for field in RECORD_FIELDS))
+
+    def flush(self):
+        """Write the current batch"""
+        self.acquire()
+        try:
+            if self.pending and self.stream:
+                data = zlib.compress(pickle.dumps(self.pending,
+                                                  pickle.HIGHEST_PROTOCOL))
+                self.stream.write(struct.pack('!I', len(data)) + data)
+                self.stream.flush()
+            self.pending = []
+        finally:
+            self.release()
+
+    def close(self):
+        """Write the current batch and close the file"""
+        self.flush()
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+        finally:
+            self.release()
+        logging.Handler.close(self)
+
+
+def read_records(filename):
+    """Read the records written by a BinaryRecordHandler
+
+    Returns:
+    A generator of logging.LogRecord objects
+    """
+    with open(filename, 'rb') as log_file:
+        while True:
+            header = log_file.read(4)
+            if len(header) < 4:
+                return
+            data = log_file.read(struct.unpack('!I', header)[0])
+            try:
+                batch = pickle.loads(zlib.decompress(data))
+            except (zlib.error, pickle.UnpicklingError, EOFError):
+                # The last batch of a test that was killed may be truncated
+                return
+            for fields in batch:
+                yield logging.makeLogRecord(fields)
+
+
+def format_records(filename, formatter=None):
+    """Turn the records written by a BinaryRecordHandler into text
+
+    Keyword Arguments:
+    filename The binary log file
+    formatter The logging.Formatter to use. Defaults to the test log format.
+
+    Returns:
+    A generator of formatted lines
+    """
+    if formatter is None:
+        formatter = logging.Formatter(
+            fmt='[%(asctime)s] %(levelname)s[%(process)d]: %(name)s:'
+            '%(lineno)d %(funcName)s: %(message)s',
+            datefmt='%b %d %H:%M:%S')
+    for record in read_records(filename):
+        yield formatter.format(record)
+
+
+class RateLimiter(object):
+    """Limit the number of debug records per second of some loggers.
+
+    Each configured logger name gets a token bucket holding one second's
+    worth of records, which is shared with the loggers below it. Records
+    arriving while the bucket is empty are dropped and counted.
+    """
+
+    def __init__(self, limits):
+        """Constructor
+
+        Keyword Arguments:
+        limits Dictionary of logger names to the number of debug records per
+               second they may log
+        """
+        self.limits = dict((name, float(rate)) for name, rate in
+                           limits.items())
+        self.buckets = {}
+        self.names = {}
+        self.lock = threading.Lock()
+
+    def _limited_name(self, name):
+        """Find the configured logger name that applies to a logger"""
+        try:
+            return self.names[name]
+        except KeyError:
+            pass
+        limited = name
+        while limited and limited not in self.limits:
+            limited = limited.rpartition('.')[0]
+        self.names[name] = limited or None
+        return self.names[name]
+
+    def check(self, name):
+        """Check whether a logger may log a debug record now
+
+        Returns:
+        A tuple of the configured logger name that applies, whether the
+        record may be logged, and the number of records dropped since the
+        last one that was logged
+        """
+        limited = self._limited_name(name)
+        if limited is None:
+            return None, True, 0
+
+        rate = self.limits[limited]
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(limited)
+            if bucket is None:
+                bucket = self.buckets[limited] = [rate, now, 0]
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return limited, False, 0
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+            return limited, True, dropped
+
+
+class AsyncLogHandler(QueueHandler):
+    """Hand records to the writer thread.
+
+    Only the message itself is formatted on the thread that logs it, since
+    its arguments may change afterwards. Timestamps, the rest of the log line
+    and the file writes are left to the writer thread.
+    """
+
+    def __init__(self, log_queue, rate_limiter=None):
+        """Constructor
+
+        Keyword Arguments:
+        log_queue The queue read by the writer thread
+        rate_limiter An optional RateLimiter for debug records
+        """
+        QueueHandler.__init__(self, log_queue)
+        self.rate_limiter = rate_limiter
+        self.exc_formatter = logging.Formatter()
+
+    def handle(self, record):
+        """Queue a record, unless it is filtered or rate limited
+
+        Queueing is thread safe by itself, so unlike other handlers this
+        doesn't take the handler's lock.
+        """
+        if self.rate_limiter and record.levelno < logging.INFO:
+            limited, allowed, dropped = self.rate_limiter.check(record.name)
+            if not allowed:
+                return False
+            if dropped:
+                self.emit(logging.makeLogRecord({
+                    'name': limited, 'levelno': logging.DEBUG,
+                    'levelname': 'DEBUG', 'created': record.created,
+                    'msecs': record.msecs, 'process': record.process,
+                    'msg': "Rate limit dropped %d debug messages" % dropped}))
+        if self.filters and not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def prepare(self, record):
+        """Resolve the parts of a record that can't wait for the writer
+
+        The record is changed in place rather than copied. Any other handler
+        of the record formats it to the same text.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.exc_formatter.formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class BatchQueueListener(QueueListener):
+    """A queue listener that flushes its handlers once per batch"""
+
+    def _monitor(self):
+        """Write the queued records in batches until stopped"""
+        log_queue = self.queue
+        has_task_done = hasattr(log_queue, 'task_done')
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    self.handle(record)
+                if has_task_done:
+                    log_queue.task_done()
+            for handler in self.handlers:
+                try:
+                    handler.flush()
+                except Exception:
+                    pass
+
+
+def lowest_level(handlers):
+    """The lowest level any of the handlers writes, but at least DEBUG"""
+    levels = [handler.level for handler in handlers]
+    return max(min(levels), logging.DEBUG) if levels else logging.WARNING
+
+
+def start(logger, handlers, rate_limits=None):
+    """Move the handlers of a logger behind a writer thread
+
+    Keyword Arguments:
+    logger The logger, normally the root logger
+    handlers The handlers to write records to. Any handlers already attached
+             to the logger must be included, and are detached from it.
+    rate_limits An optional dictionary of logger names to the number of debug
+                records per second they may log
+    """
+    global _LISTENER
+
+    stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    _LISTENER = BatchQueueListener(log_queue, *handlers,
+                                   respect_handler_level=True)
+    _LISTENER.start()
+    logger.addHandler(AsyncLogHandler(
+        log_queue, RateLimiter(rate_limits) if rate_limits else None))
+
+
+def stop():
+    """Write the remaining records and stop the writer thread"""
+    global _LISTENER
+
+    listener, _LISTENER = _LISTENER, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
+
+
+atexit.register(stop)
+
+
+if __name__ == "__main__":
+    # Print a binary log as text
+    for line in format_records(sys.argv[1]):
+        print(line)
@@ -10,12 +10,12 @@ This program is free software, distributed under the terms of
 the GNU General Public License Version 2.
 """
 
+import errno
 import os
 import logging
 import re
 import sys
 import stat
-import numpy as np
 
 from os import close
 from os import remove
@@ -53,6 +53,15 @@ def which(program):
     return None
 
 
+def pid_running(pid):
+    """Check whether a process is still running"""
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        return err.errno == errno.EPERM
+    return True
+
+
 def file_replace_string(file_name, pattern, subst):
     """Replace strings within a file with substr.
 
@@ -241,6 +250,9 @@ def set_file_permissions(dir_path, permissions_file):
     :param dir_path: Path containing the directories/files to change
     :param permissions_file: File with the subdirectories/files and new permissions.
     """
+    # Imported here, as it is slow to load and most tests don't need it
+    import numpy as np
+
     converter = lambda x: int(x, 8)
     permlist=np.genfromtxt(permissions_file,
         dtype="S255,I", names="filename,permissions",
@@ -0,0 +1,171 @@
+"""Test duration history and sharding
+
+This module records how long each test took to run, and uses that history to
+order and split a set of tests so that they finish at roughly the same time.
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import json
+import logging
+import os
+import zlib
+
+LOGGER = logging.getLogger(__name__)
+
+# Weight given to the newest duration when updating a test's average
+NEW_DURATION_WEIGHT = 0.5
+
+# Estimated duration, in seconds, of a test that has never been timed and
+# when there is no history at all to estimate from
+DEFAULT_DURATION = 30.0
+
+
+class TestTimings(object):
+    """A persistent database of test durations.
+
+    The database is a JSON file mapping test names to the average time, in
+    seconds, that the test took to run along with the number of recorded runs:
+
+    {"tests/foo": {"time": 12.5, "runs": 3}}
+    """
+
+    def __init__(self, path):
+        """Load the timing database.
+
+        Keyword Arguments:
+        path The path of the database file. A missing or unreadable file
+             results in an empty database.
+        """
+        self.path = path
+        self.timings = {}
+
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as db_file:
+                timings = json.load(db_file)
+            if isinstance(timings, dict):
+                self.timings = timings
+        except (IOError, ValueError) as err:
+            LOGGER.warning("Ignoring unreadable timing database %s: %s" %
+                           (path, err))
+
+    def record(self, test_name, duration):
+        """Record a run of a test.
+
+        Keyword Arguments:
+        test_name The name of the test
+        duration How long the test took to run in seconds
+        """
+        entry = self.timings.get(test_name)
+        if not entry:
+            self.timings[test_name] = {'time': duration, 'runs': 1}
+            return
+        entry['time'] = (NEW_DURATION_WEIGHT * duration +
+                         (1 - NEW_DURATION_WEIGHT) * entry['time'])
+        entry['runs'] += 1
+
+    def save(self):
+        """Write the database to disk.
+
+        The file is replaced atomically so a concurrent or interrupted run
+        never leaves a partially written database behind.
+        """
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as db_file:
+                json.dump(self.timings, db_file, indent=1, sort_keys=True)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as err:
+            LOGGER.warning("Failed to save timing database %s: %s" %
+                           (self.path, err))
+
+    def default_duration(self):
+        """The duration assumed for tests without any history: the median of
+        all known durations"""
+        durations = sorted(entry['time'] for entry in self.timings.values())
+        if not durations:
+            return DEFAULT_DURATION
+        return durations[len(durations) // 2]
+
+    def estimate(self, test_name, default=None):
+        """Estimate how long a test will take to run.
+
+        Keyword Arguments:
+        test_name The name of the test
+        default The value to return if the test has no history. If None,
+                default_duration() is used.
+        """
+        entry = self.timings.get(test_name)
+        if entry:
+            return entry['time']
+        if default is None:
+            default = self.default_duration()
+        return default
+
+
+def parse_shard(value):
+    """Parse a "K/N" shard specification.
+
+    Returns:
+    A (K, N) tuple, where 1 <= K <= N.
+    """
+    try:
+        index, count = [int(v) for v in value.split('/')]
+    except ValueError:
+        raise ValueError("Invalid shard '%s', expected K/N" % value)
+
+    if count < 1 or index < 1 or index > count:
+        raise ValueError("Invalid shard '%s', expected 1 <= K <= N" % value)
+    return (index, count)
+
+
+def shard(names, count, estimate):
+    """Split items into time balanced shards.
+
+    Uses longest-processing-time-first packing: items are taken from the
+    longest to the shortest and each is put on the shard with the least total
+    time so far. Ties are broken by name and shard number, so every caller
+    given the same history computes the same shards.
+
+    Keyword Arguments:
+    names The names of the items to split
+    count The number of shards
+    estimate A function returning the estimated duration of a name
+
+    Returns:
+    A list of 'count' lists of names. Each list is ordered from the longest to
+    the shortest item.
+    """
+    shards = [[] for i in range(count)]
+    totals = [0.0] * count
+
+    for name in sorted(names, key=lambda n: (-estimate(n), n)):
+        i = min(range(count), key=lambda s: (totals[s], s))
+        shards[i].append(name)
+        totals[i] += estimate(name)
+
+    return shards
+
+
+def shard_by_name(names, count):
+    """Split items into shards by a stable hash of their names.
+
+    The shard of an item only depends on its name and the number of shards,
+    so it is the same on every machine whatever their timing history.
+
+    Keyword Arguments:
+    names The names of the items to split
+    count The number of shards
+
+    Returns:
+    A list of 'count' lists of names, each sorted by name.
+    """
+    shards = [[] for i in range(count)]
+    for name in sorted(names):
+        shards[zlib.crc32(name.encode('utf-8')) % count].append(name)
+    return shards
@@ -106,7 +106,8 @@ class ThreadPreTestCondition(ThreadTestCondition):
 
         finished_deferred = defer.Deferred()
         defer_list = defer.DeferredList([
-            ast.cli_exec("core show threads").addCallback(__show_threads_callback, ast)
+            self.cli_exec(ast, "core show threads").addCallback(
+                __show_threads_callback, ast)
             for ast in self.ast])
         defer_list.addCallback(__threads_gathered, finished_deferred)
         return finished_deferred
@@ -199,7 +200,8 @@ class ThreadPostTestCondition(ThreadTestCondition):
 
         finished_deferred = defer.Deferred()
         defer_list = defer.DeferredList([
-            ast.cli_exec("core show threads").addCallback(__show_threads_callback, ast)
+            self.cli_exec(ast, "core show threads").addCallback(
+                __show_threads_callback, ast)
             for ast in self.ast])
         defer_list.addCallback(__threads_gathered, finished_deferred)
         return finished_deferred
@@ -9,10 +9,16 @@ This program is free software, distributed under the terms of
 the GNU General Public License Version 2.
 """
 
+import atexit
+import fcntl
+import json
 import logging
+import os
 
 from socket import *
 
+from .test_suite_utils import pid_running
+
 
 LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +28,22 @@ PORT_ATTEMPTS = 100
 # Don't allow any port to be retrieved and reserved below this value
 MIN_PORT = 10000
 
+# Environment variable that confines randomly chosen ports to a "lo-hi"
+# range. runtests.py sets this to give each parallel worker disjoint ports.
+PORT_RANGE_ENV = 'TESTSUITE_PORT_RANGE'
+
+# Directory holding the machine-wide port leases, overridden by the
+# TESTSUITE_PORT_LEASES environment variable. An empty value disables leases.
+PORT_LEASES_ENV = 'TESTSUITE_PORT_LEASES'
+PORT_LEASES_DIR = '/tmp/asterisk-testsuite-ports'
+
+# Number of ports leased by a process at a time
+PORT_BLOCK_SIZE = 100
+
+# Highest port leased when no port range is set. Ports above this are left
+# to the operating system's ephemeral port range.
+LEASE_PORT_MAX = 32767
+
 
 def socket_type(socktype):
     """Retrieve a string representation of the socket type."""
@@ -123,6 +145,164 @@ def get_unused_os_port(host='', port=0, socktype=SOCK_STREAM, family=AF_INET):
     return res
 
 
+def get_port_range(value=None):
+    """Parse a "lo-hi" port range.
+
+    Keyword Arguments:
+    value - The range string. If None, the PORT_RANGE_ENV environment
+            variable is used.
+
+    Return:
+    A (lo, hi) tuple, inclusive on both ends, or None if no range is set.
+    """
+
+    if value is None:
+        value = os.getenv(PORT_RANGE_ENV)
+    if not value:
+        return None
+
+    try:
+        lo, hi = [int(v) for v in value.split('-')]
+    except ValueError:
+        raise ValueError("Invalid port range '{0}'".format(value))
+
+    if lo > hi:
+        raise ValueError("Invalid port range '{0}'".format(value))
+    return (lo, hi)
+
+
+class PortBroker(object):
+    """Machine-wide leases of blocks of ports.
+
+    Each process using the broker leases whole blocks of PORT_BLOCK_SIZE
+    ports, so ports picked from its blocks are never picked by another
+    process. Blocks are aligned on multiples of the block size, and the
+    leases are kept in a JSON file mapping the first port of each leased
+    block to the pid of its owner. The file is protected by a lock file.
+    Blocks owned by processes that are no longer running are reclaimed.
+    """
+
+    def __init__(self, path, port_range=None, block_size=PORT_BLOCK_SIZE):
+        """Create a port broker.
+
+        Keyword Arguments:
+        path - The directory holding the leases
+        port_range - Optional (lo, hi) tuple the leased blocks must lie in
+        block_size - The number of ports in a block
+        """
+        self.path = path
+        self.registry = os.path.join(path, 'leases.json')
+        self.lock_file = os.path.join(path, 'leases.lock')
+        self.block_size = block_size
+
+        lo, hi = port_range or (MIN_PORT, LEASE_PORT_MAX)
+        first = (max(lo, MIN_PORT) + block_size - 1) // block_size
+        last = (hi + 1) // block_size
+        self.blocks = [b * block_size for b in range(first, last)]
+
+        self.pid = None
+        self.leases = []
+
+    def _update(self, func):
+        """Run func on the leases while holding the lock, saving them
+        afterwards. Returns what func returns."""
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.registry, 'r') as registry:
+                        leases = json.load(registry)
+                except (IOError, ValueError):
+                    leases = {}
+                res = func(leases)
+                with open(self.registry, 'w') as registry:
+                    json.dump(leases, registry)
+                return res
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def lease(self):
+        """Lease a block of ports for this process.
+
+        Return:
+        A (lo, hi) tuple of the leased ports, inclusive on both ends, or None
+        if no block is available.
+        """
+
+        if self.pid != os.getpid():
+            # Leases aren't inherited by forked processes
+            if self.pid is None:
+                atexit.register(self.release)
+            self.pid = os.getpid()
+            self.leases = []
+
+        if not self.blocks:
+            return None
+
+        def _lease(leases):
+            # Start looking at a different block in each process
+            start = self.pid % len(self.blocks)
+            for i in range(len(self.blocks)):
+                block = self.blocks[(start + i) % len(self.blocks)]
+                owner = leases.get(str(block))
+                if owner is None or not pid_running(owner):
+                    leases[str(block)] = self.pid
+                    return block
+            return None
+
+        try:
+            block = self._update(_lease)
+        except (IOError, OSError) as e:
+            LOGGER.warning("Unable to lease ports from {0}: {1}".format(
+                self.path, e))
+            return None
+
+        if block is None:
+            LOGGER.warning("No free block of ports to lease")
+            return None
+
+        self.leases.append(block)
+        LOGGER.debug("Leased ports {0}-{1}".format(
+            block, block + self.block_size - 1))
+        return (block, block + self.block_size - 1)
+
+    def release(self):
+        """Release all blocks leased by this process."""
+
+        if not self.leases or self.pid != os.getpid():
+            return
+
+        def _release(leases):
+            for block in self.leases:
+                if leases.get(str(block)) == self.pid:
+                    del leases[str(block)]
+
+        try:
+            self._update(_release)
+        except (IOError, OSError) as e:
+            LOGGER.warning("Unable to release ports leased from {0}: "
+                           "{1}".format(self.path, e))
+        self.leases = []
+
+
+def get_port_broker(port_range=None):
+    """Create the port broker configured by the environment.
+
+    Keyword Arguments:
+    port_range - Optional (lo, hi) tuple the leased blocks must lie in
+
+    Return:
+    A PortBroker, or None if port leases are disabled
+    """
+
+    path = os.getenv(PORT_LEASES_ENV, PORT_LEASES_DIR)
+    if not path:
+        return None
+    return PortBroker(path, port_range)
+
+
 class PortError(ValueError):
     """Error raised when the number of attempts to find an available
     port is exceeded"""
@@ -148,11 +328,72 @@ class Ports(object):
 
     The ports stored here represent ports that are considered unavailable and
     should not be bound to.
+
+    If a port range is given, ports that would otherwise be chosen by the
+    operating system are instead picked from that range in turn.
+
+    If a port broker is given, those ports are instead picked from blocks
+    leased from the broker, so other processes never pick the same ports.
     """
 
-    def __init__(self):
-        """Create a reserved ports container."""
+    def __init__(self, port_range=None, broker=None):
+        """Create a reserved ports container.
+
+        Keyword Arguments:
+        port_range - Optional (lo, hi) tuple to pick random ports from
+        broker - Optional PortBroker to lease the random ports from
+        """
         self.reserved_ports = {}
+        self._reserved = set()
+        self.port_range = port_range
+        self._next_port = port_range[0] if port_range else 0
+        self.broker = broker
+        self._block = None
+        self._next_leased = 0
+
+    def _next_candidate(self, num=1):
+        """Retrieve the next port to try from the leased blocks or the port
+        range, or zero to let the operating system choose one.
+
+        Keyword Arguments:
+        num - The number of ports the candidate is the first of. If negative
+              the ports count down from the candidate.
+        """
+
+        if self.broker:
+            port = self._next_leased_candidate(num)
+            if port:
+                return port
+
+        if not self.port_range:
+            return 0
+
+        lo, hi = self.port_range
+        port = self._next_port
+        self._next_port = port + 1 if port < hi else lo
+        return port
+
+    def _next_leased_candidate(self, num):
+        """Retrieve the next port to try from the leased blocks, leasing a
+        new block once the current one is used up. Returns zero if no
+        block could be leased."""
+
+        span = abs(num) or 1
+        if span > self.broker.block_size:
+            return 0
+
+        if (self._block is None or
+                self._next_leased + span - 1 > self._block[1] or
+                self.broker.pid != os.getpid()):
+            self._block = self.broker.lease()
+            if self._block is None:
+                self.broker = None
+                return 0
+            self._next_leased = self._block[0]
+
+        port = self._next_leased
+        self._next_leased += span
+        return port + span - 1 if num < 0 else port
 
     def reserve(self, ports, socktype=SOCK_STREAM, family=AF_INET):
         """Mark the given ports as reserved. Meaning that even if the operating
@@ -167,8 +408,8 @@ class Ports(object):
 
         if isinstance(ports, int):
             ports = [ports]
-        if not isinstance(ports, list):
-            ports = list(ports)
+        # Always copy so the caller's list isn't extended by later calls
+        ports = list(ports)
 
         if socktype not in self.reserved_ports:
             self.reserved_ports[socktype] = {}
@@ -177,6 +418,7 @@ class Ports(object):
             self.reserved_ports[socktype][family] = ports
         else:
             self.reserved_ports[socktype][family].extend(ports)
+        self._reserved.update((socktype, family, port) for port in ports)
 
     def is_reserved(self, port, socktype=SOCK_STREAM, family=AF_INET):
         """Check to see if a given port is reserved.
@@ -190,20 +432,15 @@ class Ports(object):
         True if the port is reserved, False otherwise
         """
 
-        try:
-            if (port < MIN_PORT or
-                    port in self.reserved_ports[socktype][family]):
-
-                LOGGER.debug("{0}/{1} port '{2}' is reserved".format(
-                    socket_type(socktype), socket_family(family), port))
-                return True
-        except:
-            pass
+        if port < MIN_PORT or (socktype, family, port) in self._reserved:
+            LOGGER.debug("{0}/{1} port '{2}' is reserved".format(
+                socket_type(socktype), socket_family(family), port))
+            return True
 
         return False
 
     def get_avail(self, host='', ports=0, socktype=SOCK_STREAM, family=AF_INET,
-                  attempts=PORT_ATTEMPTS):
+                  attempts=PORT_ATTEMPTS, num=1):
         """Retrieve available ports. Ports are considered available if they
         have not been reserved and are currently not in use by something else.
 
@@ -222,6 +459,8 @@ class Ports(object):
         socktype - socket types (SOCK_STREAM, SOCK_DGRAM, etc.)
         family - protocol family (AF_INET, AF_INET6, etc.)
         attempts - The number of attempts to try and find a free port
+        num - The number of consecutive ports that will be requested starting
+              at a randomly chosen port, counting down if negative
 
         Return:
         Available ports as a list, otherwise a PortError exception is thrown
@@ -239,7 +478,8 @@ class Ports(object):
         res = []
         for port in ports:
             for attempt in range(attempts):
-                p = get_unused_os_port(host, port, socktype, family)
+                p = get_unused_os_port(host, port or self._next_candidate(num),
+                                       socktype, family)
                 if p != 0 and not self.is_reserved(p, socktype, family):
                     res.append(p)
                     break
@@ -278,7 +518,7 @@ class Ports(object):
                     socktype, family, attempts)
 
             # Need a random port first
-            avail = self.get_avail(host, 0, socktype, family)
+            avail = self.get_avail(host, 0, socktype, family, num=num)
 
             if abs(num) <= 1:
                 return avail
@@ -320,7 +560,7 @@ class Ports(object):
         return res
 
 
-PORTS = Ports()
+PORTS = Ports(get_port_range(), get_port_broker(get_port_range()))
 
 
 def get_available_port(host='', port=0, socktype=SOCK_DGRAM,
@@ -3,31 +3,200 @@ import logging
 import scapy
 from scapy.all import *
 from scapy.config import conf
-import socket
+import atexit
+import gzip
 import os
+import queue
+import select
+import shutil
+import struct
+import threading
+import time
 
 LOGGER = logging.getLogger(__name__)
 
+# Size of the write buffer of a capture file, unless one is given
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Rotation used for the capture taken with runtests.py --pcap
+DEFAULT_ROTATE_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_FILES = 8
+
+# Seconds the capture thread waits for a packet before flushing the file
+POLL_INTERVAL = 0.5
+
+# pcap file header with nanosecond timestamps
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAP_LINKTYPE_ETHERNET = 1
+
+
+class PcapRingWriter(object):
+    """A buffered pcap file writer that rotates the file it writes
+
+    Once the file reaches max_bytes, or has been written for max_seconds, it
+    is renamed to <name>.<n>.<ext> and a new file is started. Only the last
+    max_files rotated files are kept, and each can be gzip compressed by a
+    worker thread so that the capture thread never waits for the compressor.
+    """
+
+    def __init__(self, filename, snaplen=65535, buffer_size=None,
+                 max_bytes=None, max_seconds=None, max_files=None,
+                 compress=False):
+        """Initialize a new PcapRingWriter
+
+        filename - The file to write. Rotated files are numbered after it.
+        snaplen - Number of bytes of each packet to write
+        buffer_size - The size of the write buffer
+        max_bytes - Rotate the file once it holds this many bytes
+        max_seconds - Rotate the file once it has been written this long
+        max_files - The number of rotated files to keep. None keeps them all.
+        compress - Whether to gzip the rotated files
+        """
+        self.filename = filename
+        self.snaplen = snaplen
+        self.buffer_size = buffer_size or DEFAULT_BUFFER_SIZE
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_files = max_files
+        self.compress = compress
+        self.linktype = None
+        self.stream = None
+        self.written = 0
+        self.opened = None
+        self.segment = 0
+        self.segments = []
+        self.rotated = None
+        self.worker = None
+        if compress:
+            self.rotated = queue.Queue()
+            self.worker = threading.Thread(target=self._process_rotated,
+                                           name="pcap-compress", daemon=True)
+            self.worker.start()
+
+    def _open(self, linktype, timestamp):
+        """Start a new file"""
+        self.linktype = linktype
+        self.stream = open(self.filename, 'wb', buffering=self.buffer_size)
+        self.stream.write(struct.pack('=IHHiIII', PCAP_MAGIC_NSEC, 2, 4, 0,
+                                      0, self.snaplen, linktype))
+        self.written = 24
+        self.opened = timestamp
+
+    def write(self, data, timestamp, linktype=PCAP_LINKTYPE_ETHERNET):
+        """Write a captured packet
+
+        data - The bytes of the packet
+        timestamp - The capture time in seconds since the epoch
+        linktype - The pcap link type of the packet
+        """
+        if self.stream is not None and (
+                (self.max_bytes and self.written >= self.max_bytes) or
+                (self.max_seconds and
+                 timestamp - self.opened >= self.max_seconds)):
+            self.rotate()
+        if self.stream is None:
+            self._open(linktype, timestamp)
+
+        captured = data[:self.snaplen]
+        seconds = int(timestamp)
+        self.stream.write(struct.pack('=IIII', seconds,
+                                      int((timestamp - seconds) * 1e9),
+                                      len(captured), len(data)))
+        self.stream.write(captured)
+        self.written += 16 + len(captured)
+
+    def flush(self):
+        """Write out the buffered packets"""
+        if self.stream is not None:
+            self.stream.flush()
+
+    def rotate(self):
+        """Move the current file aside, to be replaced by a new one on the
+        next write"""
+        if self.stream is None:
+            return
+        self.stream.close()
+        self.stream = None
+        self.segment += 1
+        base, ext = os.path.splitext(self.filename)
+        segment = "%s.%d%s" % (base, self.segment, ext)
+        os.rename(self.filename, segment)
+        LOGGER.debug("Rotated capture file to %s", segment)
+        if self.rotated is not None:
+            self.rotated.put(segment)
+        else:
+            self._add_segment(segment)
+
+    def _add_segment(self, segment):
+        """Keep a rotated file, removing the oldest ones beyond max_files"""
+        self.segments.append(segment)
+        while self.max_files is not None and \
+                len(self.segments) > self.max_files:
+            try:
+                os.unlink(self.segments.pop(0))
+            except OSError as e:
+                LOGGER.warning("Unable to remove capture file: %s", e)
+
+    def _process_rotated(self):
+        """Compress the rotated files handed over by the capture thread"""
+        while True:
+            segment = self.rotated.get()
+            if segment is None:
+                return
+            try:
+                with open(segment, 'rb') as src, \
+                        gzip.open(segment + '.gz', 'wb', 1) as dst:
+                    shutil.copyfileobj(src, dst, self.buffer_size)
+                os.unlink(segment)
+                segment += '.gz'
+            except (IOError, OSError) as e:
+                LOGGER.warning("Unable to compress %s: %s", segment, e)
+            self._add_segment(segment)
+
+    def close(self):
+        """Write out the current file and wait for any compression"""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if self.worker is not None:
+            self.rotated.put(None)
+            self.worker.join()
+            self.worker = None
+
+
 class PcapListener():
-    """A A wrapper for a scapy pcap capture"""
+    """A packet capture on a raw socket.
+
+    Packets are read on a capture thread straight from the socket, without
+    being dissected by scapy. They are written to a PcapRingWriter and, if
+    a callback is given, passed to it as bytes. Without a callback the
+    capture only writes the dump file.
+    """
     def __init__(self, interface, bpf_filter=None, dumpfile=None,
-                 callback=None, snaplen=None, buffer_size=None):
+                 callback=None, snaplen=None, buffer_size=None,
+                 max_bytes=None, max_seconds=None, max_files=None,
+                 compress=False):
         """Initialize a new PcapListener
 
         interface - The name of an interface. If None, the first loopback interface
-        bpf_filter - A Berkeley packet filter, i.e. "udp port 5060"
+        bpf_filter - A Berkeley packet filter, i.e. "udp port 5060". It is
+                     attached to the socket, so the kernel drops the packets
+                     that don't match.
         dumpfile - The filename where to save the capture file
-        callback - A function that will receive a PcapPacket for each packet captured
+        callback - A function that will receive the bytes of each packet captured
         snaplen - Number of bytes to capture from each packet. If None, then
                   65535.
-        buffer_size - The ring buffer size. If None, then 0.
+        buffer_size - The size of the capture file's write buffer. If None,
+                      then 1MB.
+        max_bytes - Rotate the capture file once it holds this many bytes
+        max_seconds - Rotate the capture file after this many seconds
+        max_files - The number of rotated capture files to keep
+        compress - Whether to gzip the rotated capture files
 
         """
 
         if interface is None:
             interface = self.find_first_loopback_device()
-        if buffer_size is None:
-            buffer_size = 8192
         if snaplen is None:
             snaplen = 65535
         self.pcap_writer = None
@@ -35,25 +204,54 @@ class PcapListener():
         scapy.config.conf.use_pcap = True
         self.callback = callback
 
-        LOGGER.info("Starting capture.  if: %s dumpfile: %s snap: %d  bs: %d",
-                    interface, dumpfile, snaplen, buffer_size)
+        LOGGER.info("Starting capture.  if: %s filter: %s dumpfile: %s "
+                    "snap: %d", interface, bpf_filter, dumpfile, snaplen)
 
         if dumpfile is not None:
-            self.pcap_writer = PcapWriter(dumpfile, sync=True,
-                nano=True, snaplen=snaplen, bufsz=buffer_size)
-
-        self.pf = AsyncSniffer(iface=interface,filter=bpf_filter,
-            prn=self._callback)
+            self.pcap_writer = PcapRingWriter(
+                dumpfile, snaplen, buffer_size, max_bytes, max_seconds,
+                max_files, compress)
 
-        self.pf.start()
+        self.socket = conf.L2listen(iface=interface, filter=bpf_filter)
+        self.stopping = False
+        self.thread = threading.Thread(target=self._capture,
+                                       name="pcap-capture", daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
 
-    def _callback(self, packet: scapy.packet.Packet):
-        if self.callback:
-            self.callback(packet.original)
+    def _capture(self):
+        """Read packets until stopped"""
+        linktypes = conf.l2types.layer2num
+        while not self.stopping:
+            try:
+                ready = select.select([self.socket], [], [], POLL_INTERVAL)
+                if not ready[0]:
+                    if self.pcap_writer:
+                        self.pcap_writer.flush()
+                    continue
+                cls, data, timestamp = self.socket.recv_raw(65535)
+            except (OSError, ValueError):
+                # The socket was closed
+                break
+            if data is None:
+                continue
+            if self.pcap_writer:
+                self.pcap_writer.write(
+                    data, timestamp or time.time(),
+                    linktypes.get(cls, PCAP_LINKTYPE_ETHERNET))
+            if self.callback:
+                self.callback(data)
 
+    def stop(self):
+        """Stop capturing and close the capture file"""
+        if self.stopping:
+            return
+        self.stopping = True
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+        self.socket.close()
         if self.pcap_writer:
-            self.pcap_writer.write(packet)
-        return None
+            self.pcap_writer.close()
 
     def find_first_loopback_device(self):
         iflist = scapy.interfaces.get_working_ifaces()
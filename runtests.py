@@ -11,6 +11,7 @@ the GNU General Public License Version 2.
 import sys
 import os
 import errno
+import glob
 import subprocess
 import optparse
 import time
@@ -22,6 +23,8 @@ import select
 import signal
 import syslog
 import re
+import threading
+import queue
 
 try:
     from yaml import CSafeLoader as MyLoader
@@ -59,7 +62,14 @@ if os.getenv("PYTHONPATH"):
 new_PYTHONPATH.insert(1,"lib/python")
 
 from asterisk.asterisk import Asterisk
-from asterisk.test_config import TestConfig
+from asterisk.test_config import TestConfig, DependencyResults
+from asterisk.discovery_index import DiscoveryIndex
+from asterisk.instance_pool import InstancePool, POOL_DIR
+from asterisk.test_timing import TestTimings, parse_shard, shard, \
+    shard_by_name
+from asterisk.utils_socket import MIN_PORT, PORT_RANGE_ENV
+from asterisk.output_spool import OutputSpool, READ_SIZE
+from asterisk.sipp_preflight import ScenarioIndex, preflight
 from mailer import send_email
 from asterisk import test_suite_utils
 
@@ -75,37 +85,82 @@ abandon_test_suite = False
 # Set to True if any refs logs are processed
 ref_debug_is_enabled = False
 
+# Ports handed out to parallel workers. The upper bound stays below the
+# default Linux ephemeral port range so OS chosen ports don't collide.
+WORKER_PORT_MIN = MIN_PORT
+WORKER_PORT_MAX = 32767
+
 class TestRun:
-    def __init__(self, test_name, options, global_config=None, timeout=-1):
+    def __init__(self, test_name, options, global_config=None, timeout=-1,
+                 config_index=None):
         self.can_run = False
         self.did_run = False
         self.time = 0.0
         self.test_name = test_name
         self.options = options
-        self.test_config = TestConfig(test_name, global_config)
+        self.test_config = TestConfig(test_name, global_config, config_index)
         self.failure_message = ""
         self.__check_can_run()
-        self.stdout = ""
+        self.output = None
+        self.sipp_scenarios = []
+        self.preflight_errors = []
         self.timeout = timeout
         self.cleanup = options.cleanup
         self.keep_full_logs = options.keep_full_logs
         self.skipped_reason = ""
+        self.worker = None
+        self.worker_env = {}
+        self.test_suite_root = Asterisk.test_suite_root
 
         assert self.test_name.startswith('tests/')
         self.test_relpath = self.test_name[6:]
 
+    def assign_worker(self, worker, port_range):
+        """Run this test as parallel worker 'worker'
+
+        The test gets its own test suite root directory, and randomly chosen
+        ports are confined to port_range, a (lo, hi) tuple.
+        """
+        self.worker = worker
+        self.worker_env = {
+            'TESTSUITE_WORKER': str(worker),
+            PORT_RANGE_ENV: "%d-%d" % port_range,
+        }
+        self.test_suite_root = os.path.join(Asterisk.test_suite_root,
+                                            "worker%d" % worker)
+
     def stdout_print(self, msg):
-        self.stdout += msg + u"\n"
-        print(msg)
+        if self.output is not None:
+            self.output.write(msg + u"\n")
+        self._print_lines([msg])
+
+    def _print_lines(self, lines):
+        if self.worker is not None:
+            lines = ["[%d] %s" % (self.worker, line) for line in lines]
+        sys.stdout.write("".join(line + "\n" for line in lines))
 
     def run(self):
         self.passed = False
         self.did_run = True
         start_time = time.time()
+        if self.preflight_errors:
+            # Fail without starting Asterisk
+            for error in self.preflight_errors:
+                self.stdout_print(error)
+            self.__parse_run_output("\n".join(self.preflight_errors))
+            print('Test %s failed preflight checks\n' % self.test_name)
+            self.time = time.time() - start_time
+            return
+        # Build the environment for the test rather than modifying our own,
+        # as several tests may be running at once.
+        env = dict(os.environ)
         if self.options.testsuite_config:
-            os.environ['TESTSUITE_CONFIG'] = self.options.testsuite_config
-        os.environ['TESTSUITE_ACTIVE_TEST'] = self.test_name
-        os.environ['PYTHONPATH'] = os.pathsep.join(new_PYTHONPATH)
+            env['TESTSUITE_CONFIG'] = self.options.testsuite_config
+        env['TESTSUITE_ACTIVE_TEST'] = self.test_name
+        env['PYTHONPATH'] = os.pathsep.join(new_PYTHONPATH)
+        if self.options.reuse_instances:
+            env['TESTSUITE_REUSE_INSTANCES'] = "yes"
+        env.update(self.worker_env)
         cmd = [
             "%s/run-test" % self.test_name,
         ]
@@ -116,15 +171,20 @@ class TestRun:
                    "%s" % self.test_name]
         if os.path.exists(cmd[0]) and os.access(cmd[0], os.X_OK):
             if self.options.pcap:
-                os.environ['PCAP'] = "yes"
+                env['PCAP'] = "yes"
 
+            # The output is spooled to a file rather than kept in memory,
+            # as verbose tests can print hundreds of megabytes.
+            self.output = OutputSpool()
             self.stdout_print("Running %s ..." % self.test_name)
             p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT)
+                                 stderr=subprocess.STDOUT, env=env)
             self.pid = p.pid
 
+            fd = p.stdout.fileno()
+            os.set_blocking(fd, False)
             poll = select.poll()
-            poll.register(p.stdout, select.POLLIN)
+            poll.register(fd, select.POLLIN)
 
             timedout = False
             has_unicode_error = False
@@ -134,13 +194,17 @@ class TestRun:
                         if not poll.poll(self.timeout):
                             timedout = True
                             p.terminate()
-                    except select.error as v:
-                        if v[0] != errno.EINTR:
-                            raise
-                    l = p.stdout.readline().decode('ascii', 'ignore').strip()
-                    if not l:
+                            continue
+                    except InterruptedError:
+                        continue
+                    try:
+                        data = os.read(fd, READ_SIZE)
+                    except BlockingIOError:
+                        continue
+                    if not data:
                         break
-                    self.stdout_print(l)
+                    self._print_lines(self.output.feed(data))
+                self._print_lines(self.output.finish())
             except UnicodeEncodeError:
                 self.stdout_print('Unicode error reading output from test!')
                 has_unicode_error = True
@@ -185,7 +249,15 @@ class TestRun:
                     print("Unable to clean up directory for"
                           "test %s (non-fatal)" % self.test_name)
 
-            self.__parse_run_output(self.stdout)
+            # Instances left running by a test that didn't pass may be in a
+            # state later tests must not see
+            reusable = did_pass and self.passed
+            if self.options.reuse_instances and not reusable:
+                pool_dir = os.path.join(self.test_suite_root, POOL_DIR)
+                InstancePool(pool_dir).discard(self.test_name)
+
+            if not self.passed:
+                self.__parse_run_output(self.output.tail())
             if timedout:
                 status = 'timed out'
             elif abandon_test:
@@ -199,6 +271,14 @@ class TestRun:
             if self.options.syslog:
                 syslog.syslog(pass_str)
 
+            self.output.close()
+            if not self.passed or self.keep_full_logs:
+                self._archive_output()
+            if self.passed:
+                # Only the output of failed tests is reported
+                self.output.remove()
+                self.output = None
+
         else:
             print("FAILED TO EXECUTE %s, it must exist and be executable" % cmd)
         self.time = time.time() - start_time
@@ -236,25 +316,46 @@ class TestRun:
             pass
         return False
 
+    def _instance_pids(self, run_dir):
+        """Get the PIDs left behind by the Asterisk instances of a run"""
+        pids = set()
+        pattern = os.path.join(run_dir, 'ast*', '**', 'asterisk.pid')
+        for pid_file in glob.glob(pattern, recursive=True):
+            try:
+                with open(pid_file) as pid_in:
+                    pids.add(pid_in.read().strip())
+            except IOError:
+                pass
+        return pids
+
     def _check_for_core(self):
         core_files = []
 
-        contents = os.listdir('.')
-        for item in contents:
-            if self._is_asterisk_coredump(item):
-                core_files.append(item)
-
-        contents = os.listdir('/tmp')
-        for item in contents:
-            corepath = os.path.join('/tmp', item);
-            if self._is_asterisk_coredump(corepath):
-                core_files.append(corepath)
-
-        contents = os.listdir(self.test_name)
-        for item in contents:
-            corepath = os.path.join(self.test_name, item);
-            if self._is_asterisk_coredump(corepath):
-                core_files.append(corepath)
+        # Parallel workers share the current directory and /tmp, so a core
+        # found there only belongs to this test if it is named after the PID
+        # of one of its instances, as with kernel.core_uses_pid.
+        shared_dirs = ['.', '/tmp']
+        own_dirs = [self.test_name]
+        pids = None
+        if self.worker is not None:
+            (run_num, run_dir, archive_dir) = self._find_run_dirs()
+            if run_num != 0:
+                own_dirs.append(run_dir)
+            pids = self._instance_pids(run_dir)
+
+        for core_dir in shared_dirs + own_dirs:
+            try:
+                contents = os.listdir(core_dir)
+            except OSError:
+                continue
+            for item in contents:
+                if pids is not None and core_dir in shared_dirs and \
+                        not pids.intersection(re.split(r'\D+', item)):
+                    continue
+                corepath = item if core_dir == '.' else \
+                    os.path.join(core_dir, item)
+                if self._is_asterisk_coredump(corepath):
+                    core_files.append(corepath)
 
         return core_files
 
@@ -339,7 +440,7 @@ class TestRun:
                           "Beware of the stale core file in CWD!" % (e,))
 
     def _find_run_dirs(self):
-        test_run_dir = os.path.join(Asterisk.test_suite_root,
+        test_run_dir = os.path.join(self.test_suite_root,
                                     self.test_relpath)
 
         i = 1
@@ -456,7 +557,20 @@ class TestRun:
         (run_num, run_dir, archive_dir) = self._find_run_dirs()
         self._archive_ast_logs(run_num, run_dir, archive_dir)
         self._archive_pcap_dump(run_dir, archive_dir)
-        self._archive_files(run_dir, archive_dir, 'messages.txt', 'full.txt')
+        self._archive_files(run_dir, archive_dir, 'messages.txt', 'full.txt',
+                            'full.bin')
+
+    def _archive_output(self):
+        """Archive the complete output of the test"""
+        (run_num, run_dir, archive_dir) = self._find_run_dirs()
+        if run_num == 0:
+            return
+        try:
+            hardlink_or_copy(self.output.filename,
+                             os.path.join(archive_dir, 'output.txt'))
+        except Exception as e:
+            print("Exception occurred while archiving the output of %s: %s" %
+                  (self.test_name, e))
 
     def _archive_ast_logs(self, run_num, run_dir, archive_dir):
         """Archive the Asterisk logs"""
@@ -473,6 +587,13 @@ class TestRun:
     def _archive_pcap_dump(self, run_dir, archive_dir):
         self._archive_files(run_dir, archive_dir, 'dumpfile.pcap')
         self._archive_files(run_dir, archive_dir, 'packet.pcap')
+        # Files rotated out by the capture, i.e. packet.1.pcap.gz
+        if not os.path.isdir(run_dir):
+            return
+        for name in ('dumpfile', 'packet'):
+            rotated = [filename for filename in os.listdir(run_dir)
+                       if re.match(r'%s\.\d+\.pcap(\.gz)?$' % name, filename)]
+            self._archive_files(run_dir, archive_dir, *rotated)
 
     def __check_can_run(self):
         """Check tags and dependencies in the test config."""
@@ -490,8 +611,17 @@ class TestSuite:
 
         self.tests = []
         self.start_time = None
+        self.index = DiscoveryIndex(self.options.discovery_index)
+        TestConfig.dependency_results = DependencyResults(
+            self.options.dependency_cache or None)
         self.global_config = self._parse_global_config()
         self.tests = self._parse_test_yaml("tests")
+        self.index.save()
+        TestConfig.dependency_results.save()
+        self.timings = TestTimings(self.options.timing_db)
+        self._default_time = self.timings.default_duration()
+        if self.options.shard:
+            self.tests = self._select_shard(self.tests)
         if self.options.randomorder:
             random.shuffle(self.tests)
         else:
@@ -501,15 +631,50 @@ class TestSuite:
         self.total_failures = 0
         self.total_skipped = 0
 
+    def _estimate_time(self, test):
+        """Estimate how long a test will take, based on previous runs"""
+        if not test.can_run:
+            return 0.0
+        return self.timings.estimate(test.test_name, self._default_time)
+
+    def _select_shard(self, tests):
+        """Select the tests belonging to this shard
+
+        The split must be the same on every machine running a shard, so it
+        never depends on the local timing database. Given a shared timing
+        database, tests are split so the historical run time of each shard is
+        balanced. Otherwise they are split by a hash of their names.
+        """
+        index, count = self.options.shard
+        by_name = dict((t.test_name, t) for t in tests)
+        if self.options.shard_timing_db:
+            timings = TestTimings(self.options.shard_timing_db)
+            default_time = timings.default_duration()
+            shards = shard(by_name.keys(), count,
+                           lambda name: timings.estimate(name, default_time))
+        else:
+            shards = shard_by_name(by_name.keys(), count)
+        return [by_name[name] for name in shards[index - 1]]
+
     def _parse_global_config(self):
         if self.options.testsuite_config is not None:
-            return TestConfig(self.options.testsuite_config)
-        return TestConfig(os.getcwd())
+            return TestConfig(self.options.testsuite_config,
+                              config_index=self.index)
+        return TestConfig(os.getcwd(), config_index=self.index)
+
+    def _is_dir_selected(self, path):
+        """Check if a directory could contain any tests selected with -t"""
+        if not self.options.tests:
+            return True
+        path += '/'
+        return any(path.startswith(test) or test.startswith(path)
+                   for test in self.options.tests)
 
     def _parse_test_yaml(self, test_dir):
         tests = []
 
-        config = load_yaml_config("%s/%s" % (test_dir, TESTS_CONFIG))
+        config = load_yaml_config("%s/%s" % (test_dir, TESTS_CONFIG),
+                                  self.index)
         if not config:
             return tests
 
@@ -535,8 +700,13 @@ class TestSuite:
                         continue
 
                     tests.append(TestRun(path, self.options,
-                                         self.global_config, self.options.timeout))
+                                         self.global_config, self.options.timeout,
+                                         self.index))
                 elif val == "dir":
+                    # No need to look at directories the selected tests
+                    # aren't in.
+                    if not self._is_dir_selected(path):
+                        continue
                     tests += self._parse_test_yaml(path)
 
         return tests
@@ -608,9 +778,19 @@ class TestSuite:
             print("%04d %s %s%s" % (i, flag, t.test_config.test_name, deps))
             i += 1
 
+    def _preflight(self):
+        """Check the SIPp scenarios of the tests that will run"""
+        index = ScenarioIndex(self.options.sipp_index or None)
+        for t in self.tests:
+            if t.can_run and t.test_config.config:
+                t.sipp_scenarios, t.preflight_errors = preflight(
+                    t.test_name, t.test_config.config, index)
+        index.save()
+
     def run(self):
         self.start_time = time.strftime("%Y-%m-%dT%H:%M:%S %Z", time.localtime())
         test_suite_dir = os.getcwd()
+        self._preflight()
         i = 0
         global abandon_test_suite
         for t in self.tests:
@@ -624,85 +804,181 @@ class TestSuite:
         print("Tests to run: %d * %d time(s) = %d  Maximum test inactivity time: %d sec." %
             (i, self.options.number, i * self.options.number, (self.options.timeout / 1000)))
 
+        # Instances pooled by an earlier run that didn't finish can't be
+        # trusted to match their records any more
+        if not self.options.dry_run:
+            self._drain_instance_pools()
+
+        if self.options.jobs > 1 and not self.options.dry_run:
+            self._run_parallel()
+            self._drain_instance_pools()
+            return
+
+        if self.options.reuse_instances and not self.options.dry_run:
+            # Pooled instances outlive the tests that started them, so they
+            # must not be killed between tests.
+            self._stop_stray_processes()
+
         for t in self.tests:
             if abandon_test_suite:
                 break
 
-            if t.can_run is False:
-                if t.test_config.skip is not None:
-                    print("--> %s ... skipped '%s'" % (t.test_name, t.test_config.skip))
-                    t.skipped_reason = t.test_config.skip
-                    self.total_skipped += 1
-                    continue
-                print("--> Cannot run test '%s'" % t.test_name)
-                for f in t.test_config.features:
-                    print("--- --> Version Feature: %s - %s" % (
-                        f, str(t.test_config.feature_check[f])))
-                print("--- --> Tags: %s" % (t.test_config.tags))
-                for d in t.test_config.deps:
-                    print("--- --> Dependency: %s - %s" % (d.name, str(d.met)))
-                print("")
-                self.total_skipped += 1
-                t.skipped_reason = "Failed dependency"
+            if not self._check_runnable(t):
                 continue
-            if self.global_config is not None:
-                exclude = False
-                for excluded in self.global_config.excluded_tests:
-                    if excluded in t.test_name:
-                        print("--- ---> Excluded test: %s" % excluded)
-                        exclude = True
-                if exclude:
-                    self.total_skipped += 1
-                    continue
 
-            running_str = "--> Running test '%s' ..." % t.test_name
-            print(running_str)
-            if self.options.syslog:
-                syslog.syslog(running_str)
+            self._print_running(t)
 
             if self.options.dry_run:
                 t.passed = True
             else:
                 # Establish Preconditions
-                # If there are asterisk-instances defined in the
-                # global config, we assume that an existing Asterisk
-                # instance, which may be local or remote, is to be
-                # used for the tests. In this case, we don't want to
-                # stop Asterisk or SIPp, nor do we want to remove
-                # the asterisk.ctl and asterisk.pid files.
-                is_remote = False
-                if (self.global_config and self.global_config.config
-                    and 'asterisk-instances' in self.global_config.config):
-                    for instance in self.global_config.config['asterisk-instances']:
-                        if instance.get('host'):
-                            is_remote = True
-
-                if is_remote is False:
-                    print("Making sure Asterisk isn't running ...")
-                    if os.system("if pidof asterisk >/dev/null; then "
-                                 "killall -9 asterisk >/dev/null 2>&1; "
-                                 "sleep 1; ! pidof asterisk >/dev/null; fi"):
-                        print("Could not kill asterisk.")
-                    print("Making sure SIPp isn't running...")
-                    if os.system("if pidof sipp >/dev/null; then "
-                                 "killall -9 sipp >/dev/null 2>&1; "
-                                 "sleep 1; ! pidof sipp >/dev/null; fi"):
-                        print("Could not kill sipp.")
-                    # XXX TODO Hard coded path, gross.
-                    os.system("rm -f /var/run/asterisk/asterisk.ctl")
-                    os.system("rm -f /var/run/asterisk/asterisk.pid")
+                if not self.options.reuse_instances:
+                    self._stop_stray_processes()
 
                 os.chdir(test_suite_dir)
 
                 # Run Test
 
                 t.run()
-            self.total_count += 1
-            self.total_time += t.time
-            if t.passed is False:
-                self.total_failures += 1
-                if self.options.stop_on_error:
-                    abandon_test_suite = True
+            self._record_result(t)
+
+        self._drain_instance_pools()
+
+    def _drain_instance_pools(self):
+        """Stop the Asterisk instances left running for reuse"""
+        if not self.options.reuse_instances:
+            return
+        roots = [Asterisk.test_suite_root]
+        roots += [os.path.join(Asterisk.test_suite_root, "worker%d" % (i + 1))
+                  for i in range(self.options.jobs)]
+        for root in roots:
+            InstancePool(os.path.join(root, POOL_DIR)).drain()
+
+    def _run_parallel(self):
+        """Run the tests using several concurrent workers
+
+        Each worker runs one test at a time, and is given its own test suite
+        root directory and its own block of ports so that the Asterisk
+        instances of concurrently running tests don't collide.
+        """
+        global abandon_test_suite
+
+        runnable = [t for t in self.tests if self._check_runnable(t)]
+        if not self.options.randomorder:
+            # Start the longest tests first so they don't end up being the
+            # long tail of the run.
+            runnable.sort(key=lambda t: -self._estimate_time(t))
+        pending = queue.Queue()
+        for t in runnable:
+            pending.put(t)
+
+        # Stray processes must be cleaned up once, before any worker starts,
+        # as killing them between tests would kill other workers' instances.
+        self._stop_stray_processes()
+
+        jobs = self.options.jobs
+        block = (WORKER_PORT_MAX - WORKER_PORT_MIN + 1) // jobs
+        lock = threading.Lock()
+
+        def worker(worker_id):
+            lo = WORKER_PORT_MIN + (worker_id - 1) * block
+            port_range = (lo, lo + block - 1)
+            while not abandon_test_suite:
+                try:
+                    t = pending.get_nowait()
+                except queue.Empty:
+                    return
+                t.assign_worker(worker_id, port_range)
+                self._print_running(t)
+                t.run()
+                with lock:
+                    self._record_result(t)
+
+        print("Running tests using %d workers" % jobs)
+        threads = [threading.Thread(target=worker, args=(i + 1,))
+                   for i in range(jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _check_runnable(self, t):
+        """Check if a test should be run, accounting for it if it is skipped"""
+        if t.can_run is False:
+            if t.test_config.skip is not None:
+                print("--> %s ... skipped '%s'" % (t.test_name, t.test_config.skip))
+                t.skipped_reason = t.test_config.skip
+                self.total_skipped += 1
+                return False
+            print("--> Cannot run test '%s'" % t.test_name)
+            for f in t.test_config.features:
+                print("--- --> Version Feature: %s - %s" % (
+                    f, str(t.test_config.feature_check[f])))
+            print("--- --> Tags: %s" % (t.test_config.tags))
+            for d in t.test_config.deps:
+                print("--- --> Dependency: %s - %s" % (d.name, str(d.met)))
+            print("")
+            self.total_skipped += 1
+            t.skipped_reason = "Failed dependency"
+            return False
+        if self.global_config is not None:
+            exclude = False
+            for excluded in self.global_config.excluded_tests:
+                if excluded in t.test_name:
+                    print("--- ---> Excluded test: %s" % excluded)
+                    exclude = True
+            if exclude:
+                self.total_skipped += 1
+                return False
+        return True
+
+    def _print_running(self, t):
+        running_str = "--> Running test '%s' ..." % t.test_name
+        print(running_str)
+        if self.options.syslog:
+            syslog.syslog(running_str)
+
+    def _stop_stray_processes(self):
+        # If there are asterisk-instances defined in the
+        # global config, we assume that an existing Asterisk
+        # instance, which may be local or remote, is to be
+        # used for the tests. In this case, we don't want to
+        # stop Asterisk or SIPp, nor do we want to remove
+        # the asterisk.ctl and asterisk.pid files.
+        is_remote = False
+        if (self.global_config and self.global_config.config
+            and 'asterisk-instances' in self.global_config.config):
+            for instance in self.global_config.config['asterisk-instances']:
+                if instance.get('host'):
+                    is_remote = True
+
+        if is_remote is False:
+            print("Making sure Asterisk isn't running ...")
+            if os.system("if pidof asterisk >/dev/null; then "
+                         "killall -9 asterisk >/dev/null 2>&1; "
+                         "sleep 1; ! pidof asterisk >/dev/null; fi"):
+                print("Could not kill asterisk.")
+            print("Making sure SIPp isn't running...")
+            if os.system("if pidof sipp >/dev/null; then "
+                         "killall -9 sipp >/dev/null 2>&1; "
+                         "sleep 1; ! pidof sipp >/dev/null; fi"):
+                print("Could not kill sipp.")
+            # XXX TODO Hard coded path, gross.
+            os.system("rm -f /var/run/asterisk/asterisk.ctl")
+            os.system("rm -f /var/run/asterisk/asterisk.pid")
+
+    def _record_result(self, t):
+        global abandon_test_suite
+
+        self.total_count += 1
+        self.total_time += t.time
+        if t.did_run and not self.options.dry_run:
+            self.timings.record(t.test_name, t.time)
+            self.timings.save()
+        if t.passed is False:
+            self.total_failures += 1
+            if self.options.stop_on_error:
+                abandon_test_suite = True
 
     def __strip_illegal_xml_chars(self, data):
         """
@@ -786,6 +1062,14 @@ class TestSuite:
                 self.__strip_illegal_xml_chars(t.failure_message)))
             tc.appendChild(failure)
 
+            if t.output is not None:
+                system_out = doc.createElement("system-out")
+                system_out.appendChild(doc.createTextNode(
+                    self.__strip_illegal_xml_chars(t.output.read())))
+                tc.appendChild(system_out)
+                t.output.remove()
+                t.output = None
+
     def generate_refleaks_summary(self):
         dest_file = open("./logs/refleaks-summary.txt", "w")
         try:
@@ -797,15 +1081,23 @@ class TestSuite:
 
 
 
-def load_yaml_config(path):
-    """Load contents of a YAML config file to a dictionary"""
+def load_yaml_config(path, index=None):
+    """Load contents of a YAML config file to a dictionary
+
+    If a DiscoveryIndex is given, the file is only parsed if it changed since
+    it was last added to the index.
+    """
     try:
+        if index:
+            return index.load_yaml(path)
         f = open(path, "r")
-    except IOError:
+    except (IOError, OSError):
         # Ignore errors for the optional tests/custom folder.
         if path != "tests/custom/tests.yaml":
             print("Failed to open %s" % path)
         return None
+    except yaml.YAMLError:
+        raise
     except:
         print("Unexpected error: %s" % sys.exc_info()[0])
         return None
@@ -862,6 +1154,12 @@ def main(argv=None):
     parser.add_option("-G", "--skip-tag", action="append",
                       dest="skip_tags",
                       help="Specify one or more tags to ignore a subset of tests.")
+    parser.add_option("-j", "--jobs", metavar="int", type=int,
+                      dest="jobs", default=1,
+                      help="Number of tests to run concurrently. Each worker "
+                           "gets its own test directory and port range. Tests "
+                           "using fixed ports in their configuration may "
+                           "still conflict with each other.")
     parser.add_option("-k", "--keep-core", action="store_true",
                       dest="keep_core", default=False,
                       help="Archive the 'core' file if Asterisk crashes.")
@@ -877,6 +1175,13 @@ def main(argv=None):
     parser.add_option("-L", "--list-tags", action="store_true",
                       dest="list_tags", default=False,
                       help="List available tags")
+    parser.add_option("--reuse-instances", action="store_true",
+                      dest="reuse_instances", default=False,
+                      help="Keep Asterisk instances running after a test and "
+                           "reuse them in later tests with an identical "
+                           "configuration. Tests can set 'fresh-asterisk' in "
+                           "their test-object-config to always get a new "
+                           "instance.")
     parser.add_option("-s", "--syslog", action="store_true",
                       dest="syslog", default=False,
                       help="Log test start/stop to syslog")
@@ -906,6 +1211,44 @@ def main(argv=None):
                       dest="number", default=1,
                       help="Number of times to run the test suite. If a value of "
                            "-1 is provided, the test suite will loop forever.")
+    parser.add_option("--shard", metavar="K/N",
+                      dest="shard", default=None,
+                      help="Split the selected tests into N shards and only "
+                           "run shard K. Every shard must be given the same "
+                           "tests. Tests are split by a hash of their names, "
+                           "or by run time with --shard-timing-db.")
+    parser.add_option("--shard-timing-db", metavar="file",
+                      dest="shard_timing_db", default=None,
+                      help="Timing database shared by every shard, used to "
+                           "split tests into shards of roughly equal run "
+                           "times. It is only read, so every shard computes "
+                           "the same split.")
+    parser.add_option("--timing-db", metavar="file",
+                      dest="timing_db", default="test-timings.json",
+                      help="File where test run times are recorded and "
+                           "read from when ordering tests. "
+                           "Default: %default")
+    parser.add_option("--discovery-index", metavar="file",
+                      dest="discovery_index",
+                      default="test-discovery-index.pickle",
+                      help="File caching the parsed test configuration, so "
+                           "only changed files are parsed again. An empty "
+                           "value disables the cache. Default: %default")
+    parser.add_option("--dependency-cache", metavar="file",
+                      dest="dependency_cache",
+                      default=None,
+                      help="File caching the results of dependency checks "
+                           "on installed applications, Python modules, SIPp "
+                           "and Asterisk modules across runs. Results are "
+                           "checked again once what they depend on changes. "
+                           "Environment checks, such as ipv6 or rawsocket, "
+                           "are never cached. Default: not cached")
+    parser.add_option("--sipp-index", metavar="file",
+                      dest="sipp_index",
+                      default="sipp-scenario-index.pickle",
+                      help="File caching the parsed SIPp scenarios checked "
+                           "before the tests are run. An empty value "
+                           "disables the cache. Default: %default")
     parser.add_option("--random-order", action="store_true",
                       dest="randomorder", default=False,
                       help="Shuffle the tests so they are run in random order")
@@ -927,6 +1270,13 @@ def main(argv=None):
                       help="Specify an alternate top-level testsuite test-config.yaml file.")
     (options, args) = parser.parse_args(argv)
 
+    if options.shard:
+        try:
+            options.shard = parse_shard(options.shard)
+        except ValueError as err:
+            print(err)
+            return 1
+
     # Install a signal handler for USR1/TERM, and use it to bail out of running
     # any remaining tests
     signal.signal(signal.SIGUSR1, handle_usr1)
@@ -949,6 +1299,10 @@ def main(argv=None):
     if options.timeout > 0:
         options.timeout *= 1000
 
+    if options.jobs < 1:
+        print("--jobs must be at least 1")
+        return 1
+
     # Ensure that there's a trailing '/' in the tests specified with -t
     for i, test in enumerate(options.tests):
         if "/" not in test and "." in test:
@@ -15,13 +15,12 @@ the GNU General Public License Version 2.
 
 import sys
 import logging
-import io
 import os
 from twisted.internet import reactor, threads
 
 sys.path.append("lib/python")
 from asterisk.test_case import TestCase
-from asterisk.media_websocket import MediaWebSocketClientFactory
+from asterisk.media_websocket import MediaWebSocketClientFactory, MediaDigest
 from asterisk.ari import AriClientFactory
 
 LOGGER = logging.getLogger(__name__)
@@ -109,8 +108,8 @@ class ChanWebSocketTest(object):
     def __init__(self, conn_id, on_close, timeout=15):
         self.conn_id = conn_id
         self.timeout = timeout
-        self.sent_buffer = None
-        self.recvd_buffer = None
+        self.sent_digest = None
+        self.recvd_digest = None
         self.optimal_frame_size = 0
         self.protocol = None
         self.on_close = on_close
@@ -134,13 +133,11 @@ class ChanWebSocketTest(object):
     def on_ws_open(self, protocol):
         LOGGER.info("Media WebSocket connection opened")
         self.protocol = protocol
-        self.sent_buffer = io.BytesIO()
-        self.recvd_buffer = io.BytesIO()
+        self.sent_digest = MediaDigest()
+        self.recvd_digest = MediaDigest(self.sent_digest)
 
     def on_ws_closed(self, protocol):
         LOGGER.info("Media WebSocket connection closed")
-        self.sent_buffer.close()
-        self.recvd_buffer.close()
 
     def on_message(self, message, binary):
         if not binary:
@@ -155,27 +152,20 @@ class ChanWebSocketTest(object):
                     elif v[0] == "optimal_frame_size":
                         self.optimal_frame_size = int(v[1])
                 self.protocol.sendMessage(b"ANSWER", isBinary=False)
-
-                """
-                Don't tie up the reactor main thread with file I/O.
-                """
-                reactor.callInThread(self.protocol.sendFile,
-                                     f"{TEST_DIR}/test.ulaw",
-                                     sent_buffer=self.sent_buffer)
+                self.protocol.sendFile(f"{TEST_DIR}/test.ulaw",
+                                       sent_digest=self.sent_digest)
             if "MEDIA_BUFFERING_COMPLETED" in msg:
                 self.protocol.sendClose(1000)
                 LOGGER.info(f"Checking buffers")
                 if self.check_data() == 0:
                     self.on_close(True)
         else:
-            self.recvd_buffer.write(message)
+            self.recvd_digest.update(message)
 
     def check_data(self):
         rc = 0
-        sent_bytes = self.sent_buffer.getvalue()
-        sent_length = len(sent_bytes)
-        received_bytes = self.recvd_buffer.getvalue()
-        received_length = len(received_bytes)
+        sent_length = self.sent_digest.length
+        received_length = self.recvd_digest.length
         expected_length = sent_length
 
         LOGGER.info(f"Bytes sent: {sent_length} Bytes expected: {expected_length} Bytes received: {received_length}")
@@ -189,10 +179,9 @@ class ChanWebSocketTest(object):
 
         """
         Since the received data may have been padded with silence,
-        we only want to compare the first "sent_length" bytes in
-        the received buffer.
+        the received digest only covers the first "sent_length" bytes.
         """
-        if received_bytes[0:sent_length] != sent_bytes:
+        if not self.recvd_digest.matches():
             LOGGER.error("Received buffer != sent buffer")
             return 1
         else:
@@ -12,13 +12,12 @@ the GNU General Public License Version 2.
 
 import sys
 import logging
-import io
 import os
 from twisted.internet import reactor, threads
 
 sys.path.append("lib/python")
 from asterisk.test_case import TestCase
-from asterisk.media_websocket import MediaWebSocketServerFactory
+from asterisk.media_websocket import MediaWebSocketServerFactory, MediaDigest
 
 LOGGER = logging.getLogger(__name__)
 
@@ -37,8 +36,8 @@ class ChanWebSocketTest(TestCase):
         LOGGER.info(f"Reactor timeout {self.reactor_timeout}")
         LOGGER.info(f"Listen port {self.listen_port}")
 
-        self.sent_buffer = None
-        self.recvd_buffer = None
+        self.sent_digest = None
+        self.recvd_digest = None
         self.optimal_frame_size = 0
         self.protocol = None
 
@@ -71,16 +70,14 @@ class ChanWebSocketTest(TestCase):
     def on_ws_open(self, protocol):
         LOGGER.info("WebSocket connection from %s opened" % (self.peer))
         self.protocol = protocol
-        self.sent_buffer = io.BytesIO()
-        self.recvd_buffer = io.BytesIO()
+        self.sent_digest = MediaDigest()
+        self.recvd_digest = MediaDigest(self.sent_digest)
 
     def on_reactor_timeout(self):
         self.protocol.sendClose(1000)
 
     def on_ws_closed(self, protocol):
         LOGGER.info("WebSocket connection from %s closed.  Stopping reactor" % (self.peer))
-        self.sent_buffer.close()
-        self.recvd_buffer.close()
         self.stop_reactor()
 
     def on_message(self, message, binary):
@@ -96,27 +93,20 @@ class ChanWebSocketTest(TestCase):
                     elif v[0] == "optimal_frame_size":
                         self.optimal_frame_size = int(v[1])
                 self.protocol.sendMessage(b"ANSWER", isBinary=False)
-
-                """
-                Don't tie up the reactor main thread with file I/O.
-                """
-                reactor.callInThread(self.protocol.sendFile,
-                                     f"{TEST_DIR}/test.ulaw",
-                                     sent_buffer=self.sent_buffer)
+                self.protocol.sendFile(f"{TEST_DIR}/test.ulaw",
+                                       sent_digest=self.sent_digest)
             if "MEDIA_BUFFERING_COMPLETED" in msg:
                 self.protocol.sendClose(1000)
                 LOGGER.info(f"Checking buffers")
                 if self.check_data() == 0:
                     self.passed = True
         else:
-            self.recvd_buffer.write(message)
+            self.recvd_digest.update(message)
 
     def check_data(self):
         rc = 0
-        sent_bytes = self.sent_buffer.getvalue()
-        sent_length = len(sent_bytes)
-        received_bytes = self.recvd_buffer.getvalue()
-        received_length = len(received_bytes)
+        sent_length = self.sent_digest.length
+        received_length = self.recvd_digest.length
         expected_length = sent_length
 
         LOGGER.info(f"Bytes sent: {sent_length} Bytes expected: {expected_length} Bytes received: {received_length}")
@@ -130,10 +120,9 @@ class ChanWebSocketTest(TestCase):
 
         """
         Since the received data may have been padded with silence,
-        we only want to compare the first "sent_length" bytes in
-        the received buffer.
+        the received digest only covers the first "sent_length" bytes.
         """
-        if received_bytes[0:sent_length] != sent_bytes:
+        if not self.recvd_digest.matches():
             LOGGER.error("Received buffer != sent buffer")
             return 1
         else:
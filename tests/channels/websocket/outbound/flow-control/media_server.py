@@ -94,12 +94,7 @@ class ChanWebSocketTest(TestCase):
                     elif v[0] == "optimal_frame_size":
                         self.optimal_frame_size = int(v[1])
                 self.protocol.sendMessage(b"ANSWER", isBinary=False)
-
-                """
-                Don't tie up the reactor main thread with file I/O.
-                """
-                reactor.callInThread(self.protocol.sendFile,
-                                     f"{TEST_DIR}/zombies.ulaw")
+                self.protocol.sendFile(f"{TEST_DIR}/zombies.ulaw")
             if "MEDIA_XOFF" in msg:
                 self.received_xoff = True
             if "MEDIA_XON" in msg:
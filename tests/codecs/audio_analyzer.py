@@ -13,7 +13,7 @@ import logging
 from twisted.internet import reactor
 
 from asterisk import ari
-import tonetest
+from asterisk import audio_analysis
 
 sys.path.append("lib/python")
 
@@ -84,30 +84,14 @@ def on_stasis_end(ari, event, test_object):
     """
 
     def __validate_output(output_file, tones):
-        output = tonetest.tonetest(output_file)
-        if len(tones) != len(output):
-            LOGGER.error("Number of generated tones {0} does not "
-                         "match output {1}".format(tones, output))
+        try:
+            with audio_analysis.AudioFile(output_file) as audio:
+                output = audio_analysis.detect_tones(audio)
+        except (IOError, audio_analysis.AudioError) as e:
+            LOGGER.error("Unable to analyze {0}: {1}".format(output_file, e))
             return False
-
-        for i in range(0, len(tones)):
-            LOGGER.info("Checking tone {0} against output {1}".
-                        format(tones[i], output[i]))
-            # Make sure the duration of the tone is within a second
-            duration = tones[i]['duration'] / 1000
-            if (duration < output[i]['duration'] - 1 or
-                    duration > output[i]['duration'] + 1):
-                LOGGER.error("Tone #{0} {1} duration out of range for {2}".
-                             format(i, tones[i], output[i]))
-                return False
-            # Make sure the frequency of the tone is within +-7
-            frequency = tones[i]['frequency']
-            if (frequency < output[i]['frequency'] - 7 or
-                    frequency > output[i]['frequency'] + 7):
-                LOGGER.error("Tone #{0} {1} frequency out of range for {2}".
-                             format(i, tones[i], output[i]))
-                return False
-        return True
+        # Make sure each tone is within a second and +-7 Hz
+        return audio_analysis.compare_tones(tones, output)
 
     test_object.set_passed(__validate_output(
         test_object.sounds_path + test_object.output_file,
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""HEPv3 decoder benchmark
+
+Compares the packets per second decoded by asterisk.hep against the
+construct based parser hep_capture_node used before it, on SIP and RTCP
+packets like the ones res_hep sends.
+
+Usage: python tests/hep/hep_benchmark.py [-n PACKETS]
+
+Copyright (C) 2026, Sangoma Technologies Corporation
+
+This program is free software, distributed under the terms of
+the GNU General Public License Version 2.
+"""
+
+import argparse
+import socket
+import sys
+import time
+
+sys.path.append('lib/python')
+
+from construct import *
+from construct.core import *
+
+from asterisk import hep
+
+SIP_PAYLOAD = ('INVITE sip:echo@127.0.0.1:5060 SIP/2.0\r\n'
+               'Via: SIP/2.0/UDP 127.0.0.1:5067;branch=z9hG4bK-1-0\r\n'
+               'From: test1 <sip:alice@127.0.0.1:5067>;tag=1\r\n'
+               'To: test <sip:test@127.0.0.1:5060>\r\n'
+               'Call-ID: 1-12345@127.0.0.1\r\n'
+               'CSeq: 1 INVITE\r\n'
+               'Contact: <sip:test@127.0.0.1:5067;transport=UDP>\r\n'
+               'Max-Forwards: 70\r\n'
+               'Content-Length: 0\r\n\r\n')
+
+RTCP_PAYLOAD = ('{"ssrc": 1234, "type": 200, "report_count": 1, '
+                '"sender_information": {"ntp_timestamp_sec": "1", '
+                '"ntp_timestamp_usec": "2", "rtp_timestamp": 3, '
+                '"packets": 4, "octets": 5}, "report_blocks": [{'
+                '"source_ssrc": 5678, "fraction_lost": 0, '
+                '"packets_lost": 0, "highest_seq_no": 1, "ia_jitter": 0, '
+                '"lsr": "0", "dlsr": 0}]}')
+
+
+class LegacyHEPDecoder(object):
+    """The construct based parser hep_capture_node used to have"""
+
+    def __init__(self):
+        """Constructor"""
+        self.hep_chunk = 'hep_chunk' / Struct(
+            'vendor_id' / Int16ub,
+            'type_id' / Int16ub,
+            'length' / Int16ub)
+        hep_ctrl = 'hep_ctrl' / Struct(
+            'id' / Array(4, Int8ub),
+            'length' / Int16ub)
+        hep_ip_family = 'hep_ip_family' / Struct(
+            self.hep_chunk,
+            'ip_family' / Int8ub)
+        hep_ip_id = 'hep_ip_id' / Struct(
+            self.hep_chunk,
+            'ip_id' / Int8ub)
+        hep_port = 'hep_port' / Struct(
+            self.hep_chunk,
+            'port' / Int16ub)
+        hep_timestamp_sec = 'hep_timestamp_sec' / Struct(
+            self.hep_chunk,
+            'timestamp_sec' / Int32ub)
+        hep_timestamp_usec = 'hep_timestamp_usec' / Struct(
+            self.hep_chunk,
+            'timestamp_usec' / Int32ub)
+        hep_protocol_type = 'hep_protocol_type' / Struct(
+            self.hep_chunk,
+            'protocol_type' / Int8ub)
+        hep_capture_agent_id = 'hep_capture_agent_id' / Struct(
+            self.hep_chunk,
+            'capture_agent_id' / Int32ub)
+        self.hep_generic_msg = 'hep_generic' / Struct(
+            hep_ctrl,
+            hep_ip_family,
+            hep_ip_id,
+            'src_port' / Struct(hep_port),
+            'dst_port' / Struct(hep_port),
+            hep_timestamp_sec,
+            hep_timestamp_usec,
+            hep_protocol_type,
+            hep_capture_agent_id)
+
+    def decode(self, data):
+        """Decode a packet into a dictionary of its fields"""
+        parsed_hdr = self.hep_generic_msg.parse(data)
+        length = self.hep_generic_msg.sizeof()
+        packet = {
+            'ip_family': parsed_hdr.hep_ip_family.ip_family,
+            'src_port': parsed_hdr.src_port.hep_port.port,
+            'dst_port': parsed_hdr.dst_port.hep_port.port,
+            'protocol_type': parsed_hdr.hep_protocol_type.protocol_type,
+        }
+
+        hep_ipv4_addr = 'hep_ipv4_addr' / Struct(
+            self.hep_chunk,
+            'ipv4_addr' / PaddedString(4, "ascii"))
+        src_addr = hep_ipv4_addr.parse(data[length:])
+        length += hep_ipv4_addr.sizeof()
+        dst_addr = hep_ipv4_addr.parse(data[length:])
+        length += hep_ipv4_addr.sizeof()
+        packet['src_addr'] = socket.inet_ntop(
+            socket.AF_INET, bytes(src_addr.ipv4_addr, "utf-8"))
+        packet['dst_addr'] = socket.inet_ntop(
+            socket.AF_INET, bytes(dst_addr.ipv4_addr, "utf-8"))
+
+        while length < len(data):
+            hdr = self.hep_chunk.parse(data[length:])
+            length += self.hep_chunk.sizeof()
+            chunk = 'chunk' / PaddedString(
+                hdr.length - self.hep_chunk.sizeof(), "ascii")
+            value = chunk.parse(data[length:])
+            length += chunk.sizeof()
+            if hdr.type_id == hep.HEP_VARIABLE_TYPES.payload:
+                packet['payload'] = value
+            elif hdr.type_id == hep.HEP_VARIABLE_TYPES.uuid:
+                packet['uuid'] = value
+        return packet
+
+
+def make_packets():
+    """Build a SIP and an RTCP packet in the order res_hep sends chunks"""
+    packets = []
+    for protocol_type, payload in ((hep.HEP_PROTOCOL_TYPE.SIP, SIP_PAYLOAD),
+                                   (hep.HEP_PROTOCOL_TYPE.RTCP,
+                                    RTCP_PAYLOAD)):
+        packets.append(hep.encode(hep.HEPPacket(
+            ip_family=hep.IP_FAMILY.v4, ip_id=17, src_port=5067,
+            dst_port=5060, time_sec=1700000000, time_usec=1234,
+            protocol_type=protocol_type, capture_agent_id=12345,
+            src_addr='127.0.0.1', dst_addr='127.0.0.1', payload=payload,
+            uuid='1-12345@127.0.0.1')))
+    return packets
+
+
+def run(name, decode, packets, count):
+    """Decode count packets and print the rate"""
+    start = time.perf_counter()
+    for i in range(count):
+        decode(packets[i % len(packets)])
+    elapsed = time.perf_counter() - start
+    print("%-10s %10.0f packets/s" % (name, count / elapsed))
+    return count / elapsed
+
+
+def main(argv=None):
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description="HEPv3 decoder benchmark")
+    parser.add_argument("-n", "--packets", type=int, default=20000,
+                        help="Number of packets to decode")
+    args = parser.parse_args(argv)
+
+    packets = make_packets()
+    legacy = LegacyHEPDecoder()
+
+    # Both decoders must agree before their speed means anything
+    for data in packets:
+        expected = legacy.decode(data)
+        actual = hep.decode(data)
+        for key, value in expected.items():
+            assert getattr(actual, key) == value, key
+
+    legacy_rate = run("construct", legacy.decode, packets, args.packets)
+    rate = run("hep", lambda data: hep.decode(data).payload, packets,
+               args.packets)
+    print("speedup    %10.1fx" % (rate / legacy_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,6 @@ This program is free software, distributed under the terms of
 the GNU General Public License Version 2.
 """
 
-import socket
 import logging
 import re
 import json
@@ -20,76 +19,14 @@ import json
 from twisted.internet.protocol import DatagramProtocol
 from twisted.internet import reactor
 
-from construct import *
-from construct.core import *
-
 LOGGER = logging.getLogger(__name__)
 
 from asterisk.test_suite_utils import all_match
+from asterisk import hep
+from asterisk.hep import (enum, IP_FAMILY, HEP_VARIABLE_TYPES,
+                          HEP_PROTOCOL_TYPE, HEP_PROTOCOL_TYPES_TO_STRING,
+                          HEPPacket)
 
-def enum(**enums):
-    """Make an enumeration out of the passed in values"""
-    return type('Enum', (), enums)
-
-IP_FAMILY = enum(v4=2, v6=10)
-
-HEP_VARIABLE_TYPES = enum(auth_key=14,
-                          payload=15,
-                          uuid=17)
-
-HEP_PROTOCOL_TYPE = enum(SIP=1,
-                         H323=2,
-                         SDP=3,
-                         RTP=4,
-                         RTCP=5,
-                         MGCP=6,
-                         MEGACO=7,
-                         M2UA=8,
-                         M3UA=9,
-                         IAX=10)
-
-HEP_PROTOCOL_TYPES_TO_STRING = {
-    HEP_PROTOCOL_TYPE.SIP: 'SIP',
-    HEP_PROTOCOL_TYPE.H323: 'H323',
-    HEP_PROTOCOL_TYPE.SDP: 'SDP',
-    HEP_PROTOCOL_TYPE.RTP: 'RTP',
-    HEP_PROTOCOL_TYPE.RTCP: 'RTCP',
-    HEP_PROTOCOL_TYPE.MGCP: 'MGCP',
-    HEP_PROTOCOL_TYPE.MEGACO: 'MEGACO',
-    HEP_PROTOCOL_TYPE.M2UA: 'M2UA',
-    HEP_PROTOCOL_TYPE.M3UA: 'M3UA',
-    HEP_PROTOCOL_TYPE.IAX: 'IAX',
-}
-
-class HEPPacket(object):
-    """A HEP packet"""
-
-    def __init__(self, hep_hdr, src_addr, dst_addr):
-        """Constructor
-
-        Keyword Arguments:
-        hep_hdr The header read from the protocol
-        src_addr The source addresses
-        dst_addr The destination address
-        """
-        self.hep_ctrl = hep_hdr.hep_ctrl.id
-        self.ip_family = hep_hdr.hep_ip_family.ip_family
-        self.ip_id = hep_hdr.hep_ip_id.ip_id
-        self.src_port = hep_hdr.src_port.hep_port.port
-        self.dst_port = hep_hdr.dst_port.hep_port.port
-        self.time_sec = hep_hdr.hep_timestamp_sec.timestamp_sec
-        self.time_usec = hep_hdr.hep_timestamp_usec.timestamp_usec
-        self.protocol_type = hep_hdr.hep_protocol_type.protocol_type
-        self.capture_agent_id = hep_hdr.hep_capture_agent_id.capture_agent_id
-        if self.ip_family == IP_FAMILY.v4:
-            self.src_addr = socket.inet_ntop(socket.AF_INET, bytes(src_addr.ipv4_addr,"utf-8"))
-            self.dst_addr = socket.inet_ntop(socket.AF_INET, bytes(dst_addr.ipv4_addr,"utf-8"))
-        elif self.ip_family == IP_FAMILY.v6:
-            self.src_addr = socket.inet_ntop(socket.AF_INET6, bytes(src_addr.ipv6_addr,"utf-8"))
-            self.dst_addr = socket.inet_ntop(socket.AF_INET6, bytes(dst_addr.ipv6_addr,"utf-8"))
-        self.auth_key = None
-        self.uuid = None
-        self.payload = None
 
 class HEPPacketHandler(DatagramProtocol):
     """A twisted DatagramProtocol that converts a UDP packet
@@ -105,102 +42,20 @@ class HEPPacketHandler(DatagramProtocol):
 
         self.module = module
 
-        self.hep_chunk = 'hep_chunk' / Struct(
-            'vendor_id' / Int16ub,
-            'type_id' / Int16ub,
-            'length' / Int16ub)
-        hep_ctrl = 'hep_ctrl' / Struct(
-            'id' / Array(4, Int8ub),
-            'length' / Int16ub)
-        hep_ip_family = 'hep_ip_family' / Struct(
-            self.hep_chunk,
-            'ip_family' / Int8ub);
-        hep_ip_id = 'hep_ip_id' / Struct(
-            self.hep_chunk,
-            'ip_id' / Int8ub)
-        hep_port = 'hep_port' / Struct(
-            self.hep_chunk,
-            'port' / Int16ub)
-        hep_timestamp_sec = 'hep_timestamp_sec' / Struct(
-            self.hep_chunk,
-            'timestamp_sec' / Int32ub)
-        hep_timestamp_usec = 'hep_timestamp_usec' / Struct(
-            self.hep_chunk,
-            'timestamp_usec' / Int32ub)
-        hep_protocol_type = 'hep_protocol_type' / Struct(
-            self.hep_chunk,
-            'protocol_type' / Int8ub)
-        hep_capture_agent_id = 'hep_capture_agent_id' / Struct(
-            self.hep_chunk,
-            'capture_agent_id' / Int32ub)
-        self.hep_generic_msg = 'hep_generic' / Struct(
-            hep_ctrl,
-            hep_ip_family,
-            hep_ip_id,
-            'src_port' / Struct(hep_port),
-            'dst_port' / Struct(hep_port),
-            hep_timestamp_sec,
-            hep_timestamp_usec,
-            hep_protocol_type,
-            hep_capture_agent_id)
-
     def datagramReceived(self, data, addr):
         """Process a received datagram"""
 
         (host, port) = addr
 
-        LOGGER.debug("Received %r from %s:%d (len: %d)" %
-            (data, host, port, len(data)))
-
-        # Parse out the header
-        parsed_hdr = self.hep_generic_msg.parse(data)
-        length = self.hep_generic_msg.sizeof()
-
-        # Get the IPv4 or IPv6 addresses
-        src_addr = None
-        dst_addr = None
-        if parsed_hdr.hep_ip_family.ip_family == IP_FAMILY.v4:
-            # IPv4
-            hep_ipv4_addr = 'hep_ipv4_addr' / Struct(
-                self.hep_chunk,
-                'ipv4_addr' / PaddedString(4, "ascii"))
-            src_addr = hep_ipv4_addr.parse(data[length:])
-            length += hep_ipv4_addr.sizeof()
-            dst_addr = hep_ipv4_addr.parse(data[length:])
-            length += hep_ipv4_addr.sizeof()
-        elif parsed_hdr.hep_ip_family.ip_family == IP_FAMILY.v6:
-            # IPv6
-            hep_ipv6_addr = 'hep_ipv6_addr' / Struct(
-                self.hep_chunk,
-                'ipv6_addr' / PaddedString(16, "ascii"))
-            src_addr = hep_ipv6_addr.parse(data[length:])
-            length += hep_ipv6_addr.sizeof()
-            dst_addr = hep_ipv6_addr.parse(data[length:])
-            length += hep_ipv6_addr.sizeof()
-
-        packet = HEPPacket(parsed_hdr, src_addr, dst_addr)
-
-        # Get variable length fields
-        while length < len(data):
-            hdr = self.hep_chunk.parse(data[length:])
-            length += self.hep_chunk.sizeof()
-            if hdr.type_id == HEP_VARIABLE_TYPES.auth_key:
-                hep_auth_key = 'hep_auth_key' / PaddedString(
-                                      hdr.length - self.hep_chunk.sizeof(), "ascii")
-                packet.auth_key = hep_auth_key.parse(data[length:])
-                length += hep_auth_key.sizeof() - self.hep_chunk.sizeof()
-            elif hdr.type_id == HEP_VARIABLE_TYPES.payload:
-                hep_payload = 'hep_payload' / PaddedString(
-                                     hdr.length - self.hep_chunk.sizeof(), "ascii")
-                packet.payload = hep_payload.parse(data[length:])
-                length += hep_payload.sizeof() - self.hep_chunk.sizeof()
-
-                LOGGER.debug('Packet payload: %s' % packet.payload)
-            elif hdr.type_id == HEP_VARIABLE_TYPES.uuid:
-                hep_uuid = 'hep_uuid' / PaddedString(
-                                  hdr.length - self.hep_chunk.sizeof(), "ascii")
-                packet.uuid = hep_uuid.parse(data[length:])
-                length += hep_uuid.sizeof() - self.hep_chunk.sizeof()
+        LOGGER.debug("Received %r from %s:%d (len: %d)", data, host, port,
+                     len(data))
+
+        try:
+            packet = hep.decode(data)
+        except hep.HEPError as e:
+            LOGGER.error("Invalid HEP packet from %s:%d: %s", host, port, e)
+            return
+
         self.module.verify_packet(packet)
 
 
@@ -334,12 +189,12 @@ class HEPCaptureNode(object):
         time_sec = getattr(packet, 'time_sec', None)
         if not time_sec:
             LOGGER.error('No time_sec value in packet %d: %s' %
-                         (self.current_packet, str(packet.__dict__)))
+                         (self.current_packet, str(packet)))
             self.test_object.set_passed(False)
         time_usec = getattr(packet, 'time_usec', None)
         if not time_usec:
             LOGGER.error('No time_usec value in packet %d: %s' % (
-                self.current_packet, str(packet.__dict__)))
+                self.current_packet, str(packet)))
             self.test_object.set_passed(False)
 
         # HEP header is always the same. The values in the array
@@ -356,7 +211,7 @@ class HEPCaptureNode(object):
                 self.test_object.set_passed(False)
         else:
             LOGGER.error('No hep_ctrl value in packet %d: %s' % (
-                         self.current_packet, str(packet.__dict__)))
+                         self.current_packet, str(packet)))
             self.test_object.set_passed(False)
 
         # Verify the keys specified in the YAML
@@ -371,11 +226,11 @@ class HEPCaptureNode(object):
                 i += 1
             else:
                 LOGGER.error('Failed to find match for packet %d: %s' %
-                    (self.current_packet, str(packet.__dict__)))
+                    (self.current_packet, str(packet)))
                 self.test_object.set_passed(False)
         else:
             expected_packet = self.packets.pop(0)
             if not self.match_expected_packet(packet, expected_packet):
                 LOGGER.error('Failed to match packet %d: %s' %
-                    (self.current_packet, str(packet.__dict__)))
+                    (self.current_packet, str(packet)))
                 self.test_object.set_passed(False)